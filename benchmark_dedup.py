@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark the group-wise keep strategies in DuplicateRemover against the
+previous sort-based implementation on a multi-million-row DataFrame
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from duplicate_remover import DuplicateRemover
+
+def make_frame(num_rows, num_keys):
+    """Build a DataFrame with a composite key and one column per strategy"""
+    rng = np.random.default_rng(42)
+    values = rng.integers(0, 1000000, num_rows).astype(float)
+    values[rng.random(num_rows) < 0.2] = np.nan
+    dates = pd.Series(pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 8, num_rows), unit='s'))
+    return pd.DataFrame({
+        'customer': rng.integers(0, num_keys, num_rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], num_rows),
+        'amount': values,
+        'updated': dates.dt.strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+def sort_based(df, check_columns, keep_strategy, strategy_column):
+    """The sort + drop_duplicates approach the remover used before"""
+    df_clean = df.copy()
+    if keep_strategy == 'not_empty':
+        df_clean['_helper'] = ~df_clean[strategy_column].isna()
+    elif keep_strategy == 'max_value':
+        df_clean['_helper'] = pd.to_numeric(df_clean[strategy_column], errors='coerce')
+    else:
+        df_clean['_helper'] = pd.to_datetime(df_clean[strategy_column], errors='coerce')
+    df_clean = df_clean.sort_values(['_helper'] + check_columns,
+                                    ascending=[False] + [True] * len(check_columns))
+    df_clean = df_clean.drop_duplicates(subset=check_columns, keep='first')
+    return df_clean.drop('_helper', axis=1)
+
+def run(num_rows):
+    num_keys = max(num_rows // 4, 1)
+    print(f"Building {num_rows:,} rows with about {num_keys * 4:,} distinct keys...")
+    df = make_frame(num_rows, num_keys)
+    check_columns = ['customer', 'region']
+    
+    remover = DuplicateRemover()
+    remover.df = df
+    remover.original_row_count = len(df)
+    
+    for keep_strategy, strategy_column in [('not_empty', 'amount'), ('max_value', 'amount'), ('most_recent', 'updated')]:
+        start = time.time()
+        expected = sort_based(df, check_columns, keep_strategy, strategy_column)
+        sort_time = time.time() - start
+        
+        start = time.time()
+        result = remover.remove_duplicates(check_columns, keep_strategy, strategy_column)
+        group_time = time.time() - start
+        
+        if result['cleaned_rows'] != len(expected):
+            print(f"  {keep_strategy}: row count mismatch ({result['cleaned_rows']:,} vs {len(expected):,})")
+            sys.exit(1)
+        
+        print(f"  {keep_strategy:<12} sort-based {sort_time:6.2f}s   group-wise {group_time:6.2f}s   "
+              f"speedup {sort_time / group_time:4.1f}x   ({result['cleaned_rows']:,} rows kept)")
+
+if __name__ == "__main__":
+    num_rows = 5_000_000
+    
+    if len(sys.argv) > 1:
+        try:
+            num_rows = int(sys.argv[1])
+        except ValueError:
+            print("Usage: python benchmark_dedup.py [number_of_rows]")
+            sys.exit(1)
+    
+    run(num_rows)
@@ -0,0 +1,41 @@
+import math
+
+import numpy as np
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over 64-bit hashes, updated a batch at a time.
+
+    Sized for `capacity` items at `error_rate` false positives. The k probe
+    positions come from the two 32-bit halves of each hash (double hashing),
+    so callers hash their keys once and pass the uint64 array in. Adding
+    more than `capacity` items only raises the false-positive rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, int(capacity))
+        self.num_bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (low[:, None] + steps[None, :] * high[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, hashes):
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def contains(self, hashes):
+        """Boolean mask: False means definitely not added, True means probably added"""
+        positions = self._positions(hashes)
+        set_bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return set_bits.all(axis=1)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
@@ -1,51 +1,128 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
+import math
 import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from collections import Counter
 from datetime import datetime
 import warnings
 
+from csv_reader import read_csv
+from encoding_detector import detect_encoding
+from join_sketch import KeySketch, estimate_join
+from lookup_index import LookupIndex
+from record_indexer import blank_records, count_records, estimate_records, find_record_ends
+from streaming_dedup import KEEP_STRATEGIES, VALUE_STRATEGIES, StreamingDeduplicator
+
+# Which file's row is considered first when duplicates span files
+SOURCE_PRIORITIES = ('first', 'last')
+
+JOIN_TYPES = ('inner', 'left', 'right', 'outer')
+# 'join' picks an algorithm per step; 'lookup' streams the first file past indexes of the others
+JOIN_MODES = ('join', 'lookup')
+
+# Memory of a CSV read as text, relative to its size on disk
+TEXT_FRAME_FACTOR = 5
+MAX_JOIN_PARTITIONS = 256
+
+# Joins estimated to produce more than this many times the rows of all files together get a warning
+JOIN_GROWTH_WARNING = 3
+
+
+def _load_partition(path, columns):
+    """Concatenate the frames spilled to one join partition"""
+    frames = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                frames.append(pickle.load(f))
+            except EOFError:
+                break
+    if not frames:
+        return pd.DataFrame(columns=columns, dtype=object)
+    return pd.concat(frames, ignore_index=True)
+
 class CSVMerger:
-    def __init__(self, encoding='utf-8'):
+    def __init__(self, encoding='utf-8', chunk_rows=100000, block_size=16 * 1024 * 1024, sample_rows=10000,
+                 join_memory_mb=1024, index_dir=None, preview_scan_rows=100000, parse_engine='c', dedup_workers=None):
         self.files = {}  # Dictionary to store file info and dataframes
         self.encoding = encoding
-        self.encodings_to_try = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+        self.chunk_rows = chunk_rows  # Rows per chunk when streaming a file through pandas
+        self.block_size = block_size  # Bytes per read when copying a file's records as-is
+        self.sample_rows = sample_rows  # Rows read to infer dtypes of header-only files
+        self.join_memory_mb = join_memory_mb  # Largest join input loaded whole when streaming a join
+        self.index_dir = index_dir  # Where lookup indexes of files with a content_id are kept
+        self.preview_scan_rows = preview_scan_rows  # Rows of each header-only file searched for join preview matches
+        self.parse_engine = parse_engine  # Engine for whole-file loads, see csv_reader.PARSE_ENGINES
+        self.dedup_workers = dedup_workers  # Processes for cross-file dedup partitions (default: one per core)
         self.merge_type = 'vertical'  # vertical or horizontal
         self.total_rows = 0
         self.total_size_mb = 0
+        self.duplicates_removed = 0
+        self.join_methods = []  # Algorithm used by each step of a streamed join
         
-    def add_file(self, file_path, file_id=None):
-        """Add a CSV file to the merge queue"""
+    def load_csv(self, file_path, encoding=None):
+        """Read a CSV file, detecting its encoding unless one is given; returns (df, encoding)"""
+        encoding = encoding or detect_encoding(file_path)
+        return read_csv(file_path, encoding, self.parse_engine), encoding
+    
+    def read_sample(self, file_path, encoding):
+        """The header and first sample_rows rows of a CSV file"""
+        return pd.read_csv(file_path, encoding=encoding, nrows=self.sample_rows)
+    
+    def count_rows(self, file_info):
+        """Data rows of a file from a raw record scan, without parsing it; blank lines don't count"""
+        if file_info['encoding'].startswith(('utf-16', 'utf-32')):
+            # Record boundaries can't be found on the raw bytes of these encodings
+            chunks = pd.read_csv(file_info['path'], encoding=file_info['encoding'], usecols=[0],
+                                 chunksize=self.chunk_rows)
+            return sum(len(chunk) for chunk in chunks)
+        return max(count_records(file_info['path'], self.block_size, skip_blank=True) - 1, 0)
+    
+    def add_file(self, file_path, file_id=None, name=None, header_only=False, encoding=None, content_id=None):
+        """Add a CSV file to the merge queue
+        
+        With header_only, only the header and the first sample_rows rows
+        are read, and dtypes are inferred from that sample. The file can
+        then be merged vertically by streaming; its row count stays None
+        until it is merged or analyzed. `content_id` identifies the file's bytes (e.g.
+        their hash), so a lookup index built for it can be cached.
+        """
         if file_id is None:
             file_id = f"file_{len(self.files) + 1}"
-            
-        # Try different encodings
-        df = None
-        encoding_used = None
         
-        for encoding in self.encodings_to_try:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                encoding_used = encoding
-                break
-            except UnicodeDecodeError:
-                continue
-                
-        if df is None:
-            raise UnicodeDecodeError(f"Could not decode file with any of these encodings: {', '.join(self.encodings_to_try)}")
+        if header_only:
+            df = None
+            encoding_used = encoding or detect_encoding(file_path)
+            sample = self.read_sample(file_path, encoding_used)
+            columns = list(sample.columns)
+            rows = None
+            dtypes = {col: str(dtype) for col, dtype in sample.dtypes.items()}
+        else:
+            df, encoding_used = self.load_csv(file_path, encoding)
+            columns = list(df.columns)
+            rows = len(df)
+            dtypes = {col: str(dtype) for col, dtype in df.dtypes.items()}
         
         file_info = {
             'path': file_path,
-            'name': os.path.basename(file_path),
+            'name': name or os.path.basename(file_path),
             'df': df,
             'encoding': encoding_used,
-            'rows': len(df),
-            'columns': list(df.columns),
+            'rows': rows,
+            'columns': columns,
             'size_mb': os.path.getsize(file_path) / (1024 * 1024),
-            'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}
+            'dtypes': dtypes,
+            'content_id': content_id
         }
         
         self.files[file_id] = file_info
-        self.total_rows += file_info['rows']
+        self.total_rows += file_info['rows'] or 0
         self.total_size_mb += file_info['size_mb']
         
         return file_id, file_info
@@ -54,6 +131,12 @@ class CSVMerger:
         """Analyze all added files for merging compatibility"""
         if not self.files:
             return {'error': 'No files added for merging'}
+        
+        # Header-only files get their row counts from a record scan
+        for file_info in self.files.values():
+            if file_info['rows'] is None:
+                file_info['rows'] = self.count_rows(file_info)
+                self.total_rows += file_info['rows']
             
         # Collect all unique columns
         all_columns = set()
@@ -106,6 +189,8 @@ class CSVMerger:
             } for fid, info in self.files.items()},
             'column_analysis': column_analysis,
             'dtype_conflicts': dtype_conflicts,
+            # Dtypes of header-only files come from their first sample_rows rows
+            'dtype_sample_rows': self.sample_rows if any(info['df'] is None for info in self.files.values()) else None,
             'merge_feasibility': {
                 'vertical': len(common_columns) > 0 or len(self.files) == 1,
                 'horizontal': len(common_columns) > 0  # Need at least one common column for joining
@@ -138,7 +223,7 @@ class CSVMerger:
         preview_dfs = []
         
         for file_id, file_info in self.files.items():
-            df_sample = file_info['df'].head(min(5, preview_rows)).copy()
+            df_sample = self._head(file_info, min(5, preview_rows)).copy()
             
             if include_source:
                 df_sample['_source_file'] = file_info['name']
@@ -160,7 +245,7 @@ class CSVMerger:
         # Concatenate preview
         try:
             preview_df = pd.concat(preview_dfs, ignore_index=True, sort=False)
-            preview_data = preview_df.head(preview_rows).to_dict('records')
+            preview_data = self._preview_records(preview_df.head(preview_rows))
             
             # Calculate statistics
             if columns_mode == 'union':
@@ -169,7 +254,8 @@ class CSVMerger:
                 total_columns = len(common_cols)
                 
             stats = {
-                'total_rows_after_merge': self.total_rows,
+                'total_rows_after_merge': self._estimated_total_rows(),
+                'rows_estimated': any(info['rows'] is None for info in self.files.values()),
                 'total_columns': total_columns,
                 'columns_mode': columns_mode,
                 'include_source': include_source
@@ -184,39 +270,92 @@ class CSVMerger:
         except Exception as e:
             return {'error': f'Preview generation failed: {str(e)}'}
     
+    def _preview_records(self, df):
+        """Rows as dicts for JSON, with missing values (e.g. unmatched join columns) as None"""
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+    
+    def _estimated_total_rows(self):
+        """Data rows of all files, extrapolated from the start of header-only files that weren't counted"""
+        return sum(
+            info['rows'] if info['rows'] is not None else max(estimate_records(info['path']) - 1, 0)
+            for info in self.files.values()
+        )
+    
+    def _head(self, file_info, rows):
+        """First rows of a file, read from disk as text for header-only files, as they are merged"""
+        if file_info['df'] is not None:
+            return file_info['df'].head(rows)
+        return pd.read_csv(file_info['path'], encoding=file_info['encoding'], dtype=str, keep_default_na=False,
+                           nrows=rows)
+    
+    def _preview_join_rows(self, file_info, keys, preview_rows):
+        """Rows of a file for a join preview: its first preview_rows plus those whose key is in `keys`
+        
+        Header-only files are searched in chunks, up to preview_scan_rows
+        rows, so the cost depends on the preview rather than the file.
+        Returns (rows, whether the whole file was searched).
+        """
+        index = LookupIndex(keys.reset_index(drop=True), list(keys.columns))
+        if file_info['df'] is not None:
+            chunks, complete = [file_info['df']], True
+        else:
+            chunks = pd.read_csv(file_info['path'], encoding=file_info['encoding'], dtype=str, keep_default_na=False,
+                                 chunksize=self.chunk_rows, nrows=self.preview_scan_rows)
+            complete = None
+        
+        found = []
+        scanned = 0
+        for chunk in chunks:
+            keep = np.arange(scanned, scanned + len(chunk)) < preview_rows
+            keep[index.match(chunk)[0]] = True
+            found.append(chunk[keep])
+            scanned += len(chunk)
+        if complete is None:
+            complete = scanned < self.preview_scan_rows
+        if not found:
+            return self._head(file_info, 0), complete
+        return pd.concat(found), complete
+    
     def _preview_horizontal_merge(self, options, preview_rows):
         """Preview horizontal (join) merge"""
         join_columns = options.get('join_columns', [])
         join_type = options.get('join_type', 'inner')  # inner, left, right, outer
         
-        if not join_columns:
-            return {'error': 'Join columns must be specified for horizontal merge'}
-        
-        if len(self.files) != 2:
-            return {'error': 'Horizontal merge currently supports exactly 2 files'}
-        
-        file_ids = list(self.files.keys())
-        df1 = self.files[file_ids[0]]['df'].head(preview_rows)
-        df2 = self.files[file_ids[1]]['df'].head(preview_rows)
-        
         try:
-            # Perform the join
-            preview_df = pd.merge(
-                df1, df2,
-                on=join_columns,
-                how=join_type,
-                suffixes=('_file1', '_file2')
-            )
+            self._check_join(join_columns, join_type)
+            names = self._join_names(join_columns)
             
-            preview_data = preview_df.head(preview_rows).to_dict('records')
+            # Join the first rows of the first file with their matches in each later one
+            preview_df = None
+            matches_complete = True
+            for file_id, file_info in self.files.items():
+                if preview_df is None:
+                    df = self._head(file_info, preview_rows)
+                else:
+                    df, complete = self._preview_join_rows(file_info, preview_df[join_columns], preview_rows)
+                    matches_complete = matches_complete and complete
+                df = df.set_axis(names[file_id], axis=1)
+                preview_df = df if preview_df is None else pd.merge(preview_df, df, on=join_columns, how=join_type)
+            
+            preview_data = self._preview_records(preview_df.head(preview_rows))
             
             stats = {
                 'join_type': join_type,
                 'join_columns': join_columns,
                 'estimated_rows': 'varies based on join matches',
-                'total_columns': len(preview_df.columns)
+                'total_columns': len(preview_df.columns),
+                # False when a match beyond preview_scan_rows of a file may be missing
+                'matches_complete': matches_complete
             }
             
+            # Sketches from the analysis step give a row estimate without reading the files again
+            estimate = self.estimate_join(join_columns, cached_only=True)
+            if estimate:
+                stats['estimated_rows'] = estimate['estimates'][join_type]['rows']
+                stats['estimated_size_mb'] = estimate['estimates'][join_type]['size_mb']
+                if join_type in estimate['warnings']:
+                    stats['warning'] = estimate['warnings'][join_type]
+            
             return {
                 'preview_data': preview_data,
                 'stats': stats,
@@ -226,8 +365,14 @@ class CSVMerger:
         except Exception as e:
             return {'error': f'Preview generation failed: {str(e)}'}
     
-    def execute_merge(self, merge_type='vertical', options=None, output_path=None):
-        """Execute the merge operation"""
+    def execute_merge(self, merge_type='vertical', options=None, output_path=None, progress_callback=None):
+        """Execute the merge operation
+        
+        Merges of header-only files, and vertical merges that drop
+        duplicates, are streamed to output_path and return no DataFrame;
+        progress_callback(bytes_done, total_bytes) is then called as the
+        inputs are read.
+        """
         if not self.files:
             return {'error': 'No files added for merging'}
             
@@ -235,12 +380,37 @@ class CSVMerger:
         self.merge_type = merge_type
         
         try:
-            if merge_type == 'vertical':
+            self.check_merge_options(merge_type, options)
+            if merge_type == 'vertical' and (options.get('dedup_columns')
+                                             or any(info['df'] is None for info in self.files.values())):
+                if not output_path:
+                    raise ValueError('Streaming vertical merge needs an output path')
+                rows, columns = self._stream_vertical_merge(options, output_path, progress_callback)
+                return {
+                    'success': True,
+                    'merged_df': None,
+                    'rows': rows,
+                    'columns': columns,
+                    'duplicates_removed': self.duplicates_removed,
+                    'output_path': output_path
+                }
+            elif merge_type == 'horizontal' and any(info['df'] is None for info in self.files.values()):
+                if not output_path:
+                    raise ValueError('Streaming join needs an output path')
+                rows, columns = self._stream_horizontal_merge(options, output_path, progress_callback)
+                return {
+                    'success': True,
+                    'merged_df': None,
+                    'rows': rows,
+                    'columns': columns,
+                    'duplicates_removed': 0,
+                    'join_methods': self.join_methods,
+                    'output_path': output_path
+                }
+            elif merge_type == 'vertical':
                 merged_df = self._execute_vertical_merge(options)
-            elif merge_type == 'horizontal':
-                merged_df = self._execute_horizontal_merge(options)
             else:
-                return {'error': f'Unknown merge type: {merge_type}'}
+                merged_df = self._execute_horizontal_merge(options)
             
             # Save if output path provided
             if output_path:
@@ -251,12 +421,47 @@ class CSVMerger:
                 'merged_df': merged_df,
                 'rows': len(merged_df),
                 'columns': len(merged_df.columns),
+                'duplicates_removed': self.duplicates_removed,
                 'output_path': output_path
             }
             
         except Exception as e:
             return {'error': f'Merge execution failed: {str(e)}'}
     
+    def check_merge_options(self, merge_type='vertical', options=None):
+        """Raise ValueError unless the added files can be merged with these options
+        
+        Only the files' headers are needed, so a request can be rejected
+        before any rows are read.
+        """
+        options = options or {}
+        if merge_type == 'horizontal':
+            self._check_join(options.get('join_columns', []), options.get('join_type', 'inner'))
+            if options.get('join_mode', 'join') not in JOIN_MODES:
+                raise ValueError(f'Unknown join mode: {options["join_mode"]}')
+            return
+        if merge_type != 'vertical':
+            raise ValueError(f'Unknown merge type: {merge_type}')
+        
+        dedup_columns = options.get('dedup_columns')
+        if not dedup_columns:
+            return
+        keep_strategy = options.get('keep_strategy', 'first')
+        strategy_column = options.get('strategy_column')
+        if keep_strategy == 'fuzzy':
+            raise ValueError('Fuzzy matching is not available when merging')
+        if keep_strategy not in KEEP_STRATEGIES:
+            raise ValueError(f'Unknown keep strategy: {keep_strategy}')
+        if keep_strategy in VALUE_STRATEGIES and not strategy_column:
+            raise ValueError(f'Keep strategy {keep_strategy} needs a strategy column')
+        if options.get('source_priority', 'first') not in SOURCE_PRIORITIES:
+            raise ValueError(f'Unknown source priority: {options["source_priority"]}')
+        
+        columns = self._merged_columns(options.get('columns_mode', 'union'), options.get('include_source', False))
+        missing = [col for col in dedup_columns + [strategy_column] if col and col not in columns]
+        if missing:
+            raise ValueError(f'Columns not in the merged file: {", ".join(missing)}')
+    
     def _execute_vertical_merge(self, options):
         """Execute vertical (append) merge"""
         include_source = options.get('include_source', False)
@@ -285,35 +490,446 @@ class CSVMerger:
             dfs_to_merge = [df[list(common_cols)] for df in dfs_to_merge]
         
         # Perform the merge
-        merged_df = pd.concat(dfs_to_merge, ignore_index=True, sort=False)
-        
-        return merged_df
+        return pd.concat(dfs_to_merge, ignore_index=True, sort=False)
     
-    def _execute_horizontal_merge(self, options):
-        """Execute horizontal (join) merge"""
-        join_columns = options.get('join_columns', [])
-        join_type = options.get('join_type', 'inner')
+    def _merged_columns(self, columns_mode, include_source):
+        """Output columns of a vertical merge: the union in order of first appearance, or the intersection"""
+        column_lists = [info['columns'] for info in self.files.values()]
+        if columns_mode == 'intersection':
+            common = set.intersection(*(set(columns) for columns in column_lists))
+            columns = [col for col in column_lists[0] if col in common]
+        else:
+            columns = list(dict.fromkeys(col for columns in column_lists for col in columns))
+        return columns + ['_source_file'] if include_source else columns
+    
+    def _stream_vertical_merge(self, options, output_path, progress_callback=None):
+        """Append every file to output_path without loading any of them
+        
+        Files whose columns already match the output, in a UTF-8 encoding,
+        have their records copied byte for byte. Others are read in chunks
+        as text and remapped onto the output columns, with missing columns
+        left empty. With dedup_columns the merged rows then go through
+        StreamingDeduplicator, so memory stays bounded either way.
+        Returns (rows, columns) of the output.
+        """
+        columns = self._merged_columns(options.get('columns_mode', 'union'), options.get('include_source', False))
+        dedup_columns = options.get('dedup_columns')
+        
+        merged_path = f'{output_path}.merging' if dedup_columns else output_path
+        total_bytes = sum(os.path.getsize(info['path']) for info in self.files.values())
+        bytes_done = 0
         
+        try:
+            with open(merged_path, 'wb') as out:
+                out.write(pd.DataFrame(columns=columns).to_csv(index=False).encode(self.encoding))
+                for file_info in self.files.values():
+                    def report(offset, base=bytes_done):
+                        if progress_callback:
+                            progress_callback(base + offset, total_bytes)
+                    
+                    if (file_info['columns'] == columns and self.encoding == 'utf-8'
+                            and file_info['encoding'] in ('utf-8', 'utf-8-sig')):
+                        file_info['rows'] = self._copy_records(file_info, out, report)
+                    else:
+                        file_info['rows'] = self._remap_records(file_info, columns, out, report)
+                    bytes_done += os.path.getsize(file_info['path'])
+                    report(0)
+            
+            file_rows = [info['rows'] for info in self.files.values()]
+            self.total_rows = sum(file_rows)
+            if not dedup_columns:
+                return self.total_rows, len(columns)
+            
+            deduplicator = StreamingDeduplicator(merged_path, encoding=self.encoding, workers=self.dedup_workers)
+            result = deduplicator.remove_duplicates(
+                dedup_columns, output_path,
+                options.get('keep_strategy', 'first'), options.get('strategy_column'),
+                source_rows=file_rows, source_priority=options.get('source_priority', 'first')
+            )
+            self.duplicates_removed = result['rows_removed']
+            return result['cleaned_rows'], len(columns)
+        finally:
+            if merged_path != output_path and os.path.exists(merged_path):
+                os.remove(merged_path)
+    
+    def _copy_records(self, file_info, out, report):
+        """Copy the records after a file's header to out as raw bytes; returns the record count
+        
+        Blank lines aren't rows, as pandas skips them, so they are neither
+        copied nor counted.
+        """
+        records = 0
+        header_done = False
+        pending = b''
+        in_quotes = False
+        with open(file_info['path'], 'rb') as f:
+            while True:
+                block = f.read(self.block_size)
+                if block:
+                    ends, in_quotes = find_record_ends(block, in_quotes)
+                    if not len(ends):
+                        pending += block
+                        continue
+                    buffer = pending + block[:ends[-1]]
+                    pending = block[ends[-1]:]
+                    bounds = np.concatenate([[0], ends + (len(buffer) - ends[-1])])
+                elif pending:
+                    # The last record had no line ending of its own
+                    buffer, pending = pending + b'\n', b''
+                    bounds = np.array([0, len(buffer)])
+                else:
+                    break
+                
+                starts, stops = bounds[:-1], bounds[1:]
+                kept = np.flatnonzero(~blank_records(np.frombuffer(buffer, dtype=np.uint8), starts, stops))
+                if not header_done and len(kept):
+                    kept = kept[1:]
+                    header_done = True
+                records += len(kept)
+                # Write each run of consecutive non-blank records in one slice
+                breaks = np.flatnonzero(np.diff(kept) != 1) + 1
+                view = memoryview(buffer)
+                for run_start, run_end in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(kept)]])):
+                    if run_end > run_start:
+                        out.write(view[starts[kept[run_start]]:stops[kept[run_end - 1]]])
+                report(f.tell())
+        return records
+    
+    def _remap_records(self, file_info, columns, out, report):
+        """Stream a file's rows onto the output columns in chunks; returns the row count"""
+        rows = 0
+        with open(file_info['path'], 'rb') as f:
+            for chunk in pd.read_csv(f, encoding=file_info['encoding'], dtype=str, keep_default_na=False,
+                                     chunksize=self.chunk_rows):
+                if '_source_file' in columns:
+                    chunk['_source_file'] = file_info['name']
+                out.write(chunk.reindex(columns=columns, fill_value='').to_csv(index=False, header=False)
+                          .encode(self.encoding))
+                rows += len(chunk)
+                report(f.tell())
+        return rows
+    
+    def _check_join(self, join_columns, join_type):
+        """Raise ValueError unless the files can be joined on join_columns"""
         if not join_columns:
             raise ValueError('Join columns must be specified for horizontal merge')
+        if join_type not in JOIN_TYPES:
+            raise ValueError(f'Unknown join type: {join_type}')
+        if len(self.files) < 2:
+            raise ValueError('Horizontal merge needs at least 2 files')
+        for file_info in self.files.values():
+            missing = [col for col in join_columns if col not in file_info['columns']]
+            if missing:
+                raise ValueError(f'Join columns not in {file_info["name"]}: {", ".join(missing)}')
+    
+    def _join_names(self, join_columns):
+        """Column names of each file in a join, by file id
+        
+        Join columns keep their names. Any other column found in more than
+        one file gets a _file<n> suffix in every file that has it, which for
+        two files is what pd.merge's suffixes would give.
+        """
+        counts = Counter(col for info in self.files.values() for col in info['columns'])
+        return {
+            file_id: [col if col in join_columns or counts[col] == 1 else f'{col}_file{n}'
+                      for col in file_info['columns']]
+            for n, (file_id, file_info) in enumerate(self.files.items(), start=1)
+        }
+    
+    def _execute_horizontal_merge(self, options):
+        """Execute horizontal (join) merge
         
-        if len(self.files) != 2:
-            raise ValueError('Horizontal merge currently supports exactly 2 files')
-        
-        file_ids = list(self.files.keys())
-        df1 = self.files[file_ids[0]]['df']
-        df2 = self.files[file_ids[1]]['df']
+        Files are joined in order: the first with the second, that result
+        with the third, and so on. A left join therefore keeps every row of
+        the first file and a right join every row of the last.
+        """
+        join_columns = options.get('join_columns', [])
+        join_type = options.get('join_type', 'inner')
+        self._check_join(join_columns, join_type)
+        names = self._join_names(join_columns)
         
-        # Perform the join
-        merged_df = pd.merge(
-            df1, df2,
-            on=join_columns,
-            how=join_type,
-            suffixes=('_file1', '_file2')
-        )
+        merged_df = None
+        for file_id, file_info in self.files.items():
+            df = file_info['df'].set_axis(names[file_id], axis=1)
+            merged_df = df if merged_df is None else pd.merge(merged_df, df, on=join_columns, how=join_type)
         
         return merged_df
     
+    def _stream_horizontal_merge(self, options, output_path, progress_callback=None):
+        """Join every file to output_path without loading them all at once
+        
+        Files are joined in the same order as _execute_horizontal_merge,
+        with each intermediate result written to a temporary file. Each
+        step picks its own algorithm. If the smaller input fits in
+        join_memory_mb as text, it is loaded and the other input streams
+        through it in chunks (a hash join). Otherwise both inputs are
+        spilled to on-disk partitions by a hash of the join key, and each
+        pair of partitions is joined on its own (a partitioned join), so
+        memory is bounded by a partition rather than the inputs. Keys are
+        compared as text, as in StreamingDeduplicator, and rows come out
+        grouped by chunk or partition rather than in pandas' order.
+        
+        With join_mode 'lookup', every file after the first is a reference
+        table: it is loaded whole and indexed, or its index is loaded from
+        index_dir when it was built before, and the first file streams
+        through each index in turn. Rows then keep the first file's order.
+        A reference table that doesn't fit in join_memory_mb as text is
+        joined with a hash or partitioned join instead, as in join_mode
+        'join', and its rows lose that order.
+        Returns (rows, columns) of the output.
+        """
+        join_columns = options.get('join_columns', [])
+        join_type = options.get('join_type', 'inner')
+        join_mode = options.get('join_mode', 'join')
+        self._check_join(join_columns, join_type)
+        if join_mode not in JOIN_MODES:
+            raise ValueError(f'Unknown join mode: {join_mode}')
+        names = self._join_names(join_columns)
+        
+        sides = [{
+            'path': info['path'],
+            'encoding': info['encoding'],
+            'columns': names[file_id],
+            'size': os.path.getsize(info['path']),
+            'content_id': info['content_id']
+        } for file_id, info in self.files.items()]
+        total_bytes = sum(side['size'] for side in sides)
+        bytes_done = sides[0]['size']
+        self.join_methods = []
+        
+        work_dir = tempfile.mkdtemp(prefix='join_')
+        try:
+            left = sides[0]
+            for step, right in enumerate(sides[1:], start=1):
+                # A step's progress is counted against the size of the file it adds
+                def report(fraction, base=bytes_done, size=right['size']):
+                    if progress_callback:
+                        progress_callback(base + int(size * min(fraction, 1.0)), total_bytes)
+                
+                path = output_path if step == len(sides) - 1 else os.path.join(work_dir, f'step_{step}.csv')
+                columns = left['columns'] + [col for col in right['columns'] if col not in join_columns]
+                smaller_mb = min(left['size'], right['size']) * TEXT_FRAME_FACTOR / (1024 * 1024)
+                reference_mb = right['size'] * TEXT_FRAME_FACTOR / (1024 * 1024)
+                if join_mode == 'lookup' and reference_mb > self.join_memory_mb:
+                    print(f"Reference table {step} needs about {reference_mb:.0f} MB, over join_memory_mb; "
+                          f"joining it instead of indexing it")
+                
+                with open(path, 'wb') as out:
+                    out.write(pd.DataFrame(columns=columns).to_csv(index=False).encode(self.encoding))
+                    if join_mode == 'lookup' and reference_mb <= self.join_memory_mb:
+                        index, cached = self._lookup_index(right, join_columns)
+                        self.join_methods.append('lookup_cached' if cached else 'lookup')
+                        rows = self._hash_join(left, right, index, True, join_columns, join_type, columns, out, report)
+                    elif smaller_mb <= self.join_memory_mb:
+                        self.join_methods.append('hash')
+                        # Index whichever input is smaller and stream the other one
+                        probe_is_left = left['size'] > right['size']
+                        build, probe = (right, left) if probe_is_left else (left, right)
+                        index = LookupIndex(self._read_side(build), join_columns)
+                        rows = self._hash_join(probe, build, index, probe_is_left, join_columns, join_type,
+                                               columns, out, report)
+                    else:
+                        self.join_methods.append('partitioned')
+                        rows = self._partitioned_join(left, right, join_columns, join_type, columns, out,
+                                                      work_dir, report)
+                
+                if step > 1:
+                    os.remove(left['path'])
+                left = {'path': path, 'encoding': self.encoding, 'columns': columns, 'size': os.path.getsize(path)}
+                bytes_done += right['size']
+                report(0)
+            
+            # Every input has been read in full by now
+            for file_info, side in zip(self.files.values(), sides):
+                file_info['rows'] = side['rows']
+            self.total_rows = sum(side['rows'] for side in sides)
+            return rows, len(left['columns'])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _read_side(self, side, source=None, **kwargs):
+        """Read a join input as text, under its join column names"""
+        return pd.read_csv(source or side['path'], encoding=side['encoding'], dtype=str, keep_default_na=False,
+                           header=0, names=side['columns'], **kwargs)
+    
+    def _side_chunks(self, side, report=None):
+        """Yield a join input in chunks, reporting the fraction read; records its row count"""
+        rows = 0
+        with open(side['path'], 'rb') as f:
+            for chunk in self._read_side(side, f, chunksize=self.chunk_rows):
+                rows += len(chunk)
+                if report:
+                    report(f.tell() / max(side['size'], 1))
+                yield chunk
+        side['rows'] = rows
+    
+    def _write_joined(self, joined, columns, out):
+        """Append joined rows to out in the output column order; returns the row count"""
+        out.write(joined.reindex(columns=columns, fill_value='').to_csv(index=False, header=False)
+                  .encode(self.encoding))
+        return len(joined)
+    
+    def _cached(self, side, kind, join_columns, build, cached_only=False):
+        """An object derived from a file and its join columns, built once and kept in index_dir
+        
+        Objects are cached by the file's content_id, `kind` and the join
+        columns. Returns (object, whether it came from the cache); with
+        cached_only, (None, False) is returned instead of building it.
+        """
+        path = None
+        if self.index_dir and side['content_id']:
+            digest = hashlib.sha256(json.dumps(join_columns).encode()).hexdigest()[:16]
+            path = os.path.join(self.index_dir, f"{side['content_id']}.{kind}_{digest}.pkl")
+            if os.path.exists(path):
+                try:
+                    with open(path, 'rb') as f:
+                        return pickle.load(f), True
+                except (OSError, EOFError, pickle.UnpicklingError) as e:
+                    print(f"Rebuilding unreadable {kind} cache {path}: {e}")
+        if cached_only:
+            return None, False
+        
+        built = build()
+        if path:
+            # Write then rename, so a concurrent reader never sees a partial file
+            temp_path = f'{path}.{uuid.uuid4()}.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump(built, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        return built, False
+    
+    def _lookup_index(self, side, join_columns):
+        """LookupIndex of a reference file; returns (index, whether it came from the cache)"""
+        return self._cached(side, 'lookup', join_columns, lambda: LookupIndex(self._read_side(side), join_columns))
+    
+    def _key_sketch(self, file_info, join_columns, cached_only=False):
+        """KeySketch of a file's join keys, from one chunked pass over those columns"""
+        def build():
+            sketch = KeySketch()
+            # Keys are hashed as text, as the streamed join compares them
+            for chunk in pd.read_csv(file_info['path'], encoding=file_info['encoding'], usecols=join_columns,
+                                     dtype=str, keep_default_na=False, chunksize=self.chunk_rows):
+                sketch.add(pd.util.hash_pandas_object(chunk[join_columns], index=False).to_numpy())
+            sketch.bytes = os.path.getsize(file_info['path'])
+            return sketch
+        return self._cached(file_info, 'sketch', join_columns, build, cached_only)[0]
+    
+    def estimate_join(self, join_columns, cached_only=False):
+        """Estimated output of joining the files on join_columns, for every join type
+        
+        Each file's keys are sketched in one pass over the join columns
+        (see join_sketch), or the sketch is loaded from index_dir. With
+        cached_only, returns None unless every sketch was built before.
+        `warnings` holds a message for each join type estimated at more than
+        JOIN_GROWTH_WARNING times the rows of all files together, which only
+        happens when keys repeat in several files.
+        """
+        self._check_join(join_columns, 'inner')
+        sketches = []
+        for file_info in self.files.values():
+            sketch = self._key_sketch(file_info, join_columns, cached_only)
+            if sketch is None:
+                return None
+            if file_info['rows'] is None:
+                # The pass counted the rows; analysis doesn't need to again
+                file_info['rows'] = sketch.rows
+                self.total_rows += sketch.rows
+            sketches.append(sketch)
+        
+        input_rows = max(sum(sketch.rows for sketch in sketches), 1)
+        estimates = {}
+        warnings = {}
+        for join_type in JOIN_TYPES:
+            rows, size = estimate_join(sketches, join_type)
+            estimates[join_type] = {'rows': int(round(rows)), 'size_mb': round(size / (1024 * 1024), 1)}
+            if rows > JOIN_GROWTH_WARNING * input_rows:
+                warnings[join_type] = (
+                    f'This {join_type} join is estimated at {rows:,.0f} rows ({size / 1024 ** 3:,.1f} GB), '
+                    f'{rows / input_rows:,.0f}x the rows of all files together. Join keys repeat in '
+                    f'several files, so their rows multiply.'
+                )
+        
+        return {
+            'join_columns': join_columns,
+            'files': {
+                file_id: {'rows': sketch.rows, 'distinct_keys': int(round(sketch.distinct_keys))}
+                for file_id, sketch in zip(self.files, sketches)
+            },
+            'estimates': estimates,
+            'warnings': warnings
+        }
+    
+    def _hash_join(self, probe, build, index, probe_is_left, join_columns, join_type, columns, out, report):
+        """Stream the probe input past a LookupIndex of the build input; returns rows written
+        
+        `probe` and `build` are the two inputs of the step, either way round.
+        Unmatched probe rows are kept as they go by; unmatched build rows are
+        tracked and written at the end.
+        """
+        build['rows'] = len(index)
+        keep_probe = join_type == 'outer' or join_type == ('left' if probe_is_left else 'right')
+        keep_build = join_type == 'outer' or join_type == ('right' if probe_is_left else 'left')
+        
+        # A cached index keeps the column names it was built with
+        table = index.table
+        if list(table.columns) != build['columns']:
+            table = table.set_axis(build['columns'], axis=1)
+        values = table[[col for col in build['columns'] if col not in join_columns]]
+        matched = np.zeros(len(table), dtype=bool)
+        
+        rows = 0
+        for chunk in self._side_chunks(probe, report):
+            probe_rows, table_rows = index.match(chunk, keep_unmatched=keep_probe)
+            matched[table_rows[table_rows >= 0]] = True
+            joined = pd.concat([chunk.iloc[probe_rows].reset_index(drop=True),
+                                values.reindex(table_rows).reset_index(drop=True)], axis=1)
+            rows += self._write_joined(joined, columns, out)
+        
+        if keep_build:
+            rows += self._write_joined(table[~matched], columns, out)
+        return rows
+    
+    def _spill_side(self, side, join_columns, partitions, work_dir, report):
+        """Split a join input into partitions by a hash of its join key; returns their paths"""
+        prefix = os.path.join(work_dir, f'part_{len(os.listdir(work_dir))}')
+        paths = [f'{prefix}_{i}.pkl' for i in range(partitions)]
+        files = [open(path, 'wb') for path in paths]
+        try:
+            for chunk in self._side_chunks(side, report):
+                targets = pd.util.hash_pandas_object(chunk[join_columns], index=False).to_numpy() % np.uint64(partitions)
+                order = np.argsort(targets, kind='stable')
+                bounds = np.searchsorted(targets[order], np.arange(partitions + 1))
+                for i in range(partitions):
+                    if bounds[i] < bounds[i + 1]:
+                        pickle.dump(chunk.iloc[order[bounds[i]:bounds[i + 1]]], files[i], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        return paths
+    
+    def _partitioned_join(self, left, right, join_columns, join_type, columns, out, work_dir, report):
+        """Join both inputs one hash partition at a time; returns rows written
+        
+        Equal keys land in the same partition on both sides, so joining each
+        pair of partitions with pd.merge gives every match, and every
+        unmatched row, exactly once.
+        """
+        spilled_mb = (left['size'] + right['size']) * TEXT_FRAME_FACTOR / (1024 * 1024)
+        # Leave room for each partition pair's join result as well
+        partitions = min(MAX_JOIN_PARTITIONS, max(2, math.ceil(2 * spilled_mb / self.join_memory_mb)))
+        left_paths = self._spill_side(left, join_columns, partitions, work_dir, lambda f: report(0.4 * f))
+        right_paths = self._spill_side(right, join_columns, partitions, work_dir, lambda f: report(0.4 + 0.4 * f))
+        
+        rows = 0
+        for i, (left_path, right_path) in enumerate(zip(left_paths, right_paths)):
+            joined = pd.merge(_load_partition(left_path, left['columns']), _load_partition(right_path, right['columns']),
+                              on=join_columns, how=join_type)
+            rows += self._write_joined(joined, columns, out)
+            os.remove(left_path)
+            os.remove(right_path)
+            report(0.8 + 0.2 * (i + 1) / partitions)
+        return rows
+    
     def save_merge_report(self, merge_result, report_path):
         """Save a detailed merge report"""
         report = {
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 'c' is pandas' own parser; 'pyarrow' reads with Arrow's multithreaded CSV reader
+PARSE_ENGINES = ('c', 'pyarrow')
+
+# Values pandas' C parser reads as missing, and the spellings it reads as booleans
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+             '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+TRUE_VALUES = ['True', 'TRUE', 'true']
+FALSE_VALUES = ['False', 'FALSE', 'false']
+
+# Integers from here on don't fit int64; Arrow reads them as doubles
+INT64_LIMIT = 2 ** 63
+
+
+def arrow_string_dtype():
+    """Arrow-backed string dtype with NaN for missing values, as pandas' C parser gives"""
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:
+        # pandas before 2.3 spells it as a storage name
+        return pd.StringDtype('pyarrow_numpy')
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _read_arrow(source, encoding, header, usecols, text_columns):
+    """Parse a CSV with pyarrow into a DataFrame that matches what the C engine would give.
+
+    Arrow infers ISO dates and times as timestamps, which would change how
+    they are written back out; the schema is probed from the first block
+    and those columns are read as text instead. Integers beyond int64's
+    range come back from Arrow as lossy doubles where the C engine keeps
+    them exact, so a file with such values raises ValueError.
+    """
+    read_options = pa_csv.ReadOptions(encoding=encoding, skip_rows=header)
+    convert_options = pa_csv.ConvertOptions(null_values=NA_VALUES, strings_can_be_null=True,
+                                            true_values=TRUE_VALUES, false_values=FALSE_VALUES,
+                                            include_columns=usecols)
+    with pa_csv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+        schema = reader.schema
+    if len(set(schema.names)) < len(schema.names):
+        raise ValueError('duplicate column names')
+    _rewind(source)
+
+    convert_options.column_types = {
+        field.name: pa.string() for field in schema
+        if pa.types.is_temporal(field.type) or field.name in text_columns
+    }
+    table = pa_csv.read_csv(source, read_options=read_options, convert_options=convert_options)
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_floating(column.type) and (pc.max(pc.abs(column)).as_py() or 0) >= INT64_LIMIT:
+            raise ValueError(f'values in {name} may be integers too large for int64')
+    # Columns with no values at all are float NaN, as in pandas
+    table = table.cast(pa.schema([
+        field.with_type(pa.float64()) if pa.types.is_null(field.type) else field for field in table.schema
+    ]))
+    string_dtype = arrow_string_dtype()
+    return table.to_pandas(types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get)
+
+
+def read_csv(source, encoding='utf-8', engine='c', header=0, usecols=None, text_columns=()):
+    """Read a whole CSV into a DataFrame with the given parsing engine.
+
+    With engine='pyarrow', the file is parsed on all cores and text columns
+    are kept in Arrow memory (a string dtype backed by pyarrow), which is
+    much smaller than Python string objects. Values are read the same way
+    the C engine reads them. A file pyarrow can't read (pyarrow missing,
+    a column whose type changes after the first block, ragged rows,
+    duplicate column names, integers beyond int64) falls back to the C
+    engine, file by file. Columns in text_columns are read as strings,
+    with missing values still NaN.
+    `source` is a path or a seekable file object.
+    """
+    if engine not in PARSE_ENGINES:
+        raise ValueError(f'Unknown parse engine: {engine}')
+    if engine == 'pyarrow' and HAS_PYARROW:
+        try:
+            return _read_arrow(source, encoding, header, usecols, text_columns)
+        except (pa.ArrowException, UnicodeDecodeError, ValueError) as e:
+            print(f"Parsing with the C engine instead of pyarrow: {e}")
+            _rewind(source)
+    return pd.read_csv(source, encoding=encoding, header=header, usecols=usecols,
+                       dtype={col: str for col in text_columns} or None)
@@ -0,0 +1,190 @@
+import numpy as np
+import csv
+import os
+from record_indexer import blank_records, find_record_ends
+
+
+def count_fields(record):
+    """Count the fields of one raw CSV record"""
+    # latin1 maps every byte to a character, so delimiters and quotes survive
+    text = record.decode('latin1').rstrip('\r\n')
+    if not text:
+        return 0
+    return len(next(csv.reader([text])))
+
+
+class CSVSplitter:
+    """Split a CSV into parts by copying raw record bytes, without pandas"""
+
+    def __init__(self, file_path, max_rows=50000, read_size=16 * 1024 * 1024):
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.read_size = read_size
+        self.file_size = os.path.getsize(file_path)
+        self.table_name_line = b''
+        self.header_line = b''
+        self.data_start = 0
+        self.total_rows = 0
+        self.parts = []  # (start_offset, end_offset, row_count) per part
+
+    @property
+    def prefix(self):
+        """Bytes repeated at the top of every part (table name + header)"""
+        return self.table_name_line + self.header_line
+
+    @property
+    def num_parts(self):
+        return len(self.parts)
+
+    def _read_leading_records(self, count):
+        """Read the first `count` non-blank raw records and the offset just past them"""
+        records = []
+        in_quotes = False
+        pending = b''
+        offset = 0
+        consumed = 0
+
+        with open(self.file_path, 'rb') as f:
+            while len(records) < count:
+                block = f.read(1024 * 1024)
+                if not block:
+                    if pending:
+                        records.append(pending)
+                        consumed = offset
+                    break
+
+                ends, in_quotes_after = find_record_ends(block, in_quotes)
+                start = 0
+                for end in ends:
+                    record = pending + block[start:end]
+                    pending = b''
+                    start = end
+                    # pandas skips blank lines, before the header too
+                    if record in (b'\n', b'\r\n'):
+                        continue
+                    records.append(record)
+                    consumed = offset + end
+                    if len(records) >= count:
+                        break
+                pending += block[start:]
+                in_quotes = in_quotes_after
+                offset += len(block)
+
+        return records, consumed
+
+    def read_header(self):
+        """Detect the optional table-name line and the column header"""
+        leading, _ = self._read_leading_records(2)
+        if not leading:
+            raise ValueError('File is empty')
+
+        # A single-field first line followed by a wider line is a table name
+        if len(leading) == 2 and count_fields(leading[0]) == 1 and count_fields(leading[1]) > 1:
+            self.table_name_line = leading[0]
+            self.header_line = leading[1]
+        else:
+            self.table_name_line = b''
+            self.header_line = leading[0]
+
+        _, self.data_start = self._read_leading_records(2 if self.table_name_line else 1)
+
+        # Make sure the header ends with a newline before data is appended
+        if not self.header_line.endswith(b'\n'):
+            self.header_line += b'\r\n' if b'\r' in self.header_line else b'\n'
+
+        return self.prefix
+
+    def scan(self, progress_callback=None):
+        """Count records and record the byte range of every part.
+
+        Blank lines are skipped as pandas skips them: they stay inside a part's
+        byte range but aren't counted as rows. One block is held at a time,
+        so memory stays flat however many rows the file has; a full record
+        index (RecordIndexer) would grow with the row count and, for
+        splitting, was slower even on several cores.
+        """
+        if not self.header_line:
+            self.read_header()
+
+        self.parts = []
+        self.total_rows = 0
+        part_start = self.data_start
+        rows_in_part = 0
+        in_quotes = False
+        offset = self.data_start
+        record_start = self.data_start
+        previous = ord('\n')
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.data_start)
+            while True:
+                block = f.read(self.read_size)
+                if not block:
+                    break
+
+                ends, in_quotes = find_record_ends(block, in_quotes)
+                if len(ends):
+                    starts = np.concatenate(([record_start - offset], ends[:-1]))
+                    blank = blank_records(np.frombuffer(block, dtype=np.uint8), starts, ends, previous)
+                    record_start = offset + int(ends[-1])
+                    ends = ends[~blank]
+                ends = ends + offset
+                previous = block[-1]
+
+                # Close as many parts as this block completes
+                position = 0
+                while len(ends) - position >= self.max_rows - rows_in_part:
+                    position += self.max_rows - rows_in_part
+                    part_end = int(ends[position - 1])
+                    self.parts.append((part_start, part_end, self.max_rows))
+                    self.total_rows += self.max_rows
+                    part_start = part_end
+                    rows_in_part = 0
+                rows_in_part += len(ends) - position
+
+                offset += len(block)
+                if progress_callback:
+                    progress_callback(offset, self.file_size)
+
+        # A trailing record without a final newline still counts
+        if offset > record_start and previous != ord('\n'):
+            rows_in_part += 1
+
+        if rows_in_part:
+            self.parts.append((part_start, offset, rows_in_part))
+            self.total_rows += rows_in_part
+
+        return self.total_rows
+
+    def part_name(self, part_index):
+        return f"part_{part_index + 1}_of_{self.num_parts}.csv"
+
+    def iter_part_bytes(self, part_index, block_size=1024 * 1024):
+        """Yield the bytes of one part: prefix followed by its records"""
+        start, end, _ = self.parts[part_index]
+        yield self.prefix
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    def write_part(self, part_index, output_path):
+        """Write one part to disk by copying its byte range"""
+        start, end, _ = self.parts[part_index]
+        with open(self.file_path, 'rb') as src, open(output_path, 'wb') as dst:
+            dst.write(self.prefix)
+            src.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                block = src.read(min(1024 * 1024, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                dst.write(block)
+        return output_path
@@ -3,29 +3,259 @@ import numpy as np
 from datetime import datetime
 import os
 
+from csv_reader import HAS_PYARROW, arrow_string_dtype, read_csv
+from encoding_detector import detect_encoding
+from fuzzy_matcher import MATCH_THRESHOLD, match_codes
+from record_indexer import blank_records, find_record_ends
+
+# Keep strategies that match keys loosely; both keep the first row of each match group
+MATCH_STRATEGIES = ('normalized', 'fuzzy')
+
+
+def check_key_store(key_store, check_columns, keep_strategy):
+    """Raise ValueError unless key_store can be used to dedup on check_columns with keep_strategy"""
+    key_store.check_columns(check_columns)
+    if keep_strategy in MATCH_STRATEGIES:
+        # The store holds hashes of the exact key text, which loose matches don't compare by
+        raise ValueError(f'Key stores match keys exactly and can\'t be used with {keep_strategy} matching')
+
+def key_codes(keys):
+    """Return (codes, groups): a dense group number per row of the key columns.
+
+    The key columns are collapsed into one uint64 hash per row, and the
+    grouping runs on that array instead of on the (often object dtype)
+    columns. Rows that share a hash are compared with their group's first
+    row, so a hash collision can never merge different keys; if one shows
+    up, the exact (slower) column grouping is used instead. Missing values
+    compare equal to each other, as in drop_duplicates.
+    """
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    codes, uniques = pd.factorize(hashes)
+    groups = len(uniques)
+    
+    # Only rows that repeat an earlier hash need checking
+    heads = group_heads(codes, groups)
+    repeats = np.flatnonzero(heads[codes] != np.arange(len(codes)))
+    if len(repeats) and not _keys_equal(keys, repeats, heads[codes[repeats]]):
+        codes = keys.groupby(list(keys.columns), sort=False, dropna=False).ngroup().to_numpy()
+        groups = int(codes.max()) + 1
+    return codes.astype(np.int64, copy=False), groups
+
+def _keys_equal(keys, rows, others):
+    """Whether every row in `rows` has the same key as the matching row in `others`"""
+    for col in keys.columns:
+        values = keys[col].to_numpy()
+        a, b = values[rows], values[others]
+        equal = a == b
+        if not equal.all():
+            # NaN != NaN, but missing keys still group together
+            equal |= pd.isna(a) & pd.isna(b)
+            if not equal.all():
+                return False
+    return True
+
+def row_key_hashes(keys):
+    """Stable uint64 hash of each row's key, for keys kept across files.
+
+    Every column is hashed as object-dtype text, so the same key gives the
+    same hash whichever file (and pandas dtype) it came from.
+    """
+    return pd.util.hash_pandas_object(keys.astype(str).astype(object), index=False).to_numpy()
+
+def group_heads(codes, groups, keep='first'):
+    """Index of the first (or last) row of each group"""
+    heads = np.empty(groups, dtype=np.int64)
+    rows = np.arange(len(codes), dtype=np.int64)
+    if keep == 'first':
+        # With repeated indices the last assignment wins, so assign in reverse
+        heads[codes[::-1]] = rows[::-1]
+    else:
+        heads[codes] = rows
+    return heads
+
+def summarize_duplicates(df, codes, groups, check_columns, max_groups=5, confidence=None):
+    """Duplicate counts plus a preview of the first groups, in file order
+
+    With a per-group `confidence` (from match_codes), each previewed group
+    also reports its confidence and the distinct key values it matched.
+    """
+    # Rows whose key occurs more than once (including the first occurrence)
+    counts = np.bincount(codes, minlength=groups)
+    duplicated_mask = counts[codes] > 1
+    total_duplicate_rows = int(duplicated_mask.sum())
+    duplicate_groups = int((counts > 1).sum())
+    
+    result = {
+        'total_duplicate_rows': total_duplicate_rows,
+        'duplicate_groups': duplicate_groups,
+        'rows_to_remove': total_duplicate_rows - duplicate_groups,  # Keeping one from each group
+        'preview': []
+    }
+    if confidence is not None:
+        matched = confidence[counts > 1]
+        result['lowest_confidence'] = round(float(matched.min()), 3) if len(matched) else 1.0
+    
+    for code in pd.unique(codes[duplicated_mask])[:max_groups]:
+        group = df[codes == code]
+        entry = {
+            'duplicate_values': group[check_columns].head(1).to_dict('records')[0],
+            'occurrences': int(counts[code]),
+            'sample_rows': group.head(3).to_dict('records')
+        }
+        if confidence is not None:
+            entry['confidence'] = round(float(confidence[code]), 3)
+            entry['variants'] = group[check_columns].drop_duplicates().head(5).to_dict('records')
+        result['preview'].append(entry)
+    return result
+
+def compact_columns(frame, columns):
+    """Shrink columns of a frame in place, without changing which values are equal.
+
+    Integers are downcast to the smallest type that holds them. Text that
+    repeats (at most half the values distinct) becomes categorical, and
+    other text is stored as Arrow-backed strings when pyarrow is installed.
+    Columns mixing text with other values are left as they are.
+    """
+    for col in columns:
+        values = frame[col]
+        if pd.api.types.is_integer_dtype(values):
+            frame[col] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_string_dtype(values) and pd.api.types.infer_dtype(values, skipna=True) == 'string':
+            if values.nunique(dropna=False) <= len(values) // 2:
+                frame[col] = values.astype('category')
+            elif HAS_PYARROW and values.dtype == object:
+                frame[col] = values.astype(arrow_string_dtype())
+    return frame
+
+def strategy_values(column, keep_strategy, date_format=None):
+    """Map a strategy column to values where the largest one wins its group"""
+    if keep_strategy == 'not_empty':
+        return column.notna()
+    if keep_strategy == 'max_value':
+        return pd.to_numeric(column, errors='coerce')
+    if keep_strategy == 'most_recent':
+        # Parse as UTC so naive and zoned timestamps compare on one timeline
+        return pd.to_datetime(column, errors='coerce', utc=True, format=date_format)
+    return None
+
+def _rank_array(values):
+    """Return strategy values as a numpy array where missing values rank lowest"""
+    missing = values.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # Compare timestamps as integers; float64 would lose sub-microsecond order
+        ranks = values.dt.tz_localize(None).to_numpy().view(np.int64).copy()
+        ranks[missing] = np.iinfo(np.int64).min
+    else:
+        ranks = values.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        ranks[missing] = -np.inf
+    return ranks
+
+def winning_rows(codes, values):
+    """Boolean mask of the row with the largest value in each group.
+
+    `codes` are dense group numbers per row. Missing values lose, and ties
+    (including groups with no values at all) go to the earliest row. Runs
+    in linear time with no sort, so row order is untouched.
+    """
+    n = len(codes)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    codes = np.asarray(codes, dtype=np.int64)
+    ranks = _rank_array(values)
+    groups = codes.max() + 1
+    
+    best = np.full(groups, ranks.min(), dtype=ranks.dtype)
+    np.maximum.at(best, codes, ranks)
+    candidates = np.flatnonzero(ranks == best[codes])
+    
+    first = np.full(groups, n, dtype=np.int64)
+    np.minimum.at(first, codes[candidates], candidates)
+    keep[first] = True
+    return keep
+
+def keep_mask(codes, groups, keep_strategy='first', values=None, order=None):
+    """Boolean mask of the one row each group keeps.
+
+    'first'/'last' keep the group's first or last row; with `values` (see
+    strategy_values) the row with the largest value wins. `order` is an
+    optional permutation ranking the rows, such as files by priority:
+    "first", "last" and ties are then judged in that order instead of
+    row order.
+    """
+    if order is not None:
+        ranked_values = None if values is None else values.iloc[order].reset_index(drop=True)
+        keep = np.empty(len(codes), dtype=bool)
+        keep[order] = keep_mask(codes[order], groups, keep_strategy, ranked_values)
+        return keep
+    
+    if values is not None:
+        return winning_rows(codes, values)
+    keep = np.zeros(len(codes), dtype=bool)
+    keep[group_heads(codes, groups, 'last' if keep_strategy == 'last' else 'first')] = True
+    return keep
+
 class DuplicateRemover:
-    def __init__(self, file_path=None, encoding='utf-8'):
+    def __init__(self, file_path=None, encoding='utf-8', parse_engine='c'):
         self.file_path = file_path
         self.encoding = encoding
+        self.parse_engine = parse_engine  # See csv_reader.PARSE_ENGINES
         self.df = None
         self.original_row_count = 0
-        self.encodings_to_try = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+        self._key_cache = {}
         
-    def load_file(self, file_path=None):
-        """Load CSV file with automatic encoding detection"""
+    def text_key_hashes(self, check_columns):
+        """row_key_hashes of the key columns as they are written in the file"""
+        keys = pd.read_csv(self.file_path, encoding=self.encoding, usecols=check_columns,
+                           dtype=str, keep_default_na=False)
+        return row_key_hashes(keys[check_columns])
+        
+    def text_keys(self, check_columns):
+        """The key columns of the loaded rows as text, as every dedup path compares them
+        
+        Keys are re-read from the file with load_columns, so `007` and `7`
+        (or `1.0` and `1`) stay different keys although the loaded frame
+        may hold them as equal numbers.
+        """
+        if self.file_path is None:
+            return self.df[check_columns].astype(str).where(self.df[check_columns].notna())
+        return self.load_columns(check_columns, text_columns=check_columns)[check_columns]
+        
+    def key_codes(self, check_columns):
+        """Hashed group codes for the key columns as text, shared by preview and removal"""
+        if self.df is None:
+            self.load_file()
+        
+        cache_key = tuple(check_columns)
+        cached = self._key_cache.get(cache_key)
+        if cached is None or cached[0] is not self.df:
+            cached = (self.df, *key_codes(self.text_keys(check_columns)))
+            self._key_cache[cache_key] = cached
+        return cached[1], cached[2]
+        
+    def match_codes(self, check_columns, keep_strategy, match_threshold=MATCH_THRESHOLD):
+        """(codes, groups, confidence) for a normalized or fuzzy keep strategy, cached like key_codes"""
+        if self.df is None:
+            self.load_file()
+        
+        cache_key = (tuple(check_columns), keep_strategy, match_threshold)
+        cached = self._key_cache.get(cache_key)
+        if cached is None or cached[0] is not self.df:
+            cached = (self.df, *match_codes(self.text_keys(check_columns), keep_strategy == 'fuzzy',
+                                            match_threshold))
+            self._key_cache[cache_key] = cached
+        return cached[1:]
+        
+    def load_file(self, file_path=None, encoding=None):
+        """Load CSV file, detecting its encoding unless one is given"""
         if file_path:
             self.file_path = file_path
-            
-        for encoding in self.encodings_to_try:
-            try:
-                self.df = pd.read_csv(self.file_path, encoding=encoding)
-                self.encoding = encoding
-                self.original_row_count = len(self.df)
-                return True
-            except UnicodeDecodeError:
-                continue
-        
-        raise UnicodeDecodeError(f"Could not decode file with any of these encodings: {', '.join(self.encodings_to_try)}")
+        
+        self.encoding = encoding or detect_encoding(self.file_path)
+        self.df = read_csv(self.file_path, self.encoding, self.parse_engine)
+        self.original_row_count = len(self.df)
+        self._key_cache = {}
+        return True
     
     def analyze_file(self):
         """Returns columns, row count, data types, and sample data"""
@@ -42,78 +272,67 @@ class DuplicateRemover:
         
         return analysis
     
-    def find_duplicates(self, check_columns):
-        """Returns count and preview of duplicates"""
+    def find_duplicates(self, check_columns, keep_strategy='first', match_threshold=MATCH_THRESHOLD):
+        """Returns count and preview of duplicates, with match confidence for MATCH_STRATEGIES"""
         if self.df is None:
             self.load_file()
-            
-        # Find all rows that have duplicates (including the first occurrence)
-        duplicated_mask = self.df.duplicated(subset=check_columns, keep=False)
-        duplicate_rows = self.df[duplicated_mask]
-        
-        # Count unique duplicate groups
-        duplicate_groups = duplicate_rows.groupby(check_columns).size()
-        
-        result = {
-            'total_duplicate_rows': len(duplicate_rows),
-            'duplicate_groups': len(duplicate_groups),
-            'rows_to_remove': len(duplicate_rows) - len(duplicate_groups),  # Keeping one from each group
-            'preview': []
-        }
         
-        # Get preview of first 5 duplicate groups
-        preview_count = 0
-        for cols, group in duplicate_rows.groupby(check_columns):
-            if preview_count >= 5:
-                break
+        if keep_strategy in MATCH_STRATEGIES:
+            codes, groups, confidence = self.match_codes(check_columns, keep_strategy, match_threshold)
+            result = summarize_duplicates(self.df, codes, groups, check_columns, confidence=confidence)
+            result['match_strategy'] = keep_strategy
+            return result
             
-            group_data = {
-                'duplicate_values': {col: group.iloc[0][col] for col in check_columns},
-                'occurrences': len(group),
-                'sample_rows': group.head(3).to_dict('records')
-            }
-            result['preview'].append(group_data)
-            preview_count += 1
-            
-        return result
+        codes, groups = self.key_codes(check_columns)
+        return summarize_duplicates(self.df, codes, groups, check_columns)
     
-    def remove_duplicates(self, check_columns, keep_strategy='first', strategy_column=None):
-        """Apply deduplication logic and return cleaned dataframe"""
+    def _surviving(self, frame, check_columns, keep_strategy, strategy_column, match_threshold):
+        """Boolean mask of the rows of frame (self.df or a frame of its columns) kept by the strategy"""
+        loaded = frame is self.df
+        if keep_strategy in ['first', 'last']:
+            # Simple keep first or last
+            codes, groups = self.key_codes(check_columns) if loaded else key_codes(frame[check_columns])
+            return keep_mask(codes, groups, keep_strategy)
+        
+        if keep_strategy in MATCH_STRATEGIES:
+            # Keep the first row of each group of normalized or similar keys
+            codes, groups, _ = (self.match_codes(check_columns, keep_strategy, match_threshold) if loaded
+                                else match_codes(frame[check_columns], keep_strategy == 'fuzzy', match_threshold))
+            return keep_mask(codes, groups)
+        
+        if keep_strategy in ['not_empty', 'max_value', 'most_recent'] and strategy_column:
+            # Keep the row with a value / the highest number / the latest date in each group
+            codes, groups = self.key_codes(check_columns) if loaded else key_codes(frame[check_columns])
+            values = strategy_values(frame[strategy_column], keep_strategy)
+            return keep_mask(codes, groups, keep_strategy, values)
+        
+        return np.ones(len(frame), dtype=bool)
+    
+    def remove_duplicates(self, check_columns, keep_strategy='first', strategy_column=None,
+                          key_store=None, update_key_store=False, match_threshold=MATCH_THRESHOLD):
+        """Apply deduplication logic and return cleaned dataframe
+
+        The 'normalized' and 'fuzzy' strategies keep the first row of each
+        group of matching keys (see fuzzy_matcher.match_codes). With a
+        KeyStore, rows whose key is already in the store are dropped too,
+        and with update_key_store the keys that survive are added to it.
+        """
         if self.df is None:
             self.load_file()
-            
-        # Create a copy to work with
-        df_clean = self.df.copy()
+        if key_store is not None:
+            check_key_store(key_store, check_columns, keep_strategy)
         
-        if keep_strategy in ['first', 'last']:
-            # Simple keep first or last
-            df_clean = df_clean.drop_duplicates(subset=check_columns, keep=keep_strategy)
-        
-        elif keep_strategy == 'not_empty' and strategy_column:
-            # Sort by non-null values in strategy column (non-null first)
-            df_clean['_has_value'] = ~df_clean[strategy_column].isna()
-            df_clean = df_clean.sort_values(['_has_value'] + check_columns, 
-                                           ascending=[False] + [True] * len(check_columns))
-            df_clean = df_clean.drop_duplicates(subset=check_columns, keep='first')
-            df_clean = df_clean.drop('_has_value', axis=1)
-            
-        elif keep_strategy == 'max_value' and strategy_column:
-            # Keep row with highest value in strategy column
-            # Convert to numeric, coercing errors to NaN
-            df_clean['_numeric_value'] = pd.to_numeric(df_clean[strategy_column], errors='coerce')
-            df_clean = df_clean.sort_values(['_numeric_value'] + check_columns, 
-                                           ascending=[False] + [True] * len(check_columns))
-            df_clean = df_clean.drop_duplicates(subset=check_columns, keep='first')
-            df_clean = df_clean.drop('_numeric_value', axis=1)
-            
-        elif keep_strategy == 'most_recent' and strategy_column:
-            # Keep row with most recent date
-            # Try to parse dates
-            df_clean['_parsed_date'] = pd.to_datetime(df_clean[strategy_column], errors='coerce')
-            df_clean = df_clean.sort_values(['_parsed_date'] + check_columns, 
-                                           ascending=[False] + [True] * len(check_columns))
-            df_clean = df_clean.drop_duplicates(subset=check_columns, keep='first')
-            df_clean = df_clean.drop('_parsed_date', axis=1)
+        df_clean = self.df[self._surviving(self.df, check_columns, keep_strategy, strategy_column, match_threshold)]
+        
+        already_seen_rows = 0
+        if key_store is not None:
+            # Drop keys accepted by earlier runs, then remember the ones kept now
+            hashes = self.text_key_hashes(check_columns)[self.df.index.get_indexer(df_clean.index)]
+            seen = key_store.contains(hashes)
+            already_seen_rows = int(seen.sum())
+            df_clean = df_clean[~seen]
+            if update_key_store:
+                key_store.add(hashes[~seen], check_columns)
             
         # Calculate statistics
         rows_removed = self.original_row_count - len(df_clean)
@@ -123,10 +342,128 @@ class DuplicateRemover:
             'original_rows': self.original_row_count,
             'cleaned_rows': len(df_clean),
             'rows_removed': rows_removed,
+            'already_seen_rows': already_seen_rows,
             'removal_percentage': (rows_removed / self.original_row_count) * 100 if self.original_row_count > 0 else 0
         }
     
     def save_cleaned_file(self, cleaned_df, output_path):
         """Save the cleaned dataframe to a CSV file"""
         cleaned_df.to_csv(output_path, index=False, encoding=self.encoding)
-        return output_path
\ No newline at end of file
+        return output_path
+    
+    def load_columns(self, columns, text_columns=()):
+        """Only the given columns of the file, with compact dtypes (see compact_columns)
+        
+        Always parsed with the C engine, which drops the other columns as it
+        tokenizes. pyarrow reads ahead through the whole file, so its peak
+        memory would follow the file's size rather than the columns kept.
+        Columns in text_columns are read as text rather than inferred.
+        """
+        if self.encoding is None:
+            self.encoding = detect_encoding(self.file_path)
+        frame = read_csv(self.file_path, self.encoding, usecols=columns, text_columns=text_columns)
+        return compact_columns(frame, columns)
+    
+    def copy_rows(self, keep, output_path, block_size=16 * 1024 * 1024):
+        """Copy the header and the data rows where keep is True to output_path, byte for byte.
+        
+        Records are found with a quote-aware scan of the raw bytes, and runs
+        of kept records are written as single slices. Blank lines aren't
+        rows, as pandas skips them too, and are left out. Returns the number
+        of data rows found, which is len(keep) if the file was read the way
+        pandas read it.
+        """
+        rows = 0
+        header_done = False
+        pending = b''
+        in_quotes = False
+        with open(self.file_path, 'rb') as f, open(output_path, 'wb') as out:
+            while True:
+                block = f.read(block_size)
+                if block:
+                    ends, in_quotes = find_record_ends(block, in_quotes)
+                    if not len(ends):
+                        pending += block
+                        continue
+                    buffer = pending + block[:ends[-1]]
+                    pending = block[ends[-1]:]
+                    bounds = np.concatenate([[0], ends + (len(buffer) - ends[-1])])
+                elif pending:
+                    # The last record had no line ending of its own
+                    buffer, pending = pending, b''
+                    bounds = np.array([0, len(buffer)])
+                else:
+                    break
+                
+                starts, stops = bounds[:-1], bounds[1:]
+                records = ~blank_records(np.frombuffer(buffer, dtype=np.uint8), starts, stops)
+                if not header_done:
+                    nonblank = np.flatnonzero(records)
+                    if not len(nonblank):
+                        continue
+                    header = nonblank[0]
+                    out.write(buffer[starts[header]:stops[header]])
+                    records[:header + 1] = False
+                    header_done = True
+                
+                numbers = rows + np.cumsum(records) - 1
+                rows += int(records.sum())
+                wanted = np.flatnonzero(records & (numbers < len(keep)))
+                wanted = wanted[keep[numbers[wanted]]]
+                if not len(wanted):
+                    continue
+                # Write each run of consecutive kept records in one slice
+                breaks = np.flatnonzero(np.diff(wanted) != 1) + 1
+                view = memoryview(buffer)
+                for run_start, run_end in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(wanted)]])):
+                    out.write(view[starts[wanted[run_start]]:stops[wanted[run_end - 1]]])
+        return rows
+    
+    def remove_duplicates_to_file(self, check_columns, output_path, keep_strategy='first', strategy_column=None,
+                                  key_store=None, update_key_store=False, match_threshold=MATCH_THRESHOLD):
+        """Deduplicate in two phases and write the result to output_path; returns removal statistics
+        
+        Phase one loads only the key and strategy columns (load_columns)
+        and finds the surviving rows; phase two copies those rows from the
+        file as they are (copy_rows), so the other columns are never
+        parsed. Strategies and key_store work as in remove_duplicates. If
+        the raw scan doesn't find the rows pandas read (a UTF-16/32 file,
+        lines ending in a bare carriage return), the whole file is loaded
+        and written with pandas instead.
+        """
+        if key_store is not None:
+            check_key_store(key_store, check_columns, keep_strategy)
+        usecols = list(dict.fromkeys(check_columns + ([strategy_column] if strategy_column else [])))
+        # Keys are compared as text, as StreamingDeduplicator compares them
+        frame = self.load_columns(usecols, text_columns=check_columns)
+        self.original_row_count = len(frame)
+        keep = self._surviving(frame, check_columns, keep_strategy, strategy_column, match_threshold)
+        del frame
+        
+        already_seen_rows = 0
+        if key_store is not None:
+            # Drop keys accepted by earlier runs, then remember the ones kept now
+            rows = np.flatnonzero(keep)
+            hashes = self.text_key_hashes(check_columns)[rows]
+            seen = key_store.contains(hashes)
+            already_seen_rows = int(seen.sum())
+            keep[rows[seen]] = False
+            if update_key_store:
+                key_store.add(hashes[~seen], check_columns)
+        
+        byte_scan = not self.encoding.lower().replace('_', '-').startswith(('utf-16', 'utf-32'))
+        if not byte_scan or self.copy_rows(keep, output_path) != len(keep):
+            print(f"Writing {self.file_path} with pandas: its records can't be copied as raw bytes")
+            self.load_file(encoding=self.encoding)
+            self.save_cleaned_file(self.df[keep], output_path)
+        
+        cleaned_rows = int(keep.sum())
+        rows_removed = self.original_row_count - cleaned_rows
+        return {
+            'output_path': output_path,
+            'original_rows': self.original_row_count,
+            'cleaned_rows': cleaned_rows,
+            'rows_removed': rows_removed,
+            'already_seen_rows': already_seen_rows,
+            'removal_percentage': (rows_removed / self.original_row_count) * 100 if self.original_row_count > 0 else 0
+        }
\ No newline at end of file
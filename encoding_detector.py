@@ -0,0 +1,73 @@
+import codecs
+import os
+
+import numpy as np
+
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# Byte order marks, longest first so UTF-32 isn't mistaken for UTF-16
+BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Bytes in 0x80-0x9F that cp1252 leaves undefined
+CP1252_UNDEFINED = [0x81, 0x8D, 0x8F, 0x90, 0x9D]
+
+
+def detect_encoding(source, block_size=BLOCK_SIZE):
+    """Detect the text encoding of a CSV file in a single pass over its bytes.
+
+    `source` is a path or a seekable binary file object (left at the
+    position it was in). A BOM wins outright. Otherwise the bytes are
+    validated as UTF-8 while a byte histogram is collected; if they are not
+    valid UTF-8, the histogram picks cp1252 when the file uses its
+    printable 0x80-0x9F range (smart quotes, dashes, the euro sign) and
+    latin1 otherwise. latin1 decodes any byte, so detection never fails.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return _detect(f, block_size)
+
+    position = source.tell()
+    try:
+        return _detect(source, block_size)
+    finally:
+        source.seek(position)
+
+
+def _detect(f, block_size):
+    first = f.read(block_size)
+    for bom, encoding in BOMS:
+        if first.startswith(bom):
+            return encoding
+
+    counts = np.zeros(256, dtype=np.int64)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    utf8_ok = True
+
+    block = first
+    while block:
+        counts += np.bincount(np.frombuffer(block, dtype=np.uint8), minlength=256)
+        if utf8_ok:
+            try:
+                decoder.decode(block)
+            except UnicodeDecodeError:
+                utf8_ok = False
+        block = f.read(block_size)
+
+    if utf8_ok:
+        try:
+            # A multi-byte sequence cut off at the end of the file is invalid
+            decoder.decode(b'', final=True)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+    c1 = counts[0x80:0xA0]
+    if c1.any() and not counts[CP1252_UNDEFINED].any():
+        return 'cp1252'
+    return 'latin1'
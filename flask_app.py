@@ -1,4 +1,4 @@
-from flask import Flask, request, send_file, render_template_string, jsonify
+from flask import Flask, Response, request, send_file, render_template_string, jsonify, stream_with_context
 try:
     from models import db, FileProcess, DuplicateRemoval, MergeOperation
     HAS_DB = True
@@ -9,17 +9,29 @@ import time
 import pandas as pd
 import math
 import os
-import io
-import zipfile
 import shutil
 import csv
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import uuid
 import threading
+import multiprocessing
+import functools
+import hashlib
 import json
-from duplicate_remover import DuplicateRemover
-from csv_merger import CSVMerger
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from duplicate_remover import DuplicateRemover, MATCH_STRATEGIES, check_key_store
+from fuzzy_matcher import MATCH_THRESHOLD
+from csv_merger import TEXT_FRAME_FACTOR, CSVMerger
+from csv_splitter import CSVSplitter
+from csv_reader import read_csv, HAS_PYARROW
+from zip_stream import compress_member, iter_streamed_zip, write_zip
+from upload_cache import UploadCache
+from encoding_detector import detect_encoding
+from streaming_dedup import StreamingDeduplicator
+from job_store import JobStore, JobCancelled
+from key_store import KeyStore
+from job_scheduler import JobScheduler, JobQueueFull
 
 # Notification imports
 try:
@@ -60,11 +72,59 @@ if HAS_DB:
         print("Continuing without database features")
         HAS_DB = False
 
+# Background jobs run at once per web worker process
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+
 # Add these after the Flask app initialization
 app.processed_files = []
 app.total_splits = 0
-# Progress tracking for large files
-app.processing_status = {}
+# Progress tracking for large files, shared by all worker processes
+app.processing_status = JobStore(os.environ.get('JOB_STORE_PATH', 'jobs.db'))
+# Job processes spawned by the scheduler import this module for the job
+# functions; only the web process purges old jobs and schedules new ones
+if multiprocessing.parent_process() is None:
+    app.processing_status.purge()
+    app.processing_status.start_heartbeat()
+    # Background jobs run on a bounded process pool within a memory budget,
+    # enforced per web worker process
+    app.job_scheduler = JobScheduler(
+        app.processing_status,
+        max_workers=JOB_WORKERS,
+        memory_budget_mb=int(os.environ.get('JOB_MEMORY_BUDGET_MB', 2048)),
+        max_queued=int(os.environ.get('JOB_QUEUE_LIMIT', 50))
+    )
+# Uploads shared by the analyze/preview/process steps, keyed by content hash
+app.upload_cache = UploadCache(
+    os.environ.get('UPLOAD_CACHE_DIR', 'upload_cache'),
+    ttl=int(os.environ.get('UPLOAD_CACHE_TTL', 3600)),
+    max_bytes=int(os.environ.get('UPLOAD_CACHE_MAX_MB', 2048)) * 1024 * 1024
+)
+# Uploads above this size are deduplicated out of core, as a background job
+DEDUP_STREAMING_MB = int(os.environ.get('DEDUP_STREAMING_MB', 200))
+# Processes each out-of-core dedup uses for its partitions. By default the
+# job pool and these pools together use about one process per core
+DEDUP_WORKERS = int(os.environ.get('DEDUP_WORKERS', max(1, (os.cpu_count() or 1) // JOB_WORKERS)))
+# Memory of one partition process: a spawned interpreter with pandas plus
+# the keys of one partition (about 64 MB of input)
+DEDUP_PARTITION_MEMORY_MB = 192
+# Larger uploads get a sampled duplicate preview, refined by a background count
+DEDUP_PREVIEW_SAMPLE_MB = int(os.environ.get('DEDUP_PREVIEW_SAMPLE_MB', 16))
+# Named stores of row-key hashes for deduplicating across uploads
+KEY_STORE_DIR = os.environ.get('KEY_STORE_DIR', 'key_stores')
+# Largest join input (as loaded text) kept in memory; bigger joins spill to disk
+JOIN_MEMORY_MB = int(os.environ.get('JOIN_MEMORY_MB', 1024))
+# Parser for whole-file loads: 'c' (pandas) or 'pyarrow' (multithreaded, Arrow-backed strings)
+CSV_PARSE_ENGINE = os.environ.get('CSV_PARSE_ENGINE', 'c')
+if CSV_PARSE_ENGINE == 'pyarrow' and not HAS_PYARROW:
+    print("pyarrow not available - parsing CSVs with the C engine")
+# Request threads per worker process; the Procfile and Dockerfile pass this to gunicorn's --threads
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 32))
+# Open /progress-stream connections per worker process. Each one holds a request
+# thread until its job ends, so a few threads are always left for other requests
+PROGRESS_STREAM_LIMIT = int(os.environ.get('PROGRESS_STREAM_LIMIT', max(1, WEB_THREADS - 8)))
+progress_streams = threading.BoundedSemaphore(PROGRESS_STREAM_LIMIT)
+# Rows of each later file searched for keys matching a join preview
+MERGE_PREVIEW_SCAN_ROWS = int(os.environ.get('MERGE_PREVIEW_SCAN_ROWS', 100000))
 
 # Notification configuration
 SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
@@ -396,6 +456,7 @@ TEMPLATE = '''
                 <div style="width: 300px; height: 20px; background-color: rgba(255,255,255,0.3); border-radius: 10px; margin: 10px auto;">
                     <div id="progress-bar" style="width: 0%; height: 100%; background-color: white; border-radius: 10px; transition: width 0.3s;"></div>
                 </div>
+                <button type="button" id="cancel-split-btn" style="background: #ff4444; padding: 5px 10px; font-size: 12px;">Cancel</button>
             </div>
         </div>
 
@@ -448,15 +509,37 @@ TEMPLATE = '''
                             <option value="not_empty">Keep row where specific column is not empty</option>
                             <option value="most_recent">Keep row with most recent date</option>
                             <option value="max_value">Keep row with highest value</option>
+                            <option value="normalized">Keep first, ignoring case, spacing, punctuation and accents</option>
+                            <option value="fuzzy">Keep first, matching similar values (fuzzy)</option>
                         </select>
                     </div>
 
+                    <div id="match-threshold-group" class="input-group hidden">
+                        <label>Similarity threshold (0.5 - 1.0):</label>
+                        <input type="number" id="match-threshold" value="0.9" min="0.5" max="1" step="0.01" style="width: 100%; padding: 8px; margin-top: 8px;">
+                    </div>
+
                     <div id="strategy-column-group" class="input-group hidden">
                         <label>Select column for strategy:</label>
                         <select id="strategy-column" style="width: 100%; padding: 8px; margin-top: 8px;">
                         </select>
                     </div>
 
+                    <div class="input-group">
+                        <label>Key store (optional, skips keys seen in earlier files):</label>
+                        <input type="text" id="key-store" list="key-store-names" placeholder="e.g. customers" style="width: 100%; padding: 8px; margin-top: 8px;">
+                        <datalist id="key-store-names"></datalist>
+                        <label style="display: block; margin-top: 8px;">
+                            <input type="checkbox" id="update-key-store" checked> Add the kept rows' keys to the store
+                        </label>
+                    </div>
+
+                    <div class="input-group">
+                        <label>
+                            <input type="checkbox" id="dedup-prefilter"> Few duplicates expected (check keys with a Bloom filter first)
+                        </label>
+                    </div>
+
                     <div style="margin-top: 20px;">
                         <button onclick="previewDuplicates()" style="background: #666;">Preview Duplicates</button>
                         <button onclick="processDuplicates()">Remove Duplicates</button>
@@ -472,7 +555,7 @@ TEMPLATE = '''
                 <!-- Loading -->
                 <div class="loading-container" id="duplicate-loading" style="display: none;">
                     <div class="spinner"></div>
-                    <p style="color: #666; margin-top: 10px;">Processing duplicates...</p>
+                    <p style="color: #666; margin-top: 10px;" id="duplicate-progress-message">Processing duplicates...</p>
                 </div>
 
                 <!-- Success -->
@@ -547,6 +630,40 @@ TEMPLATE = '''
                                 Add source file column
                             </label>
                         </div>
+                        
+                        <div class="input-group" style="margin-top: 10px;">
+                            <label>Remove duplicates across files by (optional):</label>
+                            <select id="merge-dedup-columns" multiple style="width: 100%; height: 100px; padding: 8px; margin-top: 8px;">
+                            </select>
+                        </div>
+                        
+                        <div id="merge-dedup-options" class="hidden">
+                            <div class="input-group" style="margin-top: 10px;">
+                                <label>When a key is in several files:</label>
+                                <select id="merge-source-priority" style="width: 100%; padding: 8px; margin-top: 8px;">
+                                    <option value="first">Earlier files win</option>
+                                    <option value="last">Later files win (e.g. newest export added last)</option>
+                                </select>
+                            </div>
+                            
+                            <div class="input-group" style="margin-top: 10px;">
+                                <label>Keep strategy:</label>
+                                <select id="merge-keep-strategy" style="width: 100%; padding: 8px; margin-top: 8px;">
+                                    <option value="first">Keep first occurrence</option>
+                                    <option value="last">Keep last occurrence</option>
+                                    <option value="not_empty">Keep row where specific column is not empty</option>
+                                    <option value="most_recent">Keep row with most recent date</option>
+                                    <option value="max_value">Keep row with highest value</option>
+                                    <option value="normalized">Keep first, ignoring case, spacing, punctuation and accents</option>
+                                </select>
+                            </div>
+                            
+                            <div id="merge-strategy-column-group" class="input-group hidden" style="margin-top: 10px;">
+                                <label>Select column for strategy:</label>
+                                <select id="merge-strategy-column" style="width: 100%; padding: 8px; margin-top: 8px;">
+                                </select>
+                            </div>
+                        </div>
                     </div>
 
                     <!-- Horizontal Options -->
@@ -562,9 +679,18 @@ TEMPLATE = '''
                             <select id="join-type" style="width: 100%; padding: 8px; margin-top: 8px;">
                                 <option value="inner">Inner Join (matching rows only)</option>
                                 <option value="left">Left Join (all from first file)</option>
-                                <option value="right">Right Join (all from second file)</option>
+                                <option value="right">Right Join (all from last file)</option>
                                 <option value="outer">Outer Join (all rows)</option>
                             </select>
+                            <p id="join-estimate" style="margin-top: 8px; font-size: 14px; color: #666;"></p>
+                        </div>
+                        
+                        <div class="input-group" style="margin-top: 10px;">
+                            <label>Join Mode:</label>
+                            <select id="join-mode" style="width: 100%; padding: 8px; margin-top: 8px;">
+                                <option value="join">Standard (any file sizes)</option>
+                                <option value="lookup">Lookup (enrich the first file from small reference tables)</option>
+                            </select>
                         </div>
                     </div>
 
@@ -589,6 +715,7 @@ TEMPLATE = '''
                         <div style="width: 300px; height: 20px; background-color: rgba(200,200,200,0.3); border-radius: 10px; margin: 10px auto;">
                             <div id="merger-progress-bar" style="width: 0%; height: 100%; background-color: #4ecdc4; border-radius: 10px; transition: width 0.3s;"></div>
                         </div>
+                        <button type="button" id="cancel-merge-btn" style="background: #ff4444; padding: 5px 10px; font-size: 12px;">Cancel</button>
                     </div>
                 </div>
 
@@ -768,20 +895,71 @@ TEMPLATE = '''
     });
 }
 
+        function formatProgress(status) {
+            // Append row counts, throughput and ETA when the job reports them
+            const details = [];
+            if (status.rows_processed) {
+                const total = status.total_rows ? ` / ${status.total_rows.toLocaleString()}` : '';
+                details.push(`${status.rows_processed.toLocaleString()}${total} rows`);
+            }
+            if (status.rows_per_sec) details.push(`${status.rows_per_sec.toLocaleString()} rows/s`);
+            if (status.mb_per_sec) details.push(`${status.mb_per_sec} MB/s`);
+            if (status.eta_seconds != null) {
+                const eta = status.eta_seconds;
+                details.push(`ETA ${eta >= 60 ? Math.floor(eta / 60) + 'm ' : ''}${eta % 60}s`);
+            }
+            return details.length ? `${status.message} (${details.join(', ')})` : status.message;
+        }
+        
+        function watchProgress(taskId, onStatus) {
+            // The server pushes a status only when the job changes it
+            const source = new EventSource(`/progress-stream/${taskId}`);
+            source.onmessage = (event) => {
+                const status = JSON.parse(event.data);
+                if (status.status !== 'processing') {
+                    source.close();
+                }
+                onStatus(status);
+            };
+            // A refused stream (too many open) closes at once; poll instead
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    pollProgress(taskId, onStatus);
+                }
+            };
+            return source;
+        }
+        
+        async function pollProgress(taskId, onStatus) {
+            // Back off from 1 s to 15 s while the job reports nothing new
+            let delay = 1000;
+            let last = null;
+            while (true) {
+                const status = await (await fetch(`/progress/${taskId}`)).json();
+                onStatus(status);
+                if (status.status !== 'processing') return;
+                const current = JSON.stringify(status);
+                delay = current === last ? Math.min(delay * 2, 15000) : 1000;
+                last = current;
+                await new Promise(resolve => setTimeout(resolve, delay));
+            }
+        }
+        
         async function trackProgress(taskId) {
             const progressBar = document.getElementById('progress-bar');
             const progressMessage = document.getElementById('progress-message');
             
-            const checkInterval = setInterval(async () => {
+            document.getElementById('cancel-split-btn').onclick = () => {
+                fetch(`/cancel/${taskId}`, { method: 'POST' });
+                progressMessage.textContent = 'Cancelling...';
+            };
+            
+            watchProgress(taskId, (status) => {
                 try {
-                    const response = await fetch(`/progress/${taskId}`);
-                    const status = await response.json();
-                    
                     if (status.status === 'processing') {
                         progressBar.style.width = status.progress + '%';
-                        progressMessage.textContent = status.message;
+                        progressMessage.textContent = formatProgress(status);
                     } else if (status.status === 'complete') {
-                        clearInterval(checkInterval);
                         progressBar.style.width = '100%';
                         progressMessage.textContent = 'Processing complete!';
                         
@@ -793,16 +971,16 @@ TEMPLATE = '''
                         setTimeout(() => {
                             showSuccess();
                         }, 500);
-                    } else if (status.status === 'error') {
-                        clearInterval(checkInterval);
-                        throw new Error(status.message);
+                    } else if (status.status === 'cancelled') {
+                        resetForm();
+                    } else {
+                        throw new Error(status.message || 'Task not found');
                     }
                 } catch (error) {
-                    clearInterval(checkInterval);
                     alert('Error: ' + error.message);
                     resetForm();
                 }
-            }, 1000);
+            });
         }
         
         function resetForm() {
@@ -817,6 +995,7 @@ TEMPLATE = '''
 
         // Duplicate Remover Functions
         let duplicateFile = null;
+        let duplicateUploadId = null;
         
         // Initialize duplicate remover
         const duplicateUploadZone = document.getElementById('duplicate-upload-zone');
@@ -874,21 +1053,40 @@ TEMPLATE = '''
             } else {
                 strategyColumnGroup.classList.add('hidden');
             }
+            document.getElementById('match-threshold-group').classList.toggle('hidden', e.target.value !== 'fuzzy');
         });
         
+        // Send the server-side upload handle when we have one, re-sending
+        // the file only if the server has already expired it
+        async function postDuplicateRequest(url, formData) {
+            if (duplicateUploadId) {
+                formData.set('upload_id', duplicateUploadId);
+                const response = await fetch(url, {
+                    method: 'POST',
+                    body: formData
+                });
+                if (response.status !== 410) return response;
+                duplicateUploadId = null;
+                formData.delete('upload_id');
+            }
+            formData.set('file', duplicateFile);
+            return fetch(url, {
+                method: 'POST',
+                body: formData
+            });
+        }
+        
         async function analyzeCsvFile() {
+            duplicateUploadId = null;
             const formData = new FormData();
-            formData.append('file', duplicateFile);
             
             try {
-                const response = await fetch('/analyze-csv', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await postDuplicateRequest('/analyze-csv', formData);
                 
                 if (!response.ok) throw new Error('Failed to analyze file');
                 
                 const data = await response.json();
+                duplicateUploadId = data.upload_id;
                 
                 // Populate column selectors
                 const columnSelect = document.getElementById('duplicate-columns');
@@ -904,6 +1102,13 @@ TEMPLATE = '''
                     strategyColumnSelect.appendChild(option2);
                 });
                 
+                // Offer existing key stores as suggestions
+                fetch('/key-stores').then(r => r.json()).then(data => {
+                    document.getElementById('key-store-names').innerHTML = data.key_stores
+                        .map(store => `<option value="${store.name}">${store.keys.toLocaleString()} keys</option>`)
+                        .join('');
+                }).catch(() => {});
+                
                 // Show configuration section
                 document.getElementById('duplicate-upload-section').classList.add('hidden');
                 document.getElementById('duplicate-config-section').classList.remove('hidden');
@@ -923,28 +1128,29 @@ TEMPLATE = '''
                 return;
             }
             
+            const keepStrategy = document.getElementById('keep-strategy').value;
             const formData = new FormData();
-            formData.append('file', duplicateFile);
             formData.append('columns', JSON.stringify(selectedColumns));
+            formData.append('keep_strategy', keepStrategy);
+            if (keepStrategy === 'fuzzy') {
+                formData.append('match_threshold', document.getElementById('match-threshold').value);
+            }
             
             try {
-                const response = await fetch('/preview-duplicates', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await postDuplicateRequest('/preview-duplicates', formData);
                 
                 if (!response.ok) throw new Error('Failed to preview duplicates');
                 
                 const data = await response.json();
+                duplicateUploadId = data.upload_id;
                 
                 const previewSection = document.getElementById('duplicate-preview-section');
                 const previewContent = document.getElementById('duplicate-preview-content');
                 
-                if (data.total_duplicate_rows === 0) {
+                if (data.total_duplicate_rows === 0 && !data.approximate) {
                     previewContent.innerHTML = '<p>No duplicates found with the selected columns.</p>';
                 } else {
-                    let html = `<p><strong>${data.total_duplicate_rows}</strong> duplicate rows found 
-                        (${data.rows_to_remove} will be removed)</p>`;
+                    let html = `<p id="duplicate-counts">${duplicateCountsHtml(data)}</p>`;
                     
                     if (data.preview.length > 0) {
                         html += '<div style="margin-top: 10px; font-size: 14px;">';
@@ -952,6 +1158,10 @@ TEMPLATE = '''
                             html += `<div style="margin-bottom: 15px; padding: 10px; background: #f5f5f5; border-radius: 4px;">`;
                             html += `<strong>Group ${idx + 1}:</strong> ${group.occurrences} occurrences<br>`;
                             html += `Duplicate values: ${JSON.stringify(group.duplicate_values)}<br>`;
+                            if (group.confidence !== undefined) {
+                                html += `Match confidence: ${Math.round(group.confidence * 100)}%<br>`;
+                                html += `Matched values: ${group.variants.map(v => JSON.stringify(v)).join(', ')}<br>`;
+                            }
                             html += '</div>';
                         });
                         html += '</div>';
@@ -962,11 +1172,31 @@ TEMPLATE = '''
                 
                 previewSection.classList.remove('hidden');
                 
+                if (data.approximate && data.refine_task_id) {
+                    // Swap in exact counts once the background pass finishes
+                    watchProgress(data.refine_task_id, (status) => {
+                        const counts = document.getElementById('duplicate-counts');
+                        if (status.status === 'complete' && counts) {
+                            counts.innerHTML = duplicateCountsHtml({...status.stats, approximate: false});
+                        }
+                    });
+                }
+                
             } catch (error) {
                 alert('Error previewing duplicates: ' + error.message);
             }
         }
         
+        function duplicateCountsHtml(data) {
+            if (!data.approximate) {
+                return `<strong>${data.total_duplicate_rows.toLocaleString()}</strong> duplicate rows found 
+                    (${data.rows_to_remove.toLocaleString()} will be removed)`;
+            }
+            return `About <strong>${data.total_duplicate_rows.toLocaleString()}</strong> duplicate rows 
+                (about ${data.rows_to_remove.toLocaleString()} to remove), estimated from the first 
+                ${data.sampled_rows.toLocaleString()} rows.${data.refine_task_id ? ' Counting exactly...' : ''}`;
+        }
+        
         async function processDuplicates() {
             const selectedColumns = Array.from(document.getElementById('duplicate-columns').selectedOptions)
                 .map(opt => opt.value);
@@ -980,13 +1210,23 @@ TEMPLATE = '''
             const strategyColumn = document.getElementById('strategy-column').value;
             
             const formData = new FormData();
-            formData.append('file', duplicateFile);
             formData.append('columns', JSON.stringify(selectedColumns));
             formData.append('keep_strategy', keepStrategy);
             
             if (['not_empty', 'most_recent', 'max_value'].includes(keepStrategy)) {
                 formData.append('strategy_column', strategyColumn);
             }
+            if (keepStrategy === 'fuzzy') {
+                formData.append('match_threshold', document.getElementById('match-threshold').value);
+            }
+            
+            formData.append('prefilter', document.getElementById('dedup-prefilter').checked);
+            
+            const keyStore = document.getElementById('key-store').value.trim();
+            if (keyStore) {
+                formData.append('key_store', keyStore);
+                formData.append('update_key_store', document.getElementById('update-key-store').checked);
+            }
             
             // Hide config and show loading
             document.getElementById('duplicate-config-section').classList.add('hidden');
@@ -994,33 +1234,25 @@ TEMPLATE = '''
             document.getElementById('duplicate-loading').style.display = 'block';
             
             try {
-                const response = await fetch('/process-duplicates', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await postDuplicateRequest('/process-duplicates', formData);
                 
-                if (!response.ok) throw new Error('Failed to process duplicates');
+                if (!response.ok) {
+                    const data = await response.json().catch(() => ({}));
+                    throw new Error(data.error || 'Failed to process duplicates');
+                }
+                
+                if (response.status === 202) {
+                    // Large file - removed in the background
+                    const data = await response.json();
+                    trackDuplicateProgress(data.task_id);
+                    return;
+                }
                 
                 const blob = await response.blob();
-                const downloadUrl = window.URL.createObjectURL(blob);
                 
                 // Get stats from response header
                 const stats = JSON.parse(response.headers.get('X-Process-Stats') || '{}');
-                
-                // Update success section
-                document.getElementById('duplicate-stats').innerHTML = `
-                    <p>Original rows: <strong>${stats.original_rows || 0}</strong></p>
-                    <p>Duplicates removed: <strong>${stats.rows_removed || 0}</strong></p>
-                    <p>Final rows: <strong>${stats.cleaned_rows || 0}</strong></p>
-                `;
-                
-                const downloadBtn = document.getElementById('duplicate-download-btn');
-                downloadBtn.href = downloadUrl;
-                downloadBtn.download = `cleaned_${duplicateFile.name}`;
-                
-                // Show success
-                document.getElementById('duplicate-loading').style.display = 'none';
-                document.getElementById('duplicate-success').classList.remove('hidden');
+                showDuplicateResult(stats, window.URL.createObjectURL(blob), `cleaned_${duplicateFile.name}`);
                 
             } catch (error) {
                 alert('Error processing duplicates: ' + error.message);
@@ -1028,8 +1260,49 @@ TEMPLATE = '''
             }
         }
         
+        function showDuplicateResult(stats, downloadUrl, downloadName) {
+            document.getElementById('duplicate-stats').innerHTML = `
+                <p>Original rows: <strong>${stats.original_rows || 0}</strong></p>
+                <p>Duplicates removed: <strong>${stats.rows_removed || 0}</strong></p>
+                ${stats.already_seen_rows ? `<p>Already in key store: <strong>${stats.already_seen_rows}</strong></p>` : ''}
+                <p>Final rows: <strong>${stats.cleaned_rows || 0}</strong></p>
+            `;
+            
+            const downloadBtn = document.getElementById('duplicate-download-btn');
+            downloadBtn.href = downloadUrl;
+            if (downloadName) {
+                downloadBtn.download = downloadName;
+            } else {
+                downloadBtn.removeAttribute('download');
+            }
+            
+            // Show success
+            document.getElementById('duplicate-loading').style.display = 'none';
+            document.getElementById('duplicate-success').classList.remove('hidden');
+        }
+        
+        function trackDuplicateProgress(taskId) {
+            const progressMessage = document.getElementById('duplicate-progress-message');
+            
+            watchProgress(taskId, (status) => {
+                if (status.status === 'processing') {
+                    progressMessage.textContent = formatProgress(status);
+                } else if (status.status === 'complete') {
+                    progressMessage.textContent = 'Processing duplicates...';
+                    showDuplicateResult(status.stats, `/download-duplicates/${taskId}`);
+                } else {
+                    if (status.status !== 'cancelled') {
+                        alert('Error processing duplicates: ' + (status.message || 'Task not found'));
+                    }
+                    progressMessage.textContent = 'Processing duplicates...';
+                    resetDuplicateForm();
+                }
+            });
+        }
+        
         function resetDuplicateForm() {
             duplicateFile = null;
+            duplicateUploadId = null;
             duplicateFileInput.value = '';
             duplicateFileName.textContent = 'Drop your CSV file here or click to browse';
             
@@ -1046,6 +1319,8 @@ TEMPLATE = '''
         // CSV Merger Functions
         let mergerFiles = [];
         let mergerFileData = {};
+        let mergerUploadIds = null;
+        let mergerJoinEstimate = null;
         
         // Initialize merger
         const mergerUploadZone = document.getElementById('merger-upload-zone');
@@ -1103,12 +1378,93 @@ TEMPLATE = '''
             }
         });
         
+        document.getElementById('merge-dedup-columns').addEventListener('change', (e) => {
+            document.getElementById('merge-dedup-options').classList.toggle('hidden', e.target.selectedOptions.length === 0);
+        });
+        
+        document.getElementById('merge-keep-strategy').addEventListener('change', (e) => {
+            document.getElementById('merge-strategy-column-group').classList.toggle(
+                'hidden', !['not_empty', 'most_recent', 'max_value'].includes(e.target.value));
+        });
+        
+        document.getElementById('join-columns').addEventListener('change', estimateJoin);
+        document.getElementById('join-type').addEventListener('change', showJoinEstimate);
+        
+        // Sketch the join keys of every file, for output estimates per join type
+        async function estimateJoin() {
+            const joinColumns = JSON.stringify(Array.from(document.getElementById('join-columns').selectedOptions)
+                .map(opt => opt.value));
+            mergerJoinEstimate = null;
+            showJoinEstimate();
+            if (joinColumns === '[]') return;
+            
+            document.getElementById('join-estimate').textContent = 'Estimating join size...';
+            const formData = new FormData();
+            formData.append('join_columns', joinColumns);
+            try {
+                const response = await postMergerRequest('/analyze-merge-files', formData);
+                if (!response.ok) throw new Error(await response.text());
+                const data = await response.json();
+                mergerUploadIds = data.upload_ids;
+                // Ignore answers for columns that are no longer selected
+                if (data.join_estimate && JSON.stringify(data.join_estimate.join_columns) === joinColumns) {
+                    mergerJoinEstimate = data.join_estimate;
+                }
+            } catch (error) {
+                console.error('Error estimating join:', error);
+            }
+            showJoinEstimate();
+        }
+        
+        function showJoinEstimate() {
+            const element = document.getElementById('join-estimate');
+            element.style.color = '#666';
+            element.textContent = '';
+            if (!mergerJoinEstimate) return;
+            if (mergerJoinEstimate.error) {
+                element.textContent = mergerJoinEstimate.error;
+                return;
+            }
+            const joinType = document.getElementById('join-type').value;
+            const estimate = mergerJoinEstimate.estimates[joinType];
+            element.textContent = `Estimated output: ${estimate.rows.toLocaleString()} rows (${estimate.size_mb.toLocaleString()} MB)`;
+            const warning = mergerJoinEstimate.warnings[joinType];
+            if (warning) {
+                element.textContent += '. ' + warning;
+                element.style.color = '#c62828';
+            }
+        }
+        
+        function populateMergeDedupColumns() {
+            const columns = window.mergerAnalysisData.column_analysis.all_columns;
+            ['merge-dedup-columns', 'merge-strategy-column'].forEach(id => {
+                const select = document.getElementById(id);
+                select.innerHTML = '';
+                columns.forEach(col => select.appendChild(new Option(col, col)));
+            });
+        }
+        
+        function appendMergeDedupOptions(formData) {
+            const dedupColumns = Array.from(document.getElementById('merge-dedup-columns').selectedOptions)
+                .map(opt => opt.value);
+            if (dedupColumns.length === 0) return;
+            
+            const keepStrategy = document.getElementById('merge-keep-strategy').value;
+            formData.append('dedup_columns', JSON.stringify(dedupColumns));
+            formData.append('keep_strategy', keepStrategy);
+            formData.append('source_priority', document.getElementById('merge-source-priority').value);
+            if (['not_empty', 'most_recent', 'max_value'].includes(keepStrategy)) {
+                formData.append('strategy_column', document.getElementById('merge-strategy-column').value);
+            }
+        }
+        
         async function handleMergerFiles(files) {
             console.log('handleMergerFiles called with', files.length, 'files');
             for (const file of files) {
                 if (!mergerFileData[file.name]) {
                     mergerFiles.push(file);
                     mergerFileData[file.name] = file;
+                    mergerUploadIds = null;
                 }
             }
             
@@ -1151,6 +1507,7 @@ TEMPLATE = '''
             const file = mergerFiles[index];
             delete mergerFileData[file.name];
             mergerFiles.splice(index, 1);
+            mergerUploadIds = null;
             updateMergerFileList();
             
             if (mergerFiles.length < 2) {
@@ -1159,6 +1516,28 @@ TEMPLATE = '''
             }
         }
         
+        // Reference the uploads cached by the analyze step, re-sending the
+        // files only if the server has already expired them
+        async function postMergerRequest(url, formData) {
+            if (mergerUploadIds) {
+                formData.set('upload_ids', JSON.stringify(mergerUploadIds));
+                const response = await fetch(url, {
+                    method: 'POST',
+                    body: formData
+                });
+                if (response.status !== 410) return response;
+                mergerUploadIds = null;
+                formData.delete('upload_ids');
+            }
+            mergerFiles.forEach((file, index) => {
+                formData.set(`file_${index}`, file);
+            });
+            return fetch(url, {
+                method: 'POST',
+                body: formData
+            });
+        }
+        
         async function analyzeMergerFiles() {
             console.log('analyzeMergerFiles called');
             
@@ -1187,6 +1566,7 @@ TEMPLATE = '''
                 
                 const data = await response.json();
                 console.log('Analysis data:', data);
+                mergerUploadIds = data.upload_ids;
                 
                 // Store analysis data globally for later use
                 window.mergerAnalysisData = data;
@@ -1205,6 +1585,8 @@ TEMPLATE = '''
                     console.error('merger-config-section element not found!');
                 }
                 
+                populateMergeDedupColumns();
+                
                 // If horizontal merge, populate join columns
                 if (document.getElementById('merge-type').value === 'horizontal') {
                     populateJoinColumns();
@@ -1220,6 +1602,8 @@ TEMPLATE = '''
         
         function populateJoinColumns() {
             const joinColumnsSelect = document.getElementById('join-columns');
+            mergerJoinEstimate = null;
+            showJoinEstimate();
             
             if (window.mergerAnalysisData && window.mergerAnalysisData.common_columns) {
                 joinColumnsSelect.innerHTML = '';
@@ -1240,28 +1624,22 @@ TEMPLATE = '''
         async function previewMerge() {
             const mergeType = document.getElementById('merge-type').value;
             const formData = new FormData();
-            
-            mergerFiles.forEach((file, index) => {
-                formData.append(`file_${index}`, file);
-            });
-            
             formData.append('merge_type', mergeType);
             
             if (mergeType === 'vertical') {
                 formData.append('columns_mode', document.getElementById('columns-mode').value);
                 formData.append('include_source', document.getElementById('include-source').checked);
+                appendMergeDedupOptions(formData);
             } else {
                 const selectedJoinColumns = Array.from(document.getElementById('join-columns').selectedOptions)
                     .map(opt => opt.value);
                 formData.append('join_columns', JSON.stringify(selectedJoinColumns));
                 formData.append('join_type', document.getElementById('join-type').value);
+                formData.append('join_mode', document.getElementById('join-mode').value);
             }
             
             try {
-                const response = await fetch('/preview-merge', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await postMergerRequest('/preview-merge', formData);
                 
                 if (!response.ok) throw new Error('Failed to generate preview');
                 
@@ -1312,21 +1690,22 @@ TEMPLATE = '''
         async function processMerge() {
             const mergeType = document.getElementById('merge-type').value;
             const formData = new FormData();
-            
-            mergerFiles.forEach((file, index) => {
-                formData.append(`file_${index}`, file);
-            });
-            
             formData.append('merge_type', mergeType);
             
             if (mergeType === 'vertical') {
                 formData.append('columns_mode', document.getElementById('columns-mode').value);
                 formData.append('include_source', document.getElementById('include-source').checked);
+                appendMergeDedupOptions(formData);
             } else {
                 const selectedJoinColumns = Array.from(document.getElementById('join-columns').selectedOptions)
                     .map(opt => opt.value);
                 formData.append('join_columns', JSON.stringify(selectedJoinColumns));
                 formData.append('join_type', document.getElementById('join-type').value);
+                formData.append('join_mode', document.getElementById('join-mode').value);
+                
+                const warning = mergerJoinEstimate && mergerJoinEstimate.warnings
+                    && mergerJoinEstimate.warnings[document.getElementById('join-type').value];
+                if (warning && !confirm(warning + ' Merge anyway?')) return;
             }
             
             // Hide config and show loading
@@ -1335,10 +1714,7 @@ TEMPLATE = '''
             document.getElementById('merger-loading').style.display = 'block';
             
             try {
-                const response = await fetch('/process-merge', {
-                    method: 'POST',
-                    body: formData
-                });
+                const response = await postMergerRequest('/process-merge', formData);
                 
                 if (!response.ok) throw new Error('Failed to merge files');
                 
@@ -1363,6 +1739,7 @@ TEMPLATE = '''
                     document.getElementById('merger-stats').innerHTML = `
                         <p>Files merged: <strong>${stats.files_merged || mergerFiles.length}</strong></p>
                         <p>Total rows: <strong>${(stats.total_rows || 0).toLocaleString()}</strong></p>
+                        ${stats.duplicates_removed ? `<p>Duplicates removed: <strong>${stats.duplicates_removed.toLocaleString()}</strong></p>` : ''}
                         <p>Total columns: <strong>${stats.total_columns || 0}</strong></p>
                     `;
                     
@@ -1385,16 +1762,17 @@ TEMPLATE = '''
             const progressBar = document.getElementById('merger-progress-bar');
             const progressMessage = document.getElementById('merger-progress-message');
             
-            const checkInterval = setInterval(async () => {
+            document.getElementById('cancel-merge-btn').onclick = () => {
+                fetch(`/cancel/${taskId}`, { method: 'POST' });
+                progressMessage.textContent = 'Cancelling...';
+            };
+            
+            watchProgress(taskId, (status) => {
                 try {
-                    const response = await fetch(`/merge-progress/${taskId}`);
-                    const status = await response.json();
-                    
                     if (status.status === 'processing') {
                         progressBar.style.width = status.progress + '%';
-                        progressMessage.textContent = status.message;
+                        progressMessage.textContent = formatProgress(status);
                     } else if (status.status === 'complete') {
-                        clearInterval(checkInterval);
                         progressBar.style.width = '100%';
                         progressMessage.textContent = 'Merge complete!';
                         
@@ -1407,6 +1785,7 @@ TEMPLATE = '''
                         document.getElementById('merger-stats').innerHTML = `
                             <p>Files merged: <strong>${status.stats.files_merged || mergerFiles.length}</strong></p>
                             <p>Total rows: <strong>${(status.stats.total_rows || 0).toLocaleString()}</strong></p>
+                            ${status.stats.duplicates_removed ? `<p>Duplicates removed: <strong>${status.stats.duplicates_removed.toLocaleString()}</strong></p>` : ''}
                             <p>Total columns: <strong>${status.stats.total_columns || 0}</strong></p>
                         `;
                         
@@ -1414,21 +1793,22 @@ TEMPLATE = '''
                             document.getElementById('merger-loading').style.display = 'none';
                             document.getElementById('merger-success').classList.remove('hidden');
                         }, 500);
-                    } else if (status.status === 'error') {
-                        clearInterval(checkInterval);
-                        throw new Error(status.message);
+                    } else if (status.status === 'cancelled') {
+                        resetMergerForm();
+                    } else {
+                        throw new Error(status.message || 'Task not found');
                     }
                 } catch (error) {
-                    clearInterval(checkInterval);
                     alert('Error: ' + error.message);
                     resetMergerForm();
                 }
-            }, 1000);
+            });
         }
         
         function resetMergerForm() {
             mergerFiles = [];
             mergerFileData = {};
+            mergerUploadIds = null;
             mergerFileInput.value = '';
             mergerFileText.textContent = 'Drop CSV files here or click to browse (select multiple)';
             
@@ -1447,6 +1827,13 @@ TEMPLATE = '''
             document.getElementById('include-source').checked = false;
             document.getElementById('join-columns').innerHTML = '';
             document.getElementById('join-type').value = 'inner';
+            document.getElementById('join-mode').value = 'join';
+            mergerJoinEstimate = null;
+            showJoinEstimate();
+            document.getElementById('merge-dedup-columns').innerHTML = '';
+            document.getElementById('merge-dedup-options').classList.add('hidden');
+            document.getElementById('merge-keep-strategy').value = 'first';
+            document.getElementById('merge-strategy-column-group').classList.add('hidden');
         }
     </script>
 </body>
@@ -1677,18 +2064,180 @@ def stats():
         total_size=total_size
     )
 
+def estimate_job_memory_mb(job_kind, size_mb, reference_mb=None):
+    """Rough peak memory of a background job, used for admission control
+    
+    reference_mb is the largest reference table of a lookup join, which is
+    loaded whole when it fits in JOIN_MEMORY_MB.
+    """
+    if job_kind in ('split_stream', 'merge_stream'):
+        # Bounded chunks, independent of file size
+        return 256
+    if job_kind == 'dedup_stream':
+        # Bounded chunks, plus one partition in each process of the deduplicator's pool
+        return 256 + DEDUP_WORKERS * DEDUP_PARTITION_MEMORY_MB
+    if job_kind == 'join_stream':
+        # One join input loaded in memory at most, plus the chunk being joined
+        if reference_mb is not None:
+            return 256 + min(JOIN_MEMORY_MB, reference_mb * TEXT_FRAME_FACTOR)
+        return 256 + JOIN_MEMORY_MB
+    if job_kind == 'merge':
+        # Every input DataFrame plus the concatenated/joined result
+        return 64 + size_mb * 6
+    # DataFrame of the whole file plus the encoded part being written
+    return 64 + size_mb * 5
+
+def merge_job_kind(merge_type, options):
+    """The estimate_job_memory_mb kind of a merge job"""
+    if merge_type != 'vertical':
+        return 'join_stream'
+    # Deduplicating the merged rows runs the out-of-core deduplicator
+    return 'dedup_stream' if options.get('dedup_columns') else 'merge_stream'
+
+def throughput_fields(start_time, rows_done=0, total_rows=0, bytes_done=0, total_bytes=0):
+    """Row counts, throughput and ETA to merge into a progress update"""
+    elapsed = max(time.time() - start_time, 1e-6)
+    fields = {
+        'rows_processed': rows_done,
+        'total_rows': total_rows,
+        'rows_per_sec': round(rows_done / elapsed),
+        'mb_per_sec': round(bytes_done / (1024 * 1024) / elapsed, 2),
+        'eta_seconds': None
+    }
+    # Prefer rows for the ETA; fall back to bytes while the row count is unknown
+    if total_rows and rows_done:
+        fields['eta_seconds'] = round(elapsed * (total_rows - rows_done) / rows_done)
+    elif total_bytes and bytes_done:
+        fields['eta_seconds'] = round(elapsed * (total_bytes - bytes_done) / bytes_done)
+    return fields
+
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel_job(task_id):
+    """Cancel a queued or running background job"""
+    if not app.job_scheduler.cancel(task_id):
+        return jsonify({'status': 'not_found'}), 404
+    return jsonify({'status': 'cancelling'})
+
 @app.route('/progress/<task_id>', methods=['GET'])
 def get_progress(task_id):
     status = app.processing_status.get(task_id, {'status': 'not_found'})
     return jsonify(status)
 
+@app.route('/progress-stream/<task_id>', methods=['GET'])
+def stream_progress(task_id):
+    """Push job status as Server-Sent Events whenever it changes
+    
+    Past PROGRESS_STREAM_LIMIT open streams, a 503 tells the client to poll
+    /progress/<task_id> instead, so watchers can't take every request thread.
+    """
+    if not progress_streams.acquire(blocking=False):
+        return jsonify({
+            'error': 'Too many progress streams open',
+            'poll': f'/progress/{task_id}'
+        }), 503, {'Retry-After': '5'}
+    
+    def generate():
+        version = 0  # versions start at 1, so the first status is always sent
+        while True:
+            current = app.processing_status.wait_for_change(task_id, version, timeout=15)
+            if current == version:
+                # Nothing new; a comment keeps proxies from closing the stream
+                yield ': keepalive\n\n'
+                continue
+            version = current
+            status = app.processing_status.get(task_id, {'status': 'not_found'})
+            yield f'data: {json.dumps(status)}\n\n'
+            if status.get('status') != 'processing':
+                break
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the stream ends or the client goes away
+    response.call_on_close(progress_streams.release)
+    return response
+
+def stream_split_response(filename, parts, num_files, total_rows, file_size, start_time, task_id, max_rows, cleanup_paths=()):
+    """Stream the split archive to the client while its parts are produced"""
+    print(f"File processed: {filename}, rows: {total_rows}, parts: {num_files}")
+    
+    # Track this file processing
+    app.total_splits += 1
+    app.processed_files.append({
+        'filename': secure_filename(filename),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'num_parts': num_files
+    })
+    # Keep only last 100 files in memory
+    if len(app.processed_files) > 100:
+        app.processed_files = app.processed_files[-100:]
+    
+    def tracked_parts():
+        for i, part in enumerate(parts):
+            app.processing_status[task_id] = {
+                'status': 'processing',
+                'progress': int((i / num_files) * 100),
+                'message': f'Processing part {i + 1} of {num_files}',
+                **throughput_fields(start_time, min(i * max_rows, total_rows), total_rows)
+            }
+            yield part
+    
+    def generate():
+        try:
+            yield from iter_streamed_zip(tracked_parts())
+            
+            # Create database record if available
+            print(f"About to save to database. HAS_DB={HAS_DB}, filename={filename}")
+            if HAS_DB:
+                try:
+                    process_record = FileProcess(
+                        filename=secure_filename(filename),
+                        num_parts=num_files,
+                        rows_processed=total_rows,
+                        processing_time=time.time() - start_time,
+                        file_size=file_size
+                    )
+                    db.session.add(process_record)
+                    db.session.commit()
+                    print(f"Successfully saved to database: {secure_filename(filename)}")
+                    app.logger.info(f"Database save successful: {secure_filename(filename)}")
+                except Exception as e:
+                    print(f"Could not save to database: {e}")
+                    app.logger.error(f"Database save failed: {e}")
+            else:
+                print(f"No database available (HAS_DB={HAS_DB})")
+            
+            # Send notification
+            threading.Thread(
+                target=send_notification,
+                args=(secure_filename(filename), num_files, total_rows, file_size)
+            ).start()
+            
+            # Mark as complete
+            app.processing_status[task_id] = {
+                'status': 'complete',
+                'progress': 100,
+                'message': 'Processing complete'
+            }
+        finally:
+            for path in cleanup_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    download_name = f'split_{secure_filename(filename.replace(".csv", ""))}.zip'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={download_name}'}
+    )
+
 @app.route('/split', methods=['POST'])
 def split_csv_endpoint():
     print(f"=== Starting file upload processing ===")
     print(f"HAS_DB at start: {HAS_DB}")
     
-    # For chunked processing of large files
-    CHUNK_SIZE = 10000  # Process 10k rows at a time
     if 'file' not in request.files:
         return 'No file uploaded', 400
     
@@ -1700,12 +2249,11 @@ def split_csv_endpoint():
         max_rows = int(request.form.get('max_rows', 50000))
     except ValueError:
         return 'Invalid max rows value', 400
-
-    temp_dir = 'temp_split_files'
-    os.makedirs(temp_dir, exist_ok=True)
+    if max_rows < 1:
+        return 'Invalid max rows value', 400
     
-    # List of encodings to try
-    encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+    # 'stream' copies raw record bytes, 'pandas' parses the file into a DataFrame
+    split_mode = request.form.get('split_mode', 'stream')
     
     # Generate task ID for progress tracking
     task_id = str(uuid.uuid4())
@@ -1719,7 +2267,8 @@ def split_csv_endpoint():
     
     try:
         start_time = time.time()
-        file_size = len(file.read()) / (1024 * 1024)  # Size in MB
+        file.seek(0, os.SEEK_END)
+        file_size = file.tell() / (1024 * 1024)  # Size in MB
         file.seek(0)  # Reset file pointer
         
         # Return task ID immediately for large files
@@ -1728,153 +2277,67 @@ def split_csv_endpoint():
             temp_upload = f'temp_upload_{task_id}.csv'
             file.save(temp_upload)
             
-            # Process in background thread
-            thread = threading.Thread(
-                target=process_large_file_async,
-                args=(temp_upload, max_rows, task_id, file.filename, encodings)
-            )
-            thread.start()
+            def remove_upload(task_id):
+                if os.path.exists(temp_upload):
+                    os.remove(temp_upload)
+            
+            # Process on the job pool
+            try:
+                app.job_scheduler.submit(
+                    task_id,
+                    process_large_file_async,
+                    (temp_upload, max_rows, task_id, file.filename, split_mode),
+                    memory_mb=estimate_job_memory_mb('split_' + split_mode, file_size),
+                    on_done=remove_upload
+                )
+            except JobQueueFull:
+                remove_upload(task_id)
+                return 'Server is busy, please try again shortly', 503
             
             return jsonify({
                 'task_id': task_id,
                 'message': 'Processing large file in background'
             }), 202
         
-        # Try different encodings
-        for encoding in encodings:
+        if split_mode == 'stream':
+            temp_upload = f'temp_upload_{task_id}.csv'
+            file.save(temp_upload)
             try:
-                file.seek(0)  # Reset file pointer for each attempt
-                # Read the first row to check if it's a table name
-                first_row = pd.read_csv(file, nrows=1, encoding=encoding)
-                file.seek(0)  # Reset file pointer
-                
-                # Check if first row is likely a table name
-                if len(first_row.columns) == 1:
-                    table_name = first_row.iloc[0, 0]
-                    # For large files, read in chunks
-                    if file_size > 50:  # If file is larger than 50MB
-                        chunks = []
-                        for chunk in pd.read_csv(file, header=1, encoding=encoding, chunksize=CHUNK_SIZE):
-                            chunks.append(chunk)
-                        df = pd.concat(chunks, ignore_index=True)
-                    else:
-                        df = pd.read_csv(file, header=1, encoding=encoding)
-                else:
-                    # For large files, read in chunks
-                    if file_size > 50:  # If file is larger than 50MB
-                        chunks = []
-                        for chunk in pd.read_csv(file, encoding=encoding, chunksize=CHUNK_SIZE):
-                            chunks.append(chunk)
-                        df = pd.concat(chunks, ignore_index=True)
-                    else:
-                        df = pd.read_csv(file, encoding=encoding)
-                    table_name = None
-                
-                break  # If successful, break the encoding loop
-            except UnicodeDecodeError:
-                continue
+                splitter = CSVSplitter(temp_upload, max_rows)
+                total_rows = splitter.scan()
+            except Exception:
+                os.remove(temp_upload)
+                raise
+            num_files = splitter.num_parts
+            
+            # The upload is removed once the response has been streamed
+            parts = ((splitter.part_name(i), splitter.iter_part_bytes(i)) for i in range(num_files))
+            return stream_split_response(file.filename, parts, num_files, total_rows, file_size, start_time, task_id, max_rows, [temp_upload])
+        
+        # Detect the encoding once so the file is parsed a single time
+        encoding = detect_encoding(file.stream)
+        # Read the first row to check if it's a table name
+        first_row = pd.read_csv(file, nrows=1, encoding=encoding)
+        file.seek(0)  # Reset file pointer
+        
+        # Check if first row is likely a table name
+        if len(first_row.columns) == 1:
+            table_name = first_row.iloc[0, 0]
+            df = read_csv(file.stream, encoding, CSV_PARSE_ENGINE, header=1)
         else:
-            # If no encoding worked
-            raise UnicodeDecodeError(f"Could not decode file with any of these encodings: {', '.join(encodings)}")
+            df = read_csv(file.stream, encoding, CSV_PARSE_ENGINE)
+            table_name = None
         
         # Rest of the processing remains the same
         total_rows = len(df)
         num_files = math.ceil(total_rows / max_rows)
         
-        print(f"File processed: {file.filename}, rows: {total_rows}, parts: {num_files}")
-        
-        # Track this file processing
-        app.total_splits += 1
-        app.processed_files.append({
-            'filename': secure_filename(file.filename),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'num_parts': num_files
-        })
-        # Keep only last 100 files in memory
-        if len(app.processed_files) > 100:
-            app.processed_files = app.processed_files[-100:]
-        
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for i in range(num_files):
-                # Update progress
-                progress = int((i / num_files) * 100)
-                app.processing_status[task_id] = {
-                    'status': 'processing',
-                    'progress': progress,
-                    'message': f'Processing part {i + 1} of {num_files}'
-                }
-                start_idx = i * max_rows
-                end_idx = min((i + 1) * max_rows, total_rows)
-                
-                output_file = f"part_{i + 1}_of_{num_files}.csv"
-                output_path = os.path.join(temp_dir, output_file)
-                
-                # Write chunks to avoid memory issues
-                if table_name:
-                    with open(output_path, 'w', encoding=encoding, newline='') as f:
-                        f.write(f"{table_name}\n")
-                
-                # Process in smaller chunks for writing
-                write_header = True
-                for j in range(start_idx, end_idx, CHUNK_SIZE):
-                    chunk_end = min(j + CHUNK_SIZE, end_idx)
-                    chunk_df = df.iloc[j:chunk_end]
-                    
-                    if table_name:
-                        chunk_df.to_csv(output_path, index=False, mode='a', encoding=encoding, header=write_header)
-                    else:
-                        mode = 'w' if j == start_idx else 'a'
-                        chunk_df.to_csv(output_path, index=False, mode=mode, encoding=encoding, header=write_header)
-                    
-                    write_header = False
-                
-                zip_file.write(output_path, output_file)
-                # Remove the file immediately after adding to zip to save disk space
-                os.remove(output_path)
-        
-        zip_buffer.seek(0)
-        
-        # Create database record if available
-        print(f"About to save to database. HAS_DB={HAS_DB}, filename={file.filename}")
-        if HAS_DB:
-            try:
-                process_record = FileProcess(
-                    filename=secure_filename(file.filename),
-                    num_parts=num_files,
-                    rows_processed=total_rows,
-                    processing_time=time.time() - start_time,
-                    file_size=file_size
-                )
-                db.session.add(process_record)
-                db.session.commit()
-                print(f"Successfully saved to database: {secure_filename(file.filename)}")
-                app.logger.info(f"Database save successful: {secure_filename(file.filename)}")
-            except Exception as e:
-                print(f"Could not save to database: {e}")
-                app.logger.error(f"Database save failed: {e}")
-        else:
-            print(f"No database available (HAS_DB={HAS_DB})")
-        
-        # Send notification
-        threading.Thread(
-            target=send_notification,
-            args=(secure_filename(file.filename), num_files, total_rows, file_size)
-        ).start()
-        
-        # Mark as complete
-        app.processing_status[task_id] = {
-            'status': 'complete',
-            'progress': 100,
-            'message': 'Processing complete'
-        }
-        
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=f'split_{secure_filename(file.filename.replace(".csv", ""))}.zip'
+        parts = (
+            (f"part_{i + 1}_of_{num_files}.csv",
+             iter_dataframe_part(df, i * max_rows, min((i + 1) * max_rows, total_rows), table_name, encoding))
+            for i in range(num_files)
         )
+        return stream_split_response(file.filename, parts, num_files, total_rows, file_size, start_time, task_id, max_rows)
     
     except Exception as e:
         print(f"ERROR in split_csv_endpoint: {str(e)}")
@@ -1882,12 +2345,90 @@ def split_csv_endpoint():
         import traceback
         traceback.print_exc()
         return f'Error processing file: {str(e)}', 500
+
+def iter_dataframe_part(df, start_idx, end_idx, table_name, encoding):
+    """Yield the encoded CSV bytes of one part of a DataFrame in chunks"""
+    CHUNK_SIZE = 10000
+    if table_name:
+        yield f"{table_name}\n".encode(encoding)
+    
+    write_header = True
+    for j in range(start_idx, end_idx, CHUNK_SIZE):
+        chunk_end = min(j + CHUNK_SIZE, end_idx)
+        yield df.iloc[j:chunk_end].to_csv(index=False, header=write_header).encode(encoding)
+        write_header = False
+
+def compress_parts_to_zip(zip_path, part_names, part_sources, temp_dir, task_id, part_rows, start_time):
+    """Produce and compress every part on a worker pool, then assemble the zip"""
+    num_files = len(part_names)
+    members = [None] * num_files
+    total_rows = sum(part_rows)
+    rows_done = 0
+    bytes_done = 0
+    
+    # zlib releases the GIL while deflating, so threads compress in parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = {
+            executor.submit(compress_member, name, source(), os.path.join(temp_dir, f'{name}.deflate')): i
+            for i, (name, source) in enumerate(zip(part_names, part_sources))
+        }
+        try:
+            for done, future in enumerate(as_completed(futures)):
+                i = futures[future]
+                members[i] = future.result()
+                rows_done += part_rows[i]
+                bytes_done += members[i].file_size
+                app.processing_status[task_id] = {
+                    'status': 'processing',
+                    'progress': int(((done + 1) / num_files) * 95),
+                    'message': f'Compressed {done + 1} of {num_files} parts',
+                    **throughput_fields(start_time, rows_done, total_rows, bytes_done)
+                }
+        except JobCancelled:
+            # Don't start parts that haven't been picked up yet
+            for future in futures:
+                future.cancel()
+            raise
     
-    finally:
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+    app.processing_status[task_id] = {
+        'status': 'processing',
+        'progress': 95,
+        'message': 'Assembling archive...',
+        **throughput_fields(start_time, rows_done, total_rows, bytes_done)
+    }
+    write_zip(zip_path, members)
+    return zip_path
 
-def process_large_file_async(temp_upload, max_rows, task_id, original_filename, encodings):
+def split_large_file_with_pandas(temp_upload, max_rows, task_id, temp_dir, zip_path, start_time):
+    """Split a saved upload by parsing it into a DataFrame"""
+    encoding = detect_encoding(temp_upload)
+    
+    with open(temp_upload, 'r', encoding=encoding) as f:
+        first_line = f.readline().strip()
+        f.seek(0)
+        first_row = pd.read_csv(f, nrows=1, encoding=encoding)
+        
+        if len(first_row.columns) == 1:
+            table_name = first_row.iloc[0, 0]
+            df = read_csv(temp_upload, encoding, CSV_PARSE_ENGINE, header=1)
+        else:
+            df = read_csv(temp_upload, encoding, CSV_PARSE_ENGINE)
+            table_name = None
+    
+    total_rows = len(df)
+    num_files = math.ceil(total_rows / max_rows)
+    
+    part_names = [f"part_{i + 1}_of_{num_files}.csv" for i in range(num_files)]
+    part_sources = [
+        functools.partial(iter_dataframe_part, df, i * max_rows, min((i + 1) * max_rows, total_rows), table_name, encoding)
+        for i in range(num_files)
+    ]
+    part_rows = [min((i + 1) * max_rows, total_rows) - i * max_rows for i in range(num_files)]
+    compress_parts_to_zip(zip_path, part_names, part_sources, temp_dir, task_id, part_rows, start_time)
+    
+    return total_rows, num_files
+
+def process_large_file_async(temp_upload, max_rows, task_id, original_filename, split_mode='stream'):
     """Process large files asynchronously"""
     print(f"=== Starting async processing for {original_filename} ===")
     print(f"HAS_DB in async: {HAS_DB}")
@@ -1899,70 +2440,27 @@ def process_large_file_async(temp_upload, max_rows, task_id, original_filename,
         # Get file size
         file_size = os.path.getsize(temp_upload) / (1024 * 1024)  # in MB
         print(f"File size: {file_size:.2f} MB")
-        # Try different encodings
-        for encoding in encodings:
-            try:
-                # Check for table name
-                with open(temp_upload, 'r', encoding=encoding) as f:
-                    first_line = f.readline().strip()
-                    f.seek(0)
-                    first_row = pd.read_csv(f, nrows=1, encoding=encoding)
-                    
-                    if len(first_row.columns) == 1:
-                        table_name = first_row.iloc[0, 0]
-                        df = pd.read_csv(temp_upload, header=1, encoding=encoding)
-                    else:
-                        df = pd.read_csv(temp_upload, encoding=encoding)
-                        table_name = None
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise UnicodeDecodeError(f"Could not decode file with any of these encodings: {', '.join(encodings)}")
-        
-        total_rows = len(df)
-        num_files = math.ceil(total_rows / max_rows)
-        
-        # Create zip file
         zip_path = f'temp_result_{task_id}.zip'
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for i in range(num_files):
-                # Update progress
-                progress = int((i / num_files) * 100)
+        
+        if split_mode == 'stream':
+            def report_scan(bytes_read, total_bytes):
                 app.processing_status[task_id] = {
                     'status': 'processing',
-                    'progress': progress,
-                    'message': f'Processing part {i + 1} of {num_files}'
+                    'progress': 0,
+                    'message': f'Counting rows ({bytes_read / total_bytes * 100:.0f}%)',
+                    **throughput_fields(start_time, bytes_done=bytes_read, total_bytes=total_bytes)
                 }
-                
-                start_idx = i * max_rows
-                end_idx = min((i + 1) * max_rows, total_rows)
-                
-                output_file = f"part_{i + 1}_of_{num_files}.csv"
-                output_path = os.path.join(temp_dir, output_file)
-                
-                # Write with table name if exists
-                if table_name:
-                    with open(output_path, 'w', encoding=encoding, newline='') as f:
-                        f.write(f"{table_name}\n")
-                
-                # Write data in chunks
-                CHUNK_SIZE = 10000
-                write_header = True
-                for j in range(start_idx, end_idx, CHUNK_SIZE):
-                    chunk_end = min(j + CHUNK_SIZE, end_idx)
-                    chunk_df = df.iloc[j:chunk_end]
-                    
-                    if table_name:
-                        chunk_df.to_csv(output_path, index=False, mode='a', encoding=encoding, header=write_header)
-                    else:
-                        mode = 'w' if j == start_idx else 'a'
-                        chunk_df.to_csv(output_path, index=False, mode=mode, encoding=encoding, header=write_header)
-                    
-                    write_header = False
-                
-                zip_file.write(output_path, output_file)
-                os.remove(output_path)
+            
+            splitter = CSVSplitter(temp_upload, max_rows)
+            total_rows = splitter.scan(progress_callback=report_scan)
+            num_files = splitter.num_parts
+            
+            part_names = [splitter.part_name(i) for i in range(num_files)]
+            part_sources = [functools.partial(splitter.iter_part_bytes, i) for i in range(num_files)]
+            part_rows = [rows for _, _, rows in splitter.parts]
+            compress_parts_to_zip(zip_path, part_names, part_sources, temp_dir, task_id, part_rows, time.time())
+        else:
+            total_rows, num_files = split_large_file_with_pandas(temp_upload, max_rows, task_id, temp_dir, zip_path, time.time())
         
         # Update status with download link
         app.processing_status[task_id] = {
@@ -2002,6 +2500,15 @@ def process_large_file_async(temp_upload, max_rows, task_id, original_filename,
             args=(secure_filename(original_filename), num_files, total_rows, file_size)
         ).start()
         
+    except JobCancelled:
+        app.processing_status[task_id] = {
+            'status': 'cancelled',
+            'progress': 0,
+            'message': 'Processing cancelled'
+        }
+        if os.path.exists(f'temp_result_{task_id}.zip'):
+            os.remove(f'temp_result_{task_id}.zip')
+    
     except Exception as e:
         app.processing_status[task_id] = {
             'status': 'error',
@@ -2047,129 +2554,289 @@ def download_result(task_id):
         download_name=f'split_{secure_filename(original_filename.replace(".csv", ""))}.zip'
     )
 
+def upload_expired_response():
+    return jsonify({'error': 'Upload expired, please upload the file again', 'upload_expired': True}), 410
+
+def get_cached_upload():
+    """Resolve the request's file to the upload cache, storing it if it was sent
+    
+    Returns ((upload_id, path, filename), None) or (None, error_response).
+    """
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        if not app.upload_cache.exists(upload_id):
+            return None, upload_expired_response()
+    else:
+        if 'file' not in request.files:
+            return None, (jsonify({'error': 'No file uploaded'}), 400)
+        
+        file = request.files['file']
+        if file.filename == '':
+            return None, (jsonify({'error': 'No file selected'}), 400)
+        
+        upload_id = app.upload_cache.put(file)
+    
+    filename = app.upload_cache.info(upload_id)['filename']
+    return (upload_id, app.upload_cache.path(upload_id), filename), None
+
+def get_cached_uploads():
+    """Resolve every merge input to the upload cache
+    
+    Inputs come either as an `upload_ids` JSON list from an earlier step or
+    as `file_<n>` uploads. Returns (list of (upload_id, path, filename), None)
+    or (None, error_response).
+    """
+    upload_ids = json.loads(request.form.get('upload_ids', '[]'))
+    if upload_ids:
+        if not all(app.upload_cache.exists(upload_id) for upload_id in upload_ids):
+            return None, upload_expired_response()
+    else:
+        upload_ids = [app.upload_cache.put(request.files[key]) for key in request.files if key.startswith('file_')]
+    
+    uploads = [
+        (upload_id, app.upload_cache.path(upload_id), app.upload_cache.info(upload_id)['filename'])
+        for upload_id in upload_ids
+    ]
+    return uploads, None
+
+def pin_uploads(uploads):
+    """Keep cached uploads from being evicted, by any worker, while they are read"""
+    for upload_id, _, _ in uploads:
+        app.upload_cache.acquire(upload_id)
+
+def unpin_uploads(uploads):
+    for upload_id, _, _ in uploads:
+        app.upload_cache.release(upload_id)
+
+def load_duplicate_remover(path, encoding=None):
+    remover = DuplicateRemover(path, parse_engine=CSV_PARSE_ENGINE)
+    remover.load_file(encoding=encoding)
+    return remover
+
+def cached_duplicate_remover(upload_id):
+    """Return the loaded DuplicateRemover for an upload, parsing it at most once"""
+    return app.upload_cache.get_parsed(
+        upload_id, 'duplicate_remover',
+        lambda path: load_duplicate_remover(path, app.upload_cache.encoding(upload_id))
+    )
+
 # Duplicate Remover Routes
 @app.route('/analyze-csv', methods=['POST'])
 def analyze_csv():
     """Analyze CSV file and return columns and metadata"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    # Save file temporarily
-    temp_filename = f'temp_analyze_{uuid.uuid4()}.csv'
-    file.save(temp_filename)
+    upload, error = get_cached_upload()
+    if error:
+        return error
+    upload_id, path, filename = upload
     
+    app.upload_cache.acquire(upload_id)
     try:
-        remover = DuplicateRemover(temp_filename)
+        remover = cached_duplicate_remover(upload_id)
         analysis = remover.analyze_file()
+        analysis['upload_id'] = upload_id
         
         return jsonify(analysis)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        app.upload_cache.release(upload_id)
 
 @app.route('/preview-duplicates', methods=['POST'])
 def preview_duplicates():
     """Preview duplicates based on selected columns"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
     columns = json.loads(request.form.get('columns', '[]'))
+    keep_strategy = request.form.get('keep_strategy', 'first')
+    match_threshold = float(request.form.get('match_threshold', MATCH_THRESHOLD))
     
     if not columns:
         return jsonify({'error': 'No columns selected'}), 400
     
-    # Save file temporarily
-    temp_filename = f'temp_preview_{uuid.uuid4()}.csv'
-    file.save(temp_filename)
+    upload, error = get_cached_upload()
+    if error:
+        return error
+    upload_id, path, filename = upload
     
+    app.upload_cache.acquire(upload_id)
     try:
-        remover = DuplicateRemover(temp_filename)
-        remover.load_file()
-        preview_data = remover.find_duplicates(columns)
+        encoding = app.upload_cache.encoding(upload_id)
+        sample_bytes = DEDUP_PREVIEW_SAMPLE_MB * 1024 * 1024
+        # The sampler cuts records on raw bytes, which needs an ASCII-compatible encoding
+        sampled = (request.form.get('mode', 'fast') == 'fast'
+                   and os.path.getsize(path) > sample_bytes
+                   and not encoding.startswith(('utf-16', 'utf-32')))
+        
+        if sampled:
+            deduplicator = StreamingDeduplicator(path, encoding=encoding)
+            preview_data = deduplicator.preview_duplicates(columns, sample_bytes=sample_bytes,
+                                                           keep_strategy=keep_strategy,
+                                                           match_threshold=match_threshold)
+            
+            # Exact counts compare keys as-is or normalized; fuzzy matches can't be partitioned
+            if keep_strategy != 'fuzzy':
+                count_strategy = 'normalized' if keep_strategy == 'normalized' else 'first'
+                task_id = duplicate_count_task_id(upload_id, columns, count_strategy)
+                status = app.processing_status.get(task_id)
+                if status and status['status'] == 'complete':
+                    # Exact counts from an earlier refinement of the same upload and key
+                    preview_data.update(status['stats'])
+                    preview_data['approximate'] = False
+                else:
+                    if status is None or status['status'] in ('error', 'cancelled'):
+                        start_duplicate_count(upload_id, path, encoding, columns, task_id, count_strategy)
+                    preview_data['refine_task_id'] = task_id
+        else:
+            remover = cached_duplicate_remover(upload_id)
+            preview_data = remover.find_duplicates(columns, keep_strategy, match_threshold)
+            preview_data['approximate'] = False
+        preview_data['upload_id'] = upload_id
         
         return jsonify(preview_data)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        app.upload_cache.release(upload_id)
+
+def duplicate_count_task_id(upload_id, columns, keep_strategy='first'):
+    """Stable job id, so repeated previews of one upload and key share a count"""
+    key = columns if keep_strategy == 'first' else [columns, keep_strategy]
+    key_digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()[:12]
+    return f'dupcount-{upload_id[:16]}-{key_digest}'
+
+def start_duplicate_count(upload_id, path, encoding, columns, task_id, keep_strategy='first'):
+    """Queue an exact duplicate count for an upload on the job pool"""
+    # Clear a failed earlier attempt, including any cancellation flag
+    if task_id in app.processing_status:
+        del app.processing_status[task_id]
+    
+    app.upload_cache.acquire(upload_id)
+    try:
+        app.job_scheduler.submit(
+            task_id,
+            count_duplicates_async,
+            (path, encoding, columns, task_id, keep_strategy),
+            memory_mb=estimate_job_memory_mb('dedup_stream', 0),
+            on_done=lambda task_id: app.upload_cache.release(upload_id)
+        )
+    except JobQueueFull:
+        app.upload_cache.release(upload_id)
+        app.processing_status[task_id] = {
+            'status': 'error',
+            'progress': 0,
+            'message': 'Server is busy; duplicate counts stay estimated'
+        }
+
+def count_duplicates_async(path, encoding, columns, task_id, keep_strategy='first'):
+    """Count duplicates exactly over the whole upload"""
+    try:
+        app.processing_status[task_id] = {
+            'status': 'processing',
+            'progress': 0,
+            'message': 'Counting duplicates across the whole file...'
+        }
+        deduplicator = StreamingDeduplicator(path, encoding=encoding, workers=DEDUP_WORKERS)
+        stats = deduplicator.count_duplicates(columns, keep_strategy)
+        app.processing_status[task_id] = {
+            'status': 'complete',
+            'progress': 100,
+            'message': 'Duplicate count complete',
+            'stats': stats
+        }
+    except JobCancelled:
+        app.processing_status[task_id] = {
+            'status': 'cancelled',
+            'progress': 0,
+            'message': 'Duplicate count cancelled'
+        }
+    except Exception as e:
+        app.processing_status[task_id] = {
+            'status': 'error',
+            'progress': 0,
+            'message': f'Error: {str(e)}'
+        }
 
 @app.route('/process-duplicates', methods=['POST'])
 def process_duplicates():
     """Process file and remove duplicates"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
     columns = json.loads(request.form.get('columns', '[]'))
     keep_strategy = request.form.get('keep_strategy', 'first')
     strategy_column = request.form.get('strategy_column', None)
+    key_store_name = request.form.get('key_store', '').strip()
+    update_key_store = request.form.get('update_key_store') == 'true'
+    prefilter = request.form.get('prefilter') == 'true'
+    match_threshold = float(request.form.get('match_threshold', MATCH_THRESHOLD))
     
     if not columns:
         return jsonify({'error': 'No columns selected'}), 400
     
-    # Save file temporarily
-    temp_filename = f'temp_process_{uuid.uuid4()}.csv'
+    key_store = None
+    if key_store_name:
+        try:
+            key_store = KeyStore(key_store_name, KEY_STORE_DIR)
+            check_key_store(key_store, columns, keep_strategy)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    upload, error = get_cached_upload()
+    if error:
+        return error
+    upload_id, path, filename = upload
+    
+    file_size = os.path.getsize(path) / (1024 * 1024)  # MB
+    
+    # Fuzzy matching compares neighbouring keys across the whole file, so it stays in memory
+    if (file_size > DEDUP_STREAMING_MB or prefilter) and keep_strategy != 'fuzzy':
+        # Spill keys to hash partitions rather than loading the whole file, on the
+        # job pool, so the deduplicator's own process pool counts against its budget
+        task_id = str(uuid.uuid4())
+        app.upload_cache.acquire(upload_id)
+        try:
+            app.job_scheduler.submit(
+                task_id,
+                process_duplicates_async,
+                (path, app.upload_cache.encoding(upload_id), filename, columns, keep_strategy,
+                 strategy_column or None, key_store_name or None, update_key_store, prefilter, task_id),
+                memory_mb=estimate_job_memory_mb('dedup_stream', file_size),
+                on_done=lambda task_id: app.upload_cache.release(upload_id)
+            )
+        except JobQueueFull:
+            app.upload_cache.release(upload_id)
+            return jsonify({'error': 'Server is busy, please try again shortly'}), 503
+        
+        return jsonify({
+            'task_id': task_id,
+            'message': 'Removing duplicates in background'
+        }), 202
+    
     output_filename = f'cleaned_{uuid.uuid4()}.csv'
-    file.save(temp_filename)
     
+    # Keep the cached upload from being evicted while it is read
+    app.upload_cache.acquire(upload_id)
     try:
         start_time = time.time()
-        file_size = os.path.getsize(temp_filename) / (1024 * 1024)  # MB
-        
-        remover = DuplicateRemover(temp_filename)
-        remover.load_file()
-        
-        # Remove duplicates
-        result = remover.remove_duplicates(columns, keep_strategy, strategy_column)
         
-        # Save cleaned file
-        remover.save_cleaned_file(result['cleaned_df'], output_filename)
+        # Load only the key and strategy columns, then copy the surviving rows from the upload as-is
+        remover = DuplicateRemover(path, app.upload_cache.encoding(upload_id), CSV_PARSE_ENGINE)
+        result = remover.remove_duplicates_to_file(columns, output_filename, keep_strategy, strategy_column,
+                                                   key_store, update_key_store, match_threshold)
         
-        # Save to database if available
-        if HAS_DB:
-            try:
-                with app.app_context():
-                    removal_record = DuplicateRemoval(
-                        filename=secure_filename(file.filename),
-                        original_rows=result['original_rows'],
-                        duplicates_removed=result['rows_removed'],
-                        check_columns=json.dumps(columns),
-                        keep_strategy=keep_strategy,
-                        strategy_column=strategy_column,
-                        processing_time=time.time() - start_time,
-                        file_size=file_size
-                    )
-                    db.session.add(removal_record)
-                    db.session.commit()
-            except Exception as e:
-                print(f"Could not save to database: {e}")
+        save_duplicate_removal(filename, result, columns, keep_strategy, strategy_column,
+                               time.time() - start_time, file_size)
         
         # Create response with stats in header
         response = send_file(
             output_filename,
             mimetype='text/csv',
             as_attachment=True,
-            download_name=f'cleaned_{secure_filename(file.filename)}'
+            download_name=f'cleaned_{secure_filename(filename)}'
         )
         
         response.headers['X-Process-Stats'] = json.dumps({
             'original_rows': result['original_rows'],
             'cleaned_rows': result['cleaned_rows'],
-            'rows_removed': result['rows_removed']
+            'rows_removed': result['rows_removed'],
+            'already_seen_rows': result['already_seen_rows']
         })
         
         # Clean up after sending
@@ -2184,90 +2851,236 @@ def process_duplicates():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        app.upload_cache.release(upload_id)
+
+def save_duplicate_removal(filename, result, columns, keep_strategy, strategy_column, processing_time, file_size):
+    """Record a duplicate removal in the database, if one is available"""
+    if not HAS_DB:
+        return
+    try:
+        with app.app_context():
+            removal_record = DuplicateRemoval(
+                filename=secure_filename(filename),
+                original_rows=result['original_rows'],
+                duplicates_removed=result['rows_removed'],
+                check_columns=json.dumps(columns),
+                keep_strategy=keep_strategy,
+                strategy_column=strategy_column,
+                processing_time=processing_time,
+                file_size=file_size
+            )
+            db.session.add(removal_record)
+            db.session.commit()
+    except Exception as e:
+        print(f"Could not save to database: {e}")
+
+def process_duplicates_async(path, encoding, filename, columns, keep_strategy, strategy_column, key_store_name,
+                             update_key_store, prefilter, task_id):
+    """Remove duplicates from a large upload out of core"""
+    output_path = f'temp_result_{task_id}.csv'
+    try:
+        start_time = time.time()
+        app.processing_status[task_id] = {
+            'status': 'processing',
+            'progress': 10,
+            'message': 'Removing duplicates...'
+        }
+        
+        # After a Bloom filter pass over the keys when few duplicates are expected
+        key_store = KeyStore(key_store_name, KEY_STORE_DIR) if key_store_name else None
+        deduplicator = StreamingDeduplicator(path, encoding=encoding, workers=DEDUP_WORKERS)
+        result = deduplicator.remove_duplicates(columns, output_path, keep_strategy, strategy_column,
+                                                key_store, update_key_store, prefilter)
+        
+        save_duplicate_removal(filename, result, columns, keep_strategy, strategy_column,
+                               time.time() - start_time, os.path.getsize(path) / (1024 * 1024))
+        
+        app.processing_status[task_id] = {
+            'status': 'complete',
+            'progress': 100,
+            'message': 'Duplicates removed',
+            'download_file': output_path,
+            'original_filename': filename,
+            'stats': {
+                'original_rows': result['original_rows'],
+                'cleaned_rows': result['cleaned_rows'],
+                'rows_removed': result['rows_removed'],
+                'already_seen_rows': result['already_seen_rows']
+            }
+        }
+    
+    except JobCancelled:
+        app.processing_status[task_id] = {
+            'status': 'cancelled',
+            'progress': 0,
+            'message': 'Duplicate removal cancelled'
+        }
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    
+    except Exception as e:
+        app.processing_status[task_id] = {
+            'status': 'error',
+            'progress': 0,
+            'message': f'Error: {str(e)}'
+        }
+
+@app.route('/download-duplicates/<task_id>', methods=['GET'])
+def download_duplicates_result(task_id):
+    """Download the deduplicated file of a background duplicate removal"""
+    status = app.processing_status.get(task_id)
+    
+    if not status or status['status'] != 'complete':
+        return 'File not ready or not found', 404
+    
+    output_path = status.get('download_file')
     
+    if not os.path.exists(output_path):
+        return 'File not found', 404
+    
+    # Clean up status after download
+    def cleanup():
+        time.sleep(60)  # Keep file for 1 minute after download
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if task_id in app.processing_status:
+            del app.processing_status[task_id]
+    
+    threading.Thread(target=cleanup).start()
+    
+    return send_file(
+        output_path,
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f'cleaned_{secure_filename(status.get("original_filename", "file.csv"))}'
+    )
+
+@app.route('/key-stores', methods=['GET'])
+def list_key_stores():
+    """List the persistent dedup key stores"""
+    return jsonify({'key_stores': [KeyStore(name, KEY_STORE_DIR).info() for name in KeyStore.names(KEY_STORE_DIR)]})
+
+@app.route('/key-stores/<name>', methods=['DELETE'])
+def delete_key_store(name):
+    """Delete a key store and every key it holds"""
+    if name not in KeyStore.names(KEY_STORE_DIR):
+        return jsonify({'error': 'Key store not found'}), 404
+    KeyStore(name, KEY_STORE_DIR).delete()
+    return jsonify({'deleted': name})
+
+def add_cached_file(merger, upload_id, path, filename):
+    """Add an upload to a merger by its header, with the encoding detected when it was cached
+    
+    The rows are read when the merge runs (see CSVMerger.add_file).
+    """
+    return merger.add_file(path, name=filename, header_only=True, encoding=app.upload_cache.encoding(upload_id),
+                           content_id=upload_id)
+
+def create_merger(**options):
+    """A CSVMerger set up for this server; lookup indexes and key sketches are cached next to their uploads"""
+    return CSVMerger(join_memory_mb=JOIN_MEMORY_MB, index_dir=app.upload_cache.cache_dir,
+                     parse_engine=CSV_PARSE_ENGINE, dedup_workers=DEDUP_WORKERS, **options)
+
+def merge_options_from_form(merge_type):
+    """Build CSVMerger options from the merge form fields"""
+    options = {}
+    if merge_type == 'vertical':
+        options['columns_mode'] = request.form.get('columns_mode', 'union')
+        options['include_source'] = request.form.get('include_source') == 'true'
+        # Optional dedup across the merged files
+        options['dedup_columns'] = json.loads(request.form.get('dedup_columns', '[]'))
+        if options['dedup_columns']:
+            options['keep_strategy'] = request.form.get('keep_strategy', 'first')
+            options['strategy_column'] = request.form.get('strategy_column') or None
+            options['source_priority'] = request.form.get('source_priority', 'first')
+    else:
+        options['join_columns'] = json.loads(request.form.get('join_columns', '[]'))
+        options['join_type'] = request.form.get('join_type', 'inner')
+        options['join_mode'] = request.form.get('join_mode', 'join')
+    return options
+
+def check_merge_request(uploads, merge_type, options):
+    """Validate merge options against the uploads' headers; returns an error response or None"""
+    merger = create_merger(sample_rows=0)
+    pin_uploads(uploads)
+    try:
+        for upload_id, path, filename in uploads:
+            add_cached_file(merger, upload_id, path, filename)
+        merger.check_merge_options(merge_type, options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     finally:
-        # Clean up temp file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+        unpin_uploads(uploads)
+    return None
 
 # CSV Merger Routes
 @app.route('/analyze-merge-files', methods=['POST'])
 def analyze_merge_files():
     """Analyze multiple CSV files for merging"""
-    files = []
-    file_count = 0
-    
-    # Collect all uploaded files
-    for key in request.files:
-        if key.startswith('file_'):
-            files.append(request.files[key])
-            file_count += 1
+    uploads, error = get_cached_uploads()
+    if error:
+        return error
     
-    if file_count < 2:
+    if len(uploads) < 2:
         return jsonify({'error': 'At least 2 files required for merging'}), 400
     
-    merger = CSVMerger()
-    temp_files = []
+    merger = create_merger()
     
+    pin_uploads(uploads)
     try:
-        # Save files temporarily and analyze
-        for idx, file in enumerate(files):
-            temp_filename = f'temp_merge_{uuid.uuid4()}_{idx}.csv'
-            file.save(temp_filename)
-            temp_files.append(temp_filename)
-            merger.add_file(temp_filename)
+        # Headers, a dtype sample and a record scan are enough to analyze
+        for upload_id, path, filename in uploads:
+            add_cached_file(merger, upload_id, path, filename)
+        
+        # With join columns chosen, sketch their keys for join size estimates
+        # (this also counts the rows, so analyze_files doesn't scan again)
+        join_columns = json.loads(request.form.get('join_columns', '[]'))
+        join_estimate = None
+        if join_columns:
+            try:
+                join_estimate = merger.estimate_join(join_columns)
+            except ValueError as e:
+                join_estimate = {'error': str(e)}
         
         analysis = merger.analyze_files()
+        if join_estimate:
+            analysis['join_estimate'] = join_estimate
         
         # Add common columns for horizontal merge
         if 'column_analysis' in analysis:
             analysis['common_columns'] = analysis['column_analysis']['common_columns']
+        analysis['upload_ids'] = [upload_id for upload_id, _, _ in uploads]
         
         return jsonify(analysis)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
     finally:
-        # Clean up temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        unpin_uploads(uploads)
 
 @app.route('/preview-merge', methods=['POST'])
 def preview_merge():
     """Preview the merge operation"""
-    files = []
-    
-    # Collect all uploaded files
-    for key in request.files:
-        if key.startswith('file_'):
-            files.append(request.files[key])
+    uploads, error = get_cached_uploads()
+    if error:
+        return error
     
-    if len(files) < 2:
+    if len(uploads) < 2:
         return jsonify({'error': 'At least 2 files required for merging'}), 400
     
     merge_type = request.form.get('merge_type', 'vertical')
     
-    # Build options
-    options = {}
-    if merge_type == 'vertical':
-        options['columns_mode'] = request.form.get('columns_mode', 'union')
-        options['include_source'] = request.form.get('include_source') == 'true'
-    else:
-        options['join_columns'] = json.loads(request.form.get('join_columns', '[]'))
-        options['join_type'] = request.form.get('join_type', 'inner')
+    options = merge_options_from_form(merge_type)
     
-    merger = CSVMerger()
-    temp_files = []
+    # Previews only read the first rows of each file (no dtype sample needed),
+    # and search a bounded number of rows for join matches
+    merger = create_merger(sample_rows=0, preview_scan_rows=MERGE_PREVIEW_SCAN_ROWS)
     
+    pin_uploads(uploads)
     try:
-        # Save files temporarily
-        for idx, file in enumerate(files):
-            temp_filename = f'temp_preview_{uuid.uuid4()}_{idx}.csv'
-            file.save(temp_filename)
-            temp_files.append(temp_filename)
-            merger.add_file(temp_filename)
+        for upload_id, path, filename in uploads:
+            add_cached_file(merger, upload_id, path, filename)
         
         # Generate preview
         preview_result = merger.preview_merge(merge_type, options)
@@ -2276,56 +3089,39 @@ def preview_merge():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
     finally:
-        # Clean up temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        unpin_uploads(uploads)
 
 @app.route('/process-merge', methods=['POST'])
 def process_merge():
     """Process the merge operation"""
-    files = []
-    file_names = []
-    
-    # Collect all uploaded files
-    for key in request.files:
-        if key.startswith('file_'):
-            file = request.files[key]
-            files.append(file)
-            file_names.append(secure_filename(file.filename))
+    uploads, error = get_cached_uploads()
+    if error:
+        return error
     
-    if len(files) < 2:
+    if len(uploads) < 2:
         return jsonify({'error': 'At least 2 files required for merging'}), 400
     
+    file_names = [secure_filename(filename) for _, _, filename in uploads]
     merge_type = request.form.get('merge_type', 'vertical')
     
-    # Build options
-    options = {}
-    if merge_type == 'vertical':
-        options['columns_mode'] = request.form.get('columns_mode', 'union')
-        options['include_source'] = request.form.get('include_source') == 'true'
-    else:
-        options['join_columns'] = json.loads(request.form.get('join_columns', '[]'))
-        options['join_type'] = request.form.get('join_type', 'inner')
+    options = merge_options_from_form(merge_type)
+    
+    # Reject bad options before a job is queued or any rows are read
+    error = check_merge_request(uploads, merge_type, options)
+    if error:
+        return error
     
     # Generate task ID for large files
     task_id = str(uuid.uuid4())
     
     # Check combined file size
-    total_size_mb = sum(len(f.read()) / (1024 * 1024) for f in files)
-    for f in files:
-        f.seek(0)  # Reset file pointers
+    total_size_mb = sum(os.path.getsize(path) / (1024 * 1024) for _, path, _ in uploads)
     
     # For large files, process asynchronously
     if total_size_mb > 50:
-        # Save files temporarily
-        temp_files = []
-        for idx, file in enumerate(files):
-            temp_filename = f'temp_merge_{task_id}_{idx}.csv'
-            file.save(temp_filename)
-            temp_files.append(temp_filename)
+        # Keep the cached uploads from being evicted while the job reads them
+        pin_uploads(uploads)
         
         # Initialize progress tracking
         app.processing_status[task_id] = {
@@ -2334,12 +3130,25 @@ def process_merge():
             'message': 'Starting merge operation...'
         }
         
-        # Process in background thread
-        thread = threading.Thread(
-            target=process_merge_async,
-            args=(temp_files, file_names, merge_type, options, task_id, total_size_mb)
-        )
-        thread.start()
+        def release_uploads(task_id):
+            unpin_uploads(uploads)
+        
+        reference_mb = None
+        if merge_type != 'vertical' and options.get('join_mode') == 'lookup':
+            reference_mb = max(os.path.getsize(path) / (1024 * 1024) for _, path, _ in uploads[1:])
+        
+        # Process on the job pool
+        try:
+            app.job_scheduler.submit(
+                task_id,
+                process_merge_async,
+                (uploads, file_names, merge_type, options, task_id, total_size_mb),
+                memory_mb=estimate_job_memory_mb(merge_job_kind(merge_type, options), total_size_mb, reference_mb),
+                on_done=release_uploads
+            )
+        except JobQueueFull:
+            release_uploads(task_id)
+            return jsonify({'error': 'Server is busy, please try again shortly'}), 503
         
         return jsonify({
             'task_id': task_id,
@@ -2347,18 +3156,15 @@ def process_merge():
         }), 202
     
     # Process synchronously for smaller files
-    merger = CSVMerger()
-    temp_files = []
+    merger = create_merger()
     
+    pin_uploads(uploads)
     try:
         start_time = time.time()
         
-        # Save files temporarily
-        for idx, file in enumerate(files):
-            temp_filename = f'temp_merge_sync_{uuid.uuid4()}_{idx}.csv'
-            file.save(temp_filename)
-            temp_files.append(temp_filename)
-            merger.add_file(temp_filename)
+        # Merges stream each file to the output instead of loading it
+        for upload_id, path, filename in uploads:
+            add_cached_file(merger, upload_id, path, filename)
         
         # Execute merge
         output_filename = f'merged_{uuid.uuid4()}.csv'
@@ -2372,7 +3178,7 @@ def process_merge():
             try:
                 with app.app_context():
                     merge_record = MergeOperation(
-                        files_merged=len(files),
+                        files_merged=len(uploads),
                         file_names=json.dumps(file_names),
                         merge_type=merge_type,
                         merge_options=json.dumps(options),
@@ -2396,9 +3202,10 @@ def process_merge():
         )
         
         response.headers['X-Merge-Stats'] = json.dumps({
-            'files_merged': len(files),
+            'files_merged': len(uploads),
             'total_rows': result['rows'],
-            'total_columns': result['columns']
+            'total_columns': result['columns'],
+            'duplicates_removed': result['duplicates_removed']
         })
         
         # Clean up after sending
@@ -2413,30 +3220,30 @@ def process_merge():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    
     finally:
-        # Clean up temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        unpin_uploads(uploads)
 
-def process_merge_async(temp_files, file_names, merge_type, options, task_id, total_size_mb):
+def process_merge_async(uploads, file_names, merge_type, options, task_id, total_size_mb):
     """Process large merge operations asynchronously"""
-    print(f"=== Starting async merge for {len(temp_files)} files ===")
+    print(f"=== Starting async merge for {len(uploads)} files ===")
     
     try:
         start_time = time.time()
-        merger = CSVMerger()
+        merger = create_merger()
         
         # Add files to merger
-        for idx, temp_file in enumerate(temp_files):
-            progress = int((idx / len(temp_files)) * 30)  # 30% for loading files
+        total_bytes = sum(os.path.getsize(path) for _, path, _ in uploads)
+        bytes_done = 0
+        for idx, (upload_id, path, filename) in enumerate(uploads):
+            progress = int((idx / len(uploads)) * 30)  # 30% for loading files
             app.processing_status[task_id] = {
                 'status': 'processing',
                 'progress': progress,
-                'message': f'Loading file {idx + 1} of {len(temp_files)}'
+                'message': f'Loading file {idx + 1} of {len(uploads)}',
+                **throughput_fields(start_time, merger.total_rows, bytes_done=bytes_done, total_bytes=total_bytes)
             }
-            merger.add_file(temp_file)
+            add_cached_file(merger, upload_id, path, filename)
+            bytes_done += os.path.getsize(path)
         
         # Update progress
         app.processing_status[task_id] = {
@@ -2455,9 +3262,20 @@ def process_merge_async(temp_files, file_names, merge_type, options, task_id, to
             'message': 'Merging files...'
         }
         
-        result = merger.execute_merge(merge_type, options, output_path)
+        def report_progress(bytes_done, total_bytes):
+            app.processing_status[task_id] = {
+                'status': 'processing',
+                'progress': 50 + int(40 * bytes_done / max(total_bytes, 1)),
+                'message': 'Merging files...',
+                **throughput_fields(start_time, bytes_done=bytes_done, total_bytes=total_bytes)
+            }
+        
+        result = merger.execute_merge(merge_type, options, output_path, progress_callback=report_progress)
         
         if result.get('error'):
+            # A cancellation raised inside the merge comes back as an error result
+            if app.processing_status.cancel_requested(task_id):
+                raise JobCancelled()
             raise Exception(result['error'])
         
         # Update progress
@@ -2472,7 +3290,7 @@ def process_merge_async(temp_files, file_names, merge_type, options, task_id, to
             try:
                 with app.app_context():
                     merge_record = MergeOperation(
-                        files_merged=len(temp_files),
+                        files_merged=len(uploads),
                         file_names=json.dumps(file_names),
                         merge_type=merge_type,
                         merge_options=json.dumps(options),
@@ -2494,24 +3312,28 @@ def process_merge_async(temp_files, file_names, merge_type, options, task_id, to
             'message': 'Merge complete',
             'download_file': output_path,
             'stats': {
-                'files_merged': len(temp_files),
+                'files_merged': len(uploads),
                 'total_rows': result['rows'],
-                'total_columns': result['columns']
+                'total_columns': result['columns'],
+                'duplicates_removed': result['duplicates_removed']
             }
         }
         
+    except JobCancelled:
+        app.processing_status[task_id] = {
+            'status': 'cancelled',
+            'progress': 0,
+            'message': 'Merge cancelled'
+        }
+        if os.path.exists(f'temp_result_{task_id}.csv'):
+            os.remove(f'temp_result_{task_id}.csv')
+    
     except Exception as e:
         app.processing_status[task_id] = {
             'status': 'error',
             'progress': 0,
             'message': f'Error: {str(e)}'
         }
-    
-    finally:
-        # Cleanup temp files
-        for temp_file in temp_files:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
 
 @app.route('/merge-progress/<task_id>', methods=['GET'])
 def get_merge_progress(task_id):
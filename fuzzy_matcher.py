@@ -0,0 +1,164 @@
+import re
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+try:
+    from rapidfuzz.fuzz import ratio as rapidfuzz_ratio
+    from rapidfuzz.process import cpdist
+    HAS_RAPIDFUZZ = True
+except ImportError:
+    HAS_RAPIDFUZZ = False
+
+MATCH_THRESHOLD = 0.9
+WINDOW = 4
+
+# Separates the columns of a multi-column key once they are joined into one string
+KEY_SEPARATOR = '\x1f'
+
+NUMBER = re.compile(r'\d+')
+
+
+def normalize_keys(keys):
+    """Normalized copy of the key columns, for matching "ACME Inc" with "Acme, Inc.".
+
+    Each value is compatibility-decomposed with its accents dropped
+    (NFKD), case-folded, has punctuation turned into spaces and runs of
+    whitespace collapsed. Everything is done with vectorized string
+    methods, and missing values stay missing (None).
+    """
+    normalized = {}
+    for col in keys.columns:
+        text = keys[col].astype('string')
+        text = text.str.normalize('NFKD').str.replace('[\u0300-\u036f]', '', regex=True).str.casefold()
+        text = text.str.replace(r'[^\w\s]|_', ' ', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+        # Back to object dtype, so the hashed grouping in key_codes can compare values
+        normalized[col] = text.astype(object).where(text.notna(), None)
+    return pd.DataFrame(normalized, index=keys.index)
+
+
+def _joined(normalized):
+    columns = [normalized[col].fillna('') for col in normalized.columns]
+    joined = columns[0]
+    for column in columns[1:]:
+        joined = joined + KEY_SEPARATOR + column
+    return joined
+
+
+def _similarity(a, b, threshold):
+    """SequenceMatcher ratio of a and b, or 0.0 once it can't reach threshold"""
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
+
+
+def similarity(a, b, threshold=0.0):
+    """Similarity ratio in [0, 1] of one pair of strings; 0.0 below threshold"""
+    if HAS_RAPIDFUZZ:
+        return rapidfuzz_ratio(a, b, score_cutoff=threshold * 100) / 100
+    return _similarity(a, b, threshold)
+
+
+def pair_similarity(left, right, threshold=0.0):
+    """Similarity ratio in [0, 1] of each left[i] with right[i]; 0.0 below threshold"""
+    if HAS_RAPIDFUZZ:
+        # Same 2 * matches / total ratio as difflib, computed in C over all pairs
+        scores = cpdist(list(left), list(right), scorer=rapidfuzz_ratio,
+                        score_cutoff=threshold * 100, workers=-1)
+        return np.asarray(scores, dtype=np.float64) / 100
+    return np.array([_similarity(a, b, threshold) for a, b in zip(left, right)], dtype=np.float64)
+
+
+def _candidate_pairs(uniques, window):
+    """Neighbouring keys in sorted order, and in order of the reversed keys.
+
+    The second ordering catches keys that differ near the start, which the
+    first one sorts far apart. Each key is compared with `window` keys on
+    either side in each ordering, so the work grows as n log n.
+    """
+    pairs = []
+    for order in (np.argsort(uniques), np.argsort(np.array([key[::-1] for key in uniques], dtype=object))):
+        for step in range(1, min(window, len(order) - 1) + 1):
+            pairs.append(np.column_stack([order[:-step], order[step:]]))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    # Drop pairs found by both orderings, via one int64 per pair
+    size = np.int64(len(uniques))
+    packed = np.unique(pairs[:, 0].astype(np.int64) * size + pairs[:, 1])
+    return np.column_stack([packed // size, packed % size])
+
+
+def _representatives(uniques, links, scores, threshold):
+    """Group each key with the representative of an earlier key it matched.
+
+    Keys are visited in order (of first appearance). A key joins a group
+    only if it matches the group's representative, its first key, so
+    matches don't chain: A ~ B and B ~ C don't group A with C unless A ~ C.
+    A key matching several groups joins the one it is most similar to.
+    Returns (representative of each key, similarity to it; 1.0 for
+    representatives themselves).
+    """
+    labels = np.arange(len(uniques))
+    link_scores = np.ones(len(uniques))
+    if not len(links):
+        return labels, link_scores
+
+    # Links of each later key, best match first
+    order = np.lexsort((-scores, links[:, 1]))
+    later, earlier, scores = links[order, 1], links[order, 0], scores[order]
+    starts = np.flatnonzero(np.r_[True, later[1:] != later[:-1]])
+    for start, stop in zip(starts, np.r_[starts[1:], len(later)]):
+        key = later[start]
+        best, best_score = key, 0.0
+        for other, score in zip(earlier[start:stop], scores[start:stop]):
+            representative = labels[other]
+            if representative != other:
+                score = similarity(uniques[key], uniques[representative], threshold)
+            if score >= threshold and score > best_score:
+                best, best_score = representative, score
+        if best != key:
+            labels[key], link_scores[key] = best, best_score
+    return labels, link_scores
+
+
+def match_codes(keys, fuzzy=False, threshold=MATCH_THRESHOLD, window=WINDOW):
+    """Return (codes, groups, confidence) grouping rows whose keys match.
+
+    Keys match when they are equal after normalize_keys. With fuzzy, a key
+    also joins the group of a sorted neighbour when its normalized text has
+    a similarity ratio of at least `threshold` with that group's first key
+    (see _representatives), and both hold the same numbers: SKU-000001 and
+    SKU-000002 stay apart however similar they look. Codes are dense and
+    numbered in order of first appearance, as in key_codes. `confidence`
+    holds, per group, the lowest similarity of a key to the group's first
+    key: 1.0 for groups that only hold equal normalized keys.
+    """
+    joined = _joined(normalize_keys(keys))
+    codes, uniques = pd.factorize(joined)
+    uniques = np.asarray(uniques, dtype=object)
+    links = np.empty((0, 2), dtype=np.int64)
+    scores = np.empty(0)
+
+    if fuzzy and len(uniques) > 1:
+        pairs = _candidate_pairs(uniques, window)
+        # Length alone bounds the ratio; skip pairs that can't reach the threshold
+        lengths = np.array([len(key) for key in uniques])
+        a, b = lengths[pairs[:, 0]], lengths[pairs[:, 1]]
+        pairs = pairs[2 * np.minimum(a, b) >= threshold * np.maximum(a + b, 1)]
+        # Numbers usually identify (IDs, house numbers, versions), so they must agree exactly
+        numbers = np.array([' '.join(NUMBER.findall(key)) for key in uniques], dtype=object)
+        pairs = pairs[numbers[pairs[:, 0]] == numbers[pairs[:, 1]]]
+        scores = pair_similarity(uniques[pairs[:, 0]], uniques[pairs[:, 1]], threshold)
+        matched = scores >= threshold
+        links, scores = pairs[matched], scores[matched]
+
+    labels, link_scores = _representatives(uniques, links, scores, threshold)
+    codes, roots = pd.factorize(labels[codes])
+    confidence = np.ones(len(roots))
+    group_of = np.full(len(uniques), -1, dtype=np.int64)
+    group_of[roots] = np.arange(len(roots))
+    np.minimum.at(confidence, group_of[labels], link_scores)
+    return codes.astype(np.int64, copy=False), len(roots), confidence
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobScheduler:
+    """Run background jobs on a bounded process pool with memory admission.
+
+    Jobs wait in a FIFO queue and are started only while a worker is free
+    and the summed memory estimate of the running jobs stays within
+    `memory_budget_mb`. A job larger than the whole budget still runs, but
+    only when nothing else is running. The pool uses spawned processes, so
+    pandas work never holds the web worker's GIL and a crash (e.g. an OOM
+    kill) only fails the job that caused it.
+
+    Job status lives in the shared JobStore; the scheduler only tracks jobs
+    started from this process. Each web worker process has its own
+    scheduler, so max_workers and memory_budget_mb apply per process.
+    """
+
+    def __init__(self, job_store, max_workers=None, memory_budget_mb=2048, max_queued=50):
+        self.job_store = job_store
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memory_budget_mb = memory_budget_mb
+        self.max_queued = max_queued
+        self._executor = None
+        self._queue = deque()  # (task_id, fn, args, memory_mb, on_done)
+        self._running = {}  # task_id -> (future, memory_mb, on_done)
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    @property
+    def memory_in_use_mb(self):
+        return sum(memory_mb for _, memory_mb, _ in self._running.values())
+
+    def submit(self, task_id, fn, args=(), memory_mb=0, on_done=None):
+        """Queue fn(*args) as a job; on_done(task_id) runs here when it ends"""
+        with self._lock:
+            if len(self._queue) >= self.max_queued:
+                raise JobQueueFull(f'{len(self._queue)} jobs already waiting')
+            self._queue.append((task_id, fn, args, memory_mb, on_done))
+            position = len(self._queue)
+
+        self.job_store[task_id] = {
+            'status': 'processing',
+            'progress': 0,
+            'message': f'Waiting for a free worker ({position} in queue)...'
+        }
+        self._dispatch()
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while self._queue and len(self._running) < self.max_workers:
+                task_id, fn, args, memory_mb, on_done = self._queue[0]
+                fits = self.memory_in_use_mb + memory_mb <= self.memory_budget_mb
+                if self._running and not fits:
+                    break
+
+                self._queue.popleft()
+                try:
+                    future = self._get_executor().submit(fn, *args)
+                except BrokenProcessPool:
+                    self._executor = None
+                    future = self._get_executor().submit(fn, *args)
+                self._running[task_id] = (future, memory_mb, on_done)
+                started.append((task_id, future))
+
+        # A future that has already finished runs its callback right away, and
+        # _finished takes the lock, so callbacks are only added once it's released
+        for task_id, future in started:
+            future.add_done_callback(lambda f, task_id=task_id: self._finished(task_id, f))
+
+    def _finished(self, task_id, future):
+        with self._lock:
+            _, _, on_done = self._running.pop(task_id, (None, 0, None))
+
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                with self._lock:
+                    self._executor = None
+            self.job_store[task_id] = {
+                'status': 'error',
+                'progress': 0,
+                'message': f'Error: worker failed ({error})'
+            }
+
+        if on_done:
+            try:
+                on_done(task_id)
+            except Exception as e:
+                print(f"Job cleanup failed for {task_id}: {e}")
+
+        self._dispatch()
+
+    def cancel(self, task_id):
+        """Cancel a queued job now, or ask a running one to stop"""
+        with self._lock:
+            for job in self._queue:
+                if job[0] == task_id:
+                    self._queue.remove(job)
+                    break
+            else:
+                job = None
+
+        if job is not None:
+            self.job_store[task_id] = {
+                'status': 'cancelled',
+                'progress': 0,
+                'message': 'Cancelled before it started'
+            }
+            on_done = job[4]
+            if on_done:
+                on_done(task_id)
+            return True
+
+        # Running here or in another worker: the job stops at its next progress update
+        return self.job_store.request_cancel(task_id)
@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Seconds between heartbeats of a process's running jobs, and the silence after
+# which a job is given up on even though a process with its owner's pid exists
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = 600
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation has been requested"""
+
+
+class JobStore:
+    """Job status registry shared by every worker process on the host.
+
+    Backed by a SQLite file in WAL mode, so any gunicorn worker can answer
+    /progress and /download for a job started by another one, and jobs
+    survive restarts. It keeps the dict interface of the old in-memory
+    `app.processing_status` (`store[task_id] = {...}`, `.get()`, `in`,
+    `del`), and every write is a single atomic upsert keyed by task id.
+
+    Cancellation is cooperative: once request_cancel() has been called for
+    a job, its next 'processing' progress update raises JobCancelled.
+
+    Each job records the pid of the process that created it, which keeps a
+    heartbeat on it while it runs (start_heartbeat()). A 'processing' job
+    whose owner has exited, or has been silent for STALE_AFTER seconds, was
+    lost to a restart or crash; fail_stale() marks it as an error so
+    watchers stop waiting for it.
+    """
+
+    def __init__(self, db_path='jobs.db', timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    updated_at REAL NOT NULL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    owner_pid INTEGER,
+                    heartbeat_at REAL
+                )
+            ''')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'cancel_requested' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0')
+            if 'owner_pid' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN owner_pid INTEGER')
+                conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_updated_at ON jobs (updated_at)')
+
+    def _connection(self):
+        # One connection per thread and per process (gunicorn forks workers)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __setitem__(self, task_id, status):
+        if status.get('status', 'processing') == 'processing' and self.cancel_requested(task_id):
+            raise JobCancelled(task_id)
+
+        with self._connection() as conn:
+            conn.execute('''
+                INSERT INTO jobs (task_id, status, progress, message, data, version, updated_at, owner_pid)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    status = excluded.status,
+                    progress = excluded.progress,
+                    message = excluded.message,
+                    data = excluded.data,
+                    version = jobs.version + 1,
+                    updated_at = excluded.updated_at
+            ''', (
+                task_id,
+                status.get('status', 'processing'),
+                int(status.get('progress', 0)),
+                status.get('message'),
+                json.dumps(status, default=str),
+                time.time(),
+                os.getpid()
+            ))
+
+    def __getitem__(self, task_id):
+        status = self.get(task_id)
+        if status is None:
+            raise KeyError(task_id)
+        return status
+
+    def get(self, task_id, default=None):
+        row = self._connection().execute(
+            'SELECT data FROM jobs WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def version(self, task_id):
+        """Return a counter that changes on every update, or None if unknown"""
+        row = self._connection().execute(
+            'SELECT version FROM jobs WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def wait_for_change(self, task_id, version, timeout=15, interval=0.5):
+        """Block until the job's version differs from `version` or timeout passes.
+
+        Returns the current version, which equals `version` on timeout. Each
+        check is a single indexed lookup, so idle watchers stay cheap.
+        """
+        deadline = time.time() + timeout
+        while True:
+            current = self.version(task_id)
+            if current != version or time.time() >= deadline:
+                return current
+            time.sleep(interval)
+
+    def request_cancel(self, task_id):
+        """Flag a job for cancellation; returns False if the job is unknown"""
+        with self._connection() as conn:
+            cursor = conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE task_id = ?', (task_id,))
+        return cursor.rowcount > 0
+
+    def cancel_requested(self, task_id):
+        row = self._connection().execute(
+            'SELECT cancel_requested FROM jobs WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def __contains__(self, task_id):
+        return self.version(task_id) is not None
+
+    def __delitem__(self, task_id):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM jobs WHERE task_id = ?', (task_id,))
+
+    def heartbeat(self):
+        """Mark the running jobs created by this process as still alive"""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner_pid = ? AND status = 'processing'",
+                (time.time(), os.getpid())
+            )
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        """Heartbeat this process's jobs, and fail stale ones, from a daemon thread"""
+        def beat():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.heartbeat()
+                    self.fail_stale()
+                except sqlite3.Error as e:
+                    print(f"Job heartbeat failed: {e}")
+
+        threading.Thread(target=beat, daemon=True).start()
+
+    def fail_stale(self, stale_after=STALE_AFTER):
+        """Mark 'processing' jobs whose owner is gone as errors; returns how many"""
+        now = time.time()
+        rows = self._connection().execute('''
+            SELECT task_id, version, owner_pid, MAX(updated_at, COALESCE(heartbeat_at, 0))
+            FROM jobs WHERE status = 'processing'
+        ''').fetchall()
+
+        failed = 0
+        for task_id, version, owner_pid, last_seen in rows:
+            if last_seen >= now - stale_after and (owner_pid is None or _process_alive(owner_pid)):
+                continue
+            status = {
+                'status': 'error',
+                'progress': 0,
+                'message': 'Error: the server stopped before this job finished'
+            }
+            # The version check skips a job that reported progress in the meantime
+            with self._connection() as conn:
+                cursor = conn.execute('''
+                    UPDATE jobs SET status = 'error', progress = 0, message = ?, data = ?,
+                        version = version + 1, updated_at = ?
+                    WHERE task_id = ? AND version = ?
+                ''', (status['message'], json.dumps(status), now, task_id, version))
+            failed += cursor.rowcount
+        return failed
+
+    def purge(self, max_age=24 * 3600):
+        """Fail stale jobs, then remove jobs not updated for max_age seconds"""
+        self.fail_stale()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM jobs WHERE updated_at < ?', (time.time() - max_age,))
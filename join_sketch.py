@@ -0,0 +1,210 @@
+import numpy as np
+
+# Odd multipliers giving each count-min row its own hash of the same 64-bit key hash
+ROW_MULTIPLIERS = np.array([
+    0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+    0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9,
+], dtype=np.uint64)
+
+
+def _pairs(counts, other):
+    """Estimated matching key pairs between two count-min tables of the same shape.
+
+    Collisions add total * other total / width to each row's inner product
+    on average; that is subtracted out, and the median row is taken.
+    """
+    width = counts.shape[1]
+    total, other_total = counts[0].sum(), other[0].sum()
+    products = (counts * other).sum(axis=1)
+    unbiased = (width * products - total * other_total) / (width - 1)
+    return float(np.clip(np.median(unbiased), 0, total * other_total))
+
+
+def _distinct(registers):
+    """HyperLogLog distinct-count estimate from a register array"""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate for small sets
+        estimate = m * np.log(m / zeros)
+    return float(estimate)
+
+
+class CountMinSketch:
+    """Approximate key frequencies in a depth x width table of counts.
+
+    Every key hash adds 1 to one cell per row. Two sketches of the same
+    shape estimate the size of an equi-join of their keys from the inner
+    product of their rows.
+    """
+
+    def __init__(self, width=2 ** 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self.counts = np.zeros((depth, width), dtype=np.float64)
+        self.shift = np.uint64(64 - int(np.log2(width)))
+
+    def _cells(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        return (hashes[None, :] * ROW_MULTIPLIERS[:self.depth, None]) >> self.shift
+
+    def add(self, hashes):
+        for row, cells in enumerate(self._cells(hashes)):
+            self.counts[row] += np.bincount(cells.astype(np.int64), minlength=self.width)
+
+    def join_size(self, other):
+        """Estimated number of matching key pairs between two sketches"""
+        return _pairs(self.counts, other.counts)
+
+
+class HyperLogLog:
+    """Approximate count of distinct key hashes, in 2**precision one-byte registers.
+
+    The relative error is about 1.04 / sqrt(2**precision), 0.8% at the
+    default precision. Sketches with the same precision merge by taking the
+    larger register, which gives the distinct count of the union.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        rest_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+        rest = (hashes & np.uint64((1 << rest_bits) - 1)).astype(np.float64)  # Exact: fewer than 53 bits
+        # Position of the first set bit in the remaining bits, counted from the top
+        ranks = (rest_bits + 1 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def count(self):
+        return _distinct(self.registers)
+
+
+class KeySample:
+    """Exact row counts of the sample_size smallest key hashes seen (a bottom-k sample).
+
+    Files sampled this way keep the same keys wherever their hashes are
+    below every file's threshold, so a join can be replayed exactly on the
+    shared sample and scaled up by the share of the hash space it covers.
+    """
+
+    def __init__(self, sample_size=2 ** 16):
+        self.sample_size = sample_size
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def add(self, hashes):
+        hashes, inverse = np.unique(np.concatenate([self.hashes, np.asarray(hashes, dtype=np.uint64)]),
+                                    return_inverse=True)
+        weights = np.concatenate([self.counts, np.ones(len(inverse) - len(self.counts), dtype=np.int64)])
+        counts = np.bincount(inverse, weights=weights, minlength=len(hashes)).astype(np.int64)
+        # A hash kept at the end was below the threshold all along, so its count is complete
+        self.hashes, self.counts = hashes[:self.sample_size], counts[:self.sample_size]
+
+    @property
+    def threshold(self):
+        """Largest hash the sample is complete up to"""
+        if len(self.hashes) < self.sample_size:
+            return np.uint64(2 ** 64 - 1)
+        return self.hashes[-1]
+
+
+class KeySketch:
+    """Join-key statistics of one file: rows, bytes, key frequencies and distinct keys"""
+
+    def __init__(self, width=2 ** 16, depth=4, precision=14, sample_size=2 ** 16):
+        self.rows = 0
+        self.bytes = 0
+        self.frequencies = CountMinSketch(width, depth)
+        self.distinct = HyperLogLog(precision)
+        self.sample = KeySample(sample_size)
+
+    def add(self, hashes):
+        self.rows += len(hashes)
+        self.frequencies.add(hashes)
+        self.distinct.add(hashes)
+        self.sample.add(hashes)
+
+    @property
+    def distinct_keys(self):
+        return self.distinct.count()
+
+
+def _estimate_pair(left, right, join_type):
+    """Rows of joining two files, from their count-min sketches and HyperLogLogs.
+
+    Matching pairs come from the count-min inner product. Rows left
+    unmatched are estimated from the share of each side's distinct keys
+    missing from the other, assuming keys repeat evenly.
+    """
+    matched = left.frequencies.join_size(right.frequencies)
+    left_keys = left.distinct_keys
+    right_keys = right.distinct_keys
+    union_keys = _distinct(np.maximum(left.distinct.registers, right.distinct.registers))
+    shared = min(max(left_keys + right_keys - union_keys, 0.0), left_keys, right_keys)
+
+    rows = matched
+    if join_type in ('left', 'outer'):
+        rows += left.rows * (1 - shared / left_keys) if left_keys else left.rows
+    if join_type in ('right', 'outer'):
+        rows += right.rows * (1 - shared / right_keys) if right_keys else right.rows
+    return rows
+
+
+def _estimate_sampled(sketches, join_type):
+    """Rows of joining files in order, replayed on their shared key sample.
+
+    Only keys hashing below every file's sample threshold are used, so each
+    file's sample holds all of them with exact counts. Every key's output
+    rows follow from its count in each file, and the total is scaled by the
+    share of the hash space the sample covers.
+    """
+    threshold = min(sketch.sample.threshold for sketch in sketches)
+    samples = []
+    for sketch in sketches:
+        kept = sketch.sample.hashes <= threshold
+        samples.append((sketch.sample.hashes[kept], sketch.sample.counts[kept]))
+    keys = np.unique(np.concatenate([hashes for hashes, _ in samples]))
+    if not len(keys):
+        return 0.0
+
+    frequencies = []
+    for hashes, counts in samples:
+        frequency = np.zeros(len(keys), dtype=np.int64)
+        frequency[np.searchsorted(keys, hashes)] = counts
+        frequencies.append(frequency)
+
+    rows = frequencies[0].astype(np.float64)
+    for other in frequencies[1:]:
+        if join_type == 'inner':
+            rows = rows * other
+        elif join_type == 'left':
+            rows = rows * np.maximum(other, 1)
+        elif join_type == 'right':
+            rows = other * np.where(rows > 0, rows, 1)
+        else:
+            rows = np.where((rows > 0) & (other > 0), rows * other, rows + other)
+    coverage = (float(threshold) + 1) / 2 ** 64
+    return float(rows.sum()) / coverage
+
+
+def estimate_join(sketches, join_type):
+    """Estimate (rows, bytes) of joining files in order, given each file's KeySketch.
+
+    Follows the merge: the first file joined with the second, that result
+    with the third, and so on. Two files are estimated from their count-min
+    sketches and HyperLogLogs, which stay accurate when a few keys repeat
+    heavily. A chain of joins can't be estimated from those without the
+    intermediate results' key counts, so longer chains are replayed on the
+    files' shared key samples instead. Bytes assume each output row is as
+    wide as an average row of every file together.
+    """
+    if len(sketches) == 2:
+        rows = _estimate_pair(sketches[0], sketches[1], join_type)
+    else:
+        rows = _estimate_sampled(sketches, join_type)
+    row_bytes = sum(sketch.bytes / max(sketch.rows, 1) for sketch in sketches)
+    return rows, rows * row_bytes
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+BATCH_SIZE = 100000
+VALID_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class KeyStore:
+    """A named, persistent set of 64-bit row-key hashes.
+
+    Dedup runs check a file's keys against the store and add the keys they
+    keep, so each new file is deduplicated against everything accepted
+    before it at a cost that depends on the file's size, not the history's.
+    Keys are stored as hashes only, which makes a false "already seen"
+    possible but vanishingly rare (about n / 2**64 per lookup for a store
+    of n keys).
+
+    Each store is its own SQLite file in `store_dir`. It remembers the key
+    columns it was first used with, and later runs must use the same ones.
+    """
+
+    def __init__(self, name, store_dir='key_stores', timeout=30):
+        if not VALID_NAME.match(name or ''):
+            raise ValueError('Key store names may only use letters, digits, "-" and "_"')
+        os.makedirs(store_dir, exist_ok=True)
+        self.name = name
+        self.db_path = os.path.join(store_dir, f'{name}.db')
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS keys (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def _connection(self):
+        # One connection per thread and per process, as in JobStore
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def names(store_dir='key_stores'):
+        """Names of the stores in store_dir"""
+        if not os.path.isdir(store_dir):
+            return []
+        return sorted(name[:-3] for name in os.listdir(store_dir) if name.endswith('.db'))
+
+    def _meta(self, key):
+        row = self._connection().execute('SELECT value FROM meta WHERE name = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    @property
+    def key_columns(self):
+        return self._meta('key_columns')
+
+    def check_columns(self, columns):
+        """Raise ValueError unless columns match the ones this store was built with"""
+        stored = self.key_columns
+        if stored is not None and list(columns) != stored:
+            raise ValueError(f'Key store "{self.name}" holds keys for columns {stored}, not {list(columns)}')
+
+    def contains(self, hashes):
+        """Boolean mask of which uint64 hashes are already in the store"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        found = np.zeros(len(hashes), dtype=bool)
+        if not len(hashes):
+            return found
+
+        signed = hashes.view(np.int64)
+        conn = self._connection()
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS lookup (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+        seen = []
+        with conn:
+            conn.execute('DELETE FROM lookup')
+            for start in range(0, len(signed), BATCH_SIZE):
+                conn.executemany('INSERT OR IGNORE INTO lookup (hash) VALUES (?)',
+                                 ((int(h),) for h in signed[start:start + BATCH_SIZE]))
+            seen = [row[0] for row in conn.execute('SELECT hash FROM lookup JOIN keys USING (hash)')]
+            conn.execute('DELETE FROM lookup')
+
+        if seen:
+            found = np.isin(signed, np.array(seen, dtype=np.int64))
+        return found
+
+    def add(self, hashes, columns=None):
+        """Add uint64 hashes to the store; returns how many were new"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        conn = self._connection()
+        with conn:
+            before = conn.total_changes
+            for start in range(0, len(hashes), BATCH_SIZE):
+                conn.executemany('INSERT OR IGNORE INTO keys (hash) VALUES (?)',
+                                 ((int(h),) for h in hashes[start:start + BATCH_SIZE].view(np.int64)))
+            added = conn.total_changes - before
+            if columns is not None and self.key_columns is None:
+                self._set_meta(conn, 'key_columns', list(columns))
+            self._set_meta(conn, 'updated_at', time.time())
+        return added
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM keys').fetchone()[0]
+
+    def info(self):
+        return {
+            'name': self.name,
+            'keys': len(self),
+            'key_columns': self.key_columns,
+            'updated_at': self._meta('updated_at')
+        }
+
+    def delete(self):
+        """Remove the store and its files"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.db_path + suffix)
+            except OSError:
+                pass
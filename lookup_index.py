@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def key_index(frame, key_columns):
+    """Index of a frame's key columns, for factorizing and lookups"""
+    if len(key_columns) == 1:
+        return pd.Index(frame[key_columns[0]])
+    return pd.MultiIndex.from_frame(frame[key_columns])
+
+
+class LookupIndex:
+    """A table's rows grouped by key, for joining other rows against it.
+
+    The table's keys are factorized once and its row numbers sorted by key,
+    so matching a chunk of keys costs one hash lookup per key plus array
+    arithmetic; the table itself is never re-hashed. An index pickles, so a
+    reference table that many files are joined against can be cached and
+    parsed and indexed only once.
+    """
+
+    def __init__(self, table, key_columns):
+        self.table = table
+        self.key_columns = list(key_columns)
+        codes, self.uniques = pd.factorize(key_index(table, self.key_columns))
+        # Rows of each key sit together in `order`, from starts[code] to starts[code + 1]
+        self.order = np.argsort(codes, kind='stable')
+        self.starts = np.searchsorted(codes[self.order], np.arange(len(self.uniques) + 1))
+        # A trailing 0 gives keys that aren't found (-1) no rows
+        self.sizes = np.append(np.diff(self.starts), 0)
+
+    def __len__(self):
+        return len(self.table)
+
+    def match(self, keys, keep_unmatched=False):
+        """Pair each row of `keys` with every table row that has its key.
+
+        Returns (rows, table_rows), one entry per pair, in the order of
+        `keys`. With keep_unmatched, a row without a match appears once,
+        with a table row of -1.
+        """
+        found = self.uniques.get_indexer(key_index(keys, self.key_columns))
+        hits = self.sizes[found]
+        repeats = np.maximum(hits, 1) if keep_unmatched else hits
+        rows = np.repeat(np.arange(len(keys)), repeats)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        has_match = np.repeat(hits > 0, repeats)
+        table_rows = np.full(len(rows), -1, dtype=np.int64)
+        table_rows[has_match] = self.order[np.repeat(self.starts[found], repeats)[has_match] + offsets[has_match]]
+        return rows, table_rows
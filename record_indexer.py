@@ -0,0 +1,199 @@
+import numpy as np
+import math
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+
+
+def find_record_ends(buffer, in_quotes=False):
+    """Return offsets just past each record-terminating newline in buffer.
+
+    Newlines inside quoted fields are ignored. Escaped quotes ("") toggle the
+    quote state twice, so a running parity of quote characters is enough to
+    tell whether a newline is inside a field. Works on raw bytes for any
+    ASCII-compatible encoding (utf-8, latin1, cp1252, ...).
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    newlines = np.flatnonzero(data == NEWLINE)
+    quotes = np.flatnonzero(data == QUOTE)
+
+    if len(quotes) == 0:
+        # Fast path: no quote characters, every newline ends a record
+        # unless we entered the buffer inside a quoted field
+        if in_quotes:
+            return np.empty(0, dtype=np.int64), True
+        return newlines + 1, False
+
+    # Number of quotes before each newline decides whether it is quoted
+    quotes_before = np.searchsorted(quotes, newlines)
+    quoted = (quotes_before + int(in_quotes)) & 1
+    ends = newlines[quoted == 0] + 1
+    return ends, bool((len(quotes) + int(in_quotes)) & 1)
+
+
+def blank_records(data, starts, stops, previous=NEWLINE):
+    """Mask of the records data[starts:stops] that hold only a line ending.
+
+    pandas skips such blank lines, so they aren't rows. A start of -1 means
+    the record began on `previous`, the byte just before data.
+    """
+    lengths = stops - starts
+    first = np.where(starts >= 0, data[np.clip(starts, 0, max(len(data) - 1, 0))], previous)
+    ends_line = data[stops - 1] == NEWLINE
+    return ends_line & ((lengths == 1) | ((lengths == 2) & (first == CARRIAGE_RETURN)))
+
+
+def count_records(file_path, block_size=16 * 1024 * 1024, skip_blank=False):
+    """Count the records in a file, header included, in one quote-aware pass.
+
+    A trailing record without a final newline counts, as in CSVSplitter.
+    With skip_blank, blank lines aren't counted, as pandas skips them.
+    """
+    records = 0
+    in_quotes = False
+    offset = 0
+    record_start = 0
+    last_byte = b'\n'
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            ends, in_quotes = find_record_ends(block, in_quotes)
+            if skip_blank and len(ends):
+                starts = np.concatenate(([record_start - offset], ends[:-1]))
+                blank = blank_records(np.frombuffer(block, dtype=np.uint8), starts, ends, last_byte[0])
+                record_start = offset + int(ends[-1])
+                records += len(ends) - int(blank.sum())
+            else:
+                records += len(ends)
+            offset += len(block)
+            last_byte = block[-1:]
+    return records + int(last_byte != b'\n')
+
+
+def estimate_records(file_path, sample_bytes=1024 * 1024):
+    """Records in a file, header included, extrapolated from its first sample_bytes.
+
+    Exact when the sample covers the whole file. Reads at most sample_bytes,
+    so the cost doesn't grow with the file.
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= sample_bytes:
+        return count_records(file_path, sample_bytes)
+    with open(file_path, 'rb') as f:
+        head = f.read(sample_bytes)
+    ends, _ = find_record_ends(head)
+    if not len(ends):
+        return 1
+    return math.ceil(file_size * len(ends) / ends[-1])
+
+
+def _scan_range(file_path, start, end):
+    """Scan one byte range without knowing the quote state at its start.
+
+    Returns the record ends for both possible entry states plus whether the
+    range flips the quote state, so the caller can stitch ranges together.
+    """
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            block = mm[start:end]
+
+    data = np.frombuffer(block, dtype=np.uint8)
+    newlines = np.flatnonzero(data == NEWLINE)
+    quote_count = int(np.count_nonzero(data == QUOTE))
+    if quote_count == 0:
+        return newlines + start + 1, np.empty(0, dtype=np.int64), False
+
+    quotes_before = np.searchsorted(np.flatnonzero(data == QUOTE), newlines) & 1
+    ends_outside = newlines[quotes_before == 0] + start + 1
+    ends_inside = newlines[quotes_before == 1] + start + 1
+    return ends_outside, ends_inside, bool(quote_count & 1)
+
+
+class RecordIndexer:
+    """Index the byte offset where every CSV record starts"""
+
+    def __init__(self, file_path, range_size=64 * 1024 * 1024, workers=None):
+        self.file_path = file_path
+        self.range_size = range_size
+        self.workers = workers or os.cpu_count() or 1
+        self.file_size = os.path.getsize(file_path)
+        self.offsets = None
+
+    def _ranges(self):
+        return [(start, min(start + self.range_size, self.file_size))
+                for start in range(0, self.file_size, self.range_size)]
+
+    def build(self):
+        """Scan the file and build the array of record start offsets"""
+        ranges = self._ranges()
+
+        if self.workers > 1 and len(ranges) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(ranges))) as executor:
+                results = list(executor.map(
+                    _scan_range,
+                    [self.file_path] * len(ranges),
+                    [start for start, _ in ranges],
+                    [end for _, end in ranges]
+                ))
+        else:
+            results = [_scan_range(self.file_path, start, end) for start, end in ranges]
+
+        # Fix-up pass: carry the quote state across range edges and keep
+        # the set of record ends that matches the real entry state
+        all_ends = []
+        in_quotes = False
+        for ends_outside, ends_inside, flips in results:
+            all_ends.append(ends_inside if in_quotes else ends_outside)
+            in_quotes = in_quotes != flips
+
+        dtype = np.uint32 if self.file_size < 2 ** 32 else np.int64
+        if self.file_size == 0:
+            self.offsets = np.empty(0, dtype=dtype)
+            return self.offsets
+
+        ends = np.concatenate(all_ends) if all_ends else np.empty(0, dtype=np.int64)
+        # A record starts at 0 and after every end that isn't end of file
+        self.offsets = np.concatenate(([0], ends[ends < self.file_size])).astype(dtype)
+        return self.offsets
+
+    @property
+    def record_count(self):
+        if self.offsets is None:
+            self.build()
+        return len(self.offsets)
+
+    def record_bounds(self, first, count=1):
+        """Return the byte range covering `count` records from record `first`"""
+        if self.offsets is None:
+            self.build()
+        start = int(self.offsets[first])
+        last = first + count
+        end = int(self.offsets[last]) if last < len(self.offsets) else self.file_size
+        return start, end
+
+    def read_records(self, first, count=1):
+        """Read the raw bytes of `count` records starting at record `first`"""
+        start, end = self.record_bounds(first, count)
+        with open(self.file_path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def save(self, index_path):
+        """Persist the offsets so the file doesn't need rescanning"""
+        if self.offsets is None:
+            self.build()
+        with open(index_path, 'wb') as f:
+            np.save(f, self.offsets)
+        return index_path
+
+    def load(self, index_path):
+        """Load offsets saved by save()"""
+        with open(index_path, 'rb') as f:
+            self.offsets = np.load(f)
+        return self.offsets
@@ -0,0 +1,354 @@
+import io
+import math
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from bloom_filter import BloomFilter
+from duplicate_remover import (MATCH_STRATEGIES, check_key_store, keep_mask, key_codes, row_key_hashes,
+                               strategy_values, summarize_duplicates)
+from encoding_detector import detect_encoding
+from fuzzy_matcher import MATCH_THRESHOLD, match_codes, normalize_keys
+from record_indexer import estimate_records, find_record_ends
+
+KEEP_STRATEGIES = ('first', 'last', 'not_empty', 'max_value', 'most_recent', 'normalized')
+VALUE_STRATEGIES = ('not_empty', 'max_value', 'most_recent')
+
+# Above this share of candidate rows, the pre-pass gives way to partitioning
+PREFILTER_MAX_CANDIDATES = 0.05
+
+
+def _iter_frames(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _dedup_partition(path, check_columns, keep_strategy, source_ends=None, source_priority='first'):
+    """Return the row numbers that survive deduplication within one partition"""
+    frames = list(_iter_frames(path))
+    if not frames:
+        return np.empty(0, dtype=np.int64)
+    # Frames were spilled in file order, so row order is already correct
+    return _surviving_rows(pd.concat(frames, ignore_index=True), check_columns, keep_strategy,
+                           source_ends, source_priority)
+
+
+def _surviving_rows(keys, check_columns, keep_strategy, source_ends=None, source_priority='first'):
+    """Return the row numbers that survive in a frame of keys, _row and _value
+
+    `source_ends` are the cumulative row counts of the sources the file was
+    concatenated from. With source_priority 'last', rows from later sources
+    are ranked ahead of earlier ones before the keep strategy is applied.
+    """
+    codes, groups = key_codes(keys[check_columns])
+    values = keys['_value'] if keep_strategy in VALUE_STRATEGIES else None
+    order = None
+    if source_ends is not None and source_priority == 'last':
+        rows = keys['_row'].to_numpy()
+        sources = np.searchsorted(source_ends, rows, side='right')
+        order = np.lexsort((rows, -sources))
+    return keys['_row'].to_numpy(dtype=np.int64)[keep_mask(codes, groups, keep_strategy, values, order)]
+
+
+def _count_partition(path, check_columns):
+    """Return (duplicate rows, duplicate groups) within one partition"""
+    frames = list(_iter_frames(path))
+    if not frames:
+        return 0, 0
+    codes, groups = key_codes(pd.concat(frames, ignore_index=True)[check_columns])
+    counts = np.bincount(codes, minlength=groups)
+    repeated = counts > 1
+    return int(counts[repeated].sum()), int(repeated.sum())
+
+
+class StreamingDeduplicator:
+    """Remove duplicate rows from a CSV without loading it into memory.
+
+    The file is read in chunks. For every row, only the key columns, the
+    row number and the keep-strategy value are spilled to one of N on-disk
+    partitions, chosen by a 64-bit hash of the key. Equal keys always land
+    in the same partition. Each partition is then deduplicated on its own,
+    in parallel, giving the row numbers that survive. A final chunked pass
+    writes those rows in their original order.
+
+    Key columns are compared as text, so a key means the same thing in
+    every chunk whatever dtype pandas would have inferred for it. Memory
+    is bounded by the chunk size, the largest partition and the array of
+    surviving row numbers.
+    """
+
+    def __init__(self, file_path, encoding=None, chunk_rows=200000, partitions=None,
+                 workers=None, temp_dir=None, bloom_error_rate=0.001):
+        self.file_path = file_path
+        self.encoding = encoding or detect_encoding(file_path)
+        self.chunk_rows = chunk_rows
+        # Aim for partitions of roughly 64 MB of input each
+        self.partitions = partitions or min(256, max(4, math.ceil(os.path.getsize(file_path) / (64 * 1024 ** 2))))
+        self.workers = workers or os.cpu_count() or 1
+        self.temp_dir = temp_dir
+        self.bloom_error_rate = bloom_error_rate
+        self.original_row_count = 0
+        self.candidate_rows = None
+        self.source_ends = None
+        self.source_priority = 'first'
+
+    def _read_chunks(self, **kwargs):
+        return pd.read_csv(self.file_path, encoding=self.encoding, chunksize=self.chunk_rows, **kwargs)
+
+    def _key_frames(self, check_columns, keep_strategy='first', strategy_column=None):
+        """Yield (frame, key hashes) per chunk; frames hold the key columns, _row and _value
+
+        With the 'normalized' strategy the key columns are normalized first,
+        so matching keys hash, partition and group together.
+        """
+        usecols = list(dict.fromkeys(check_columns + ([strategy_column] if strategy_column else [])))
+        dtypes = {col: str for col in check_columns}
+
+        row = 0
+        date_format = None
+        for chunk in self._read_chunks(usecols=usecols, dtype=dtypes):
+            if keep_strategy == 'normalized':
+                chunk[check_columns] = normalize_keys(chunk[check_columns])
+            frame = chunk[check_columns].reset_index(drop=True)
+            frame['_row'] = np.arange(row, row + len(chunk), dtype=np.int64)
+            if keep_strategy == 'most_recent' and date_format is None:
+                # Fix the format from the first date, as a whole-column parse would
+                first = chunk[strategy_column].dropna()
+                if len(first):
+                    date_format = guess_datetime_format(str(first.iloc[0]))
+            if keep_strategy in VALUE_STRATEGIES:
+                frame['_value'] = strategy_values(chunk[strategy_column], keep_strategy, date_format).array
+            row += len(chunk)
+            self.original_row_count = row
+            yield frame, pd.util.hash_pandas_object(chunk[check_columns], index=False).to_numpy()
+
+    def _spill(self, check_columns, keep_strategy, strategy_column, work_dir):
+        paths = [os.path.join(work_dir, f'partition_{i}.pkl') for i in range(self.partitions)]
+        files = [open(path, 'wb') for path in paths]
+        self.original_row_count = 0
+        try:
+            for frame, hashes in self._key_frames(check_columns, keep_strategy, strategy_column):
+                targets = hashes % np.uint64(self.partitions)
+                order = np.argsort(targets, kind='stable')
+                bounds = np.searchsorted(targets[order], np.arange(self.partitions + 1))
+                for i in range(self.partitions):
+                    if bounds[i] < bounds[i + 1]:
+                        pickle.dump(frame.iloc[order[bounds[i]:bounds[i + 1]]], files[i], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        return paths
+
+    def _map_partitions(self, fn, paths, *args):
+        if self.workers <= 1 or len(paths) == 1:
+            return [fn(path, *args) for path in paths]
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(paths)),
+            mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            return list(executor.map(fn, paths, *[[arg] * len(paths) for arg in args]))
+
+    def _surviving_rows(self, paths, check_columns, keep_strategy):
+        kept = self._map_partitions(_dedup_partition, paths, check_columns, keep_strategy,
+                                    self.source_ends, self.source_priority)
+        return np.sort(np.concatenate(kept)) if kept else np.empty(0, dtype=np.int64)
+
+    def _bloom_candidates(self, check_columns, keep_strategy='first'):
+        """Key hashes that may repeat, from one pass through a Bloom filter.
+
+        A row is flagged when its key hash may already be in the filter or
+        repeats within its chunk, so every repeated key is flagged at least
+        once. Returns None when too many rows are flagged for the pre-pass
+        to pay off.
+        """
+        # Overestimate the row count a little; extra rows only add false positives
+        bloom = BloomFilter(estimate_records(self.file_path) * 1.2, self.bloom_error_rate)
+        candidates = []
+        flagged_rows = 0
+        key_strategy = 'normalized' if keep_strategy == 'normalized' else 'first'
+        for _, hashes in self._key_frames(check_columns, key_strategy):
+            repeated = np.ones(len(hashes), dtype=bool)
+            repeated[np.unique(hashes, return_index=True)[1]] = False
+            flagged = repeated | bloom.contains(hashes)
+            flagged_rows += int(flagged.sum())
+            candidates.append(np.unique(hashes[flagged]))
+            bloom.add(hashes)
+
+        if flagged_rows > PREFILTER_MAX_CANDIDATES * self.original_row_count:
+            return None
+        return np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.uint64)
+
+    def _prefiltered_drops(self, check_columns, keep_strategy, strategy_column):
+        """Sorted row numbers to drop, deduplicating only rows whose key may repeat.
+
+        Returns None when the Bloom pre-pass finds too many candidates.
+        """
+        candidates = self._bloom_candidates(check_columns, keep_strategy)
+        if candidates is None:
+            return None
+        if not len(candidates):
+            self.candidate_rows = 0
+            return np.empty(0, dtype=np.int64)
+
+        # Every row with a candidate hash, first occurrences included, is checked exactly
+        frames = [
+            frame[np.isin(hashes, candidates)]
+            for frame, hashes in self._key_frames(check_columns, keep_strategy, strategy_column)
+        ]
+        keys = pd.concat(frames, ignore_index=True)
+        self.candidate_rows = len(keys)
+        kept = _surviving_rows(keys, check_columns, keep_strategy, self.source_ends, self.source_priority)
+        return np.setdiff1d(keys['_row'].to_numpy(dtype=np.int64), kept)
+
+    def _write_rows(self, rows, output_path, check_columns, key_store=None, update_key_store=False, drop=False):
+        """Write the rows listed in rows, or all others with drop=True.
+
+        Returns (rows written, rows dropped as already in key_store).
+        """
+        # Read every field as text so surviving rows are written as they came in
+        row = 0
+        written = 0
+        already_seen = 0
+        with open(output_path, 'w', encoding=self.encoding, newline='') as out:
+            for i, chunk in enumerate(self._read_chunks(dtype=str, keep_default_na=False)):
+                lo, hi = np.searchsorted(rows, [row, row + len(chunk)])
+                if drop:
+                    keep = np.ones(len(chunk), dtype=bool)
+                    keep[rows[lo:hi] - row] = False
+                    rows_out = chunk[keep]
+                else:
+                    rows_out = chunk.iloc[rows[lo:hi] - row]
+                if key_store is not None:
+                    hashes = row_key_hashes(rows_out[check_columns])
+                    seen = key_store.contains(hashes)
+                    already_seen += int(seen.sum())
+                    rows_out = rows_out[~seen]
+                    if update_key_store:
+                        key_store.add(hashes[~seen], check_columns)
+                rows_out.to_csv(out, index=False, header=(i == 0))
+                written += len(rows_out)
+                row += len(chunk)
+        return written, already_seen
+
+    def preview_duplicates(self, check_columns, sample_bytes=16 * 1024 ** 2, max_groups=5,
+                           keep_strategy='first', match_threshold=MATCH_THRESHOLD):
+        """Summarize duplicates in the first sample_bytes of the file.
+
+        Returns the same fields as DuplicateRemover.find_duplicates, including
+        match confidence for MATCH_STRATEGIES. When the sample doesn't cover
+        the whole file, the counts are scaled up by size and `approximate`
+        is set; count_duplicates gives exact numbers.
+        """
+        file_size = os.path.getsize(self.file_path)
+        with open(self.file_path, 'rb') as f:
+            head = f.read(sample_bytes)
+        complete = len(head) >= file_size
+        if not complete:
+            # Cut at the last complete record so a quoted newline isn't split
+            ends, _ = find_record_ends(head)
+            if len(ends):
+                head = head[:ends[-1]]
+
+        sample = pd.read_csv(io.BytesIO(head), encoding=self.encoding, dtype={col: str for col in check_columns})
+        if keep_strategy in MATCH_STRATEGIES:
+            codes, groups, confidence = match_codes(sample[check_columns], keep_strategy == 'fuzzy', match_threshold)
+            result = summarize_duplicates(sample, codes, groups, check_columns, max_groups, confidence)
+            result['match_strategy'] = keep_strategy
+        else:
+            codes, groups = key_codes(sample[check_columns])
+            result = summarize_duplicates(sample, codes, groups, check_columns, max_groups)
+        result['approximate'] = not complete
+        result['sampled_rows'] = len(sample)
+        if not complete and len(head):
+            scale = file_size / len(head)
+            for key in ('total_duplicate_rows', 'duplicate_groups', 'rows_to_remove'):
+                result[key] = int(round(result[key] * scale))
+            result['estimated_rows'] = int(round(len(sample) * scale))
+        return result
+
+    def count_duplicates(self, check_columns, keep_strategy='first'):
+        """Exact duplicate counts over the whole file, with bounded memory
+
+        Keys are compared exactly, or after normalize_keys for 'normalized'.
+        """
+        work_dir = tempfile.mkdtemp(prefix='dedup_', dir=self.temp_dir)
+        try:
+            key_strategy = 'normalized' if keep_strategy == 'normalized' else 'first'
+            paths = self._spill(check_columns, key_strategy, None, work_dir)
+            counts = self._map_partitions(_count_partition, paths, check_columns)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        total_duplicate_rows = sum(rows for rows, _ in counts)
+        duplicate_groups = sum(groups for _, groups in counts)
+        return {
+            'total_rows': self.original_row_count,
+            'total_duplicate_rows': total_duplicate_rows,
+            'duplicate_groups': duplicate_groups,
+            'rows_to_remove': total_duplicate_rows - duplicate_groups
+        }
+
+    def remove_duplicates(self, check_columns, output_path, keep_strategy='first', strategy_column=None,
+                          key_store=None, update_key_store=False, prefilter=False,
+                          source_rows=None, source_priority='first'):
+        """Write the deduplicated file to output_path and return removal statistics
+
+        key_store and update_key_store work as in DuplicateRemover.remove_duplicates.
+        With prefilter, a Bloom filter pass first finds the keys that may
+        repeat, and only rows with those keys are deduplicated exactly. If
+        none are found, the file is copied to output_path unchanged. When
+        more than PREFILTER_MAX_CANDIDATES of the rows are candidates, the
+        usual partitioned dedup runs instead.
+
+        For a file concatenated from several sources, `source_rows` gives each
+        source's row count in order; source_priority 'last' then lets rows
+        from later sources win, as CSVMerger does when merging files.
+        """
+        if keep_strategy not in KEEP_STRATEGIES:
+            raise ValueError(f'Unknown keep strategy: {keep_strategy}')
+        if keep_strategy in VALUE_STRATEGIES and not strategy_column:
+            raise ValueError(f'Keep strategy {keep_strategy} needs a strategy column')
+        if key_store is not None:
+            check_key_store(key_store, check_columns, keep_strategy)
+        self.source_ends = np.cumsum(source_rows) if source_rows is not None else None
+        self.source_priority = source_priority
+
+        self.candidate_rows = None
+        dropped = self._prefiltered_drops(check_columns, keep_strategy, strategy_column) if prefilter else None
+        if dropped is None:
+            work_dir = tempfile.mkdtemp(prefix='dedup_', dir=self.temp_dir)
+            try:
+                paths = self._spill(check_columns, keep_strategy, strategy_column, work_dir)
+                kept = self._surviving_rows(paths, check_columns, keep_strategy)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            written, already_seen = self._write_rows(kept, output_path, check_columns, key_store, update_key_store)
+        elif not len(dropped) and key_store is None:
+            # No key can repeat, so the input already is the output
+            shutil.copyfile(self.file_path, output_path)
+            written, already_seen = self.original_row_count, 0
+        else:
+            written, already_seen = self._write_rows(dropped, output_path, check_columns, key_store,
+                                                     update_key_store, drop=True)
+
+        rows_removed = self.original_row_count - written
+        return {
+            'output_path': output_path,
+            'original_rows': self.original_row_count,
+            'cleaned_rows': written,
+            'rows_removed': rows_removed,
+            'already_seen_rows': already_seen,
+            'candidate_rows': self.candidate_rows,
+            'removal_percentage': (rows_removed / self.original_row_count) * 100 if self.original_row_count > 0 else 0
+        }
@@ -0,0 +1,26 @@
+import pytest
+
+from duplicate_remover import DuplicateRemover
+from streaming_dedup import StreamingDeduplicator
+
+ROWS = 'id,amount\n007,1\n7,2\n1.0,3\n1,4\n7,5\n,6\n,7\n'
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / 'upload.csv'
+    path.write_text(ROWS)
+    return str(path)
+
+
+@pytest.mark.parametrize('keep_strategy', ['first', 'last', 'normalized'])
+def test_preview_and_process_agree(upload, tmp_path, keep_strategy):
+    preview = DuplicateRemover(upload).find_duplicates(['id'], keep_strategy)
+    sampled = StreamingDeduplicator(upload).preview_duplicates(['id'], keep_strategy=keep_strategy)
+    in_memory = DuplicateRemover(upload).remove_duplicates(['id'], keep_strategy)
+    two_phase = DuplicateRemover(upload).remove_duplicates_to_file(['id'], str(tmp_path / 'out.csv'), keep_strategy)
+    streamed = StreamingDeduplicator(upload).remove_duplicates(['id'], str(tmp_path / 'streamed.csv'), keep_strategy)
+
+    # Only the repeated 7 and the two missing ids are duplicates; 007/7 and 1.0/1 differ as text
+    assert preview['rows_to_remove'] == sampled['rows_to_remove'] == 2
+    assert in_memory['rows_removed'] == two_phase['rows_removed'] == streamed['rows_removed'] == 2
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from fuzzy_matcher import match_codes
+
+
+def groups_of(values, threshold=0.9):
+    codes, groups, confidence = match_codes(pd.DataFrame({'key': values}), fuzzy=True, threshold=threshold)
+    return codes, groups, confidence
+
+
+def test_sequential_ids_stay_apart():
+    skus = [f'SKU-{n:06d}' for n in range(2000)]
+    _, groups, _ = groups_of(skus)
+    assert groups == len(skus)
+
+
+def test_numbered_emails_stay_apart():
+    emails = [f'customer{n}@example.com' for n in range(700)] * 3
+    _, groups, _ = groups_of(emails)
+    assert groups == 700
+
+
+def test_matches_do_not_chain():
+    # Each neighbour is within the threshold, the two ends are not
+    values = ['abcdefghijklmnopqrst', 'abcdefghijklmnopqrsX', 'abcdefghijklmnopqrXY', 'abcdefghijklmnopqXYZ']
+    codes, _, confidence = groups_of(values)
+    assert codes[0] == codes[1]
+    assert codes[0] != codes[3]
+    assert confidence.min() >= 0.9
+
+
+def test_typos_still_match():
+    codes, groups, confidence = groups_of(['Jonathan Smithson', 'Jonathon Smithson', 'ACME Inc', 'Acme, Inc.'])
+    assert list(codes) == [0, 0, 1, 1]
+    assert groups == 2
+    assert np.isclose(confidence[1], 1.0)
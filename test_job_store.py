@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.db'))
+
+
+def dead_pid():
+    child = subprocess.Popen([sys.executable, '-c', 'pass'])
+    child.wait()
+    return child.pid
+
+
+def test_job_of_exited_owner_fails(store):
+    store['lost'] = {'status': 'processing', 'progress': 40}
+    with store._connection() as conn:
+        conn.execute('UPDATE jobs SET owner_pid = ?', (dead_pid(),))
+
+    assert store.fail_stale() == 1
+    assert store['lost']['status'] == 'error'
+
+
+def test_running_and_finished_jobs_are_kept(store):
+    store['running'] = {'status': 'processing', 'progress': 40}
+    store['done'] = {'status': 'complete', 'progress': 100}
+
+    assert store.fail_stale() == 0
+    assert store['running']['status'] == 'processing'
+
+
+def test_silent_job_fails_despite_live_owner(store):
+    store['silent'] = {'status': 'processing', 'progress': 40}
+    with store._connection() as conn:
+        conn.execute('UPDATE jobs SET updated_at = ?', (time.time() - 3600,))
+    store.heartbeat()
+
+    # A heartbeat from its owner keeps it; without one it is given up on
+    assert store.fail_stale(stale_after=600) == 0
+    with store._connection() as conn:
+        conn.execute('UPDATE jobs SET heartbeat_at = NULL')
+    assert store.fail_stale(stale_after=600) == 1
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from encoding_detector import detect_encoding
+
+# A lease older than this is ignored, in case its process id was reused
+MAX_LEASE_SECONDS = 24 * 3600
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class UploadCache:
+    """Content-addressed store for uploads shared between request steps.
+
+    Each upload is saved once under the SHA-256 of its bytes and the hash is
+    handed back to the client as a handle. Entries expire after `ttl` seconds
+    without access, and the least recently used ones are evicted once the
+    store grows past `max_bytes`. Parsed forms (e.g. a loaded DataFrame) can
+    be cached alongside in memory so later steps skip re-parsing, and files
+    derived from an upload can be stored next to it as `<upload_id>.<name>`;
+    they are removed along with it.
+    """
+
+    def __init__(self, cache_dir='upload_cache', ttl=3600, max_bytes=2 * 1024 ** 3,
+                 max_parsed=4, max_parsed_file_bytes=256 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_parsed = max_parsed
+        self.max_parsed_file_bytes = max_parsed_file_bytes
+        self._parsed = OrderedDict()  # (upload_id, kind) -> parsed object
+        self._in_use = {}  # upload_id -> number of active users
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.cache_dir, f'{upload_id}.csv')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.cache_dir, f'{upload_id}.json')
+
+    def put(self, file_storage):
+        """Store an uploaded file and return its content handle"""
+        temp_path = os.path.join(self.cache_dir, f'incoming_{uuid.uuid4()}.tmp')
+        digest = hashlib.sha256()
+        size = 0
+
+        with open(temp_path, 'wb') as out:
+            while True:
+                block = file_storage.stream.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+                size += len(block)
+                out.write(block)
+
+        upload_id = digest.hexdigest()
+        data_path = self._data_path(upload_id)
+        meta = {'filename': file_storage.filename, 'size': size}
+        if os.path.exists(data_path):
+            # Same bytes already stored; keep the existing copy and its detected encoding
+            os.remove(temp_path)
+            encoding = self.info(upload_id).get('encoding')
+            if encoding:
+                meta['encoding'] = encoding
+        else:
+            os.replace(temp_path, data_path)
+
+        self._write_meta(upload_id, meta)
+
+        self.touch(upload_id)
+        self.evict(keep=upload_id)
+        return upload_id
+
+    def exists(self, upload_id):
+        return self._valid_id(upload_id) and os.path.exists(self._data_path(upload_id))
+
+    def _valid_id(self, upload_id):
+        return isinstance(upload_id, str) and len(upload_id) == 64 and all(c in '0123456789abcdef' for c in upload_id)
+
+    def path(self, upload_id):
+        """Return the stored file path for a handle, or None if it has expired"""
+        if not self.exists(upload_id):
+            return None
+        self.touch(upload_id)
+        return self._data_path(upload_id)
+
+    def info(self, upload_id):
+        """Return stored metadata (original filename, size, encoding once detected) for a handle"""
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'filename': 'upload.csv', 'size': os.path.getsize(self._data_path(upload_id))}
+
+    def encoding(self, upload_id):
+        """Return the detected text encoding of an upload, detecting it once"""
+        info = self.info(upload_id)
+        if 'encoding' not in info:
+            info['encoding'] = detect_encoding(self._data_path(upload_id))
+            self._write_meta(upload_id, info)
+        return info['encoding']
+
+    def _write_meta(self, upload_id, meta):
+        # Write then rename, so readers in other workers never see a partial file
+        temp_path = f'{self._meta_path(upload_id)}.{uuid.uuid4()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path(upload_id))
+
+    def touch(self, upload_id):
+        """Mark an entry as recently used (mtime is shared across processes)"""
+        try:
+            os.utime(self._data_path(upload_id), None)
+        except OSError:
+            pass
+
+    def _lease_path(self, upload_id):
+        return os.path.join(self.cache_dir, f'{upload_id}.lease_{os.getpid()}')
+
+    def acquire(self, upload_id):
+        """Protect an entry from eviction, by any worker process, while it is read
+
+        Each process holding an entry keeps a lease file next to it, which
+        evict honours for as long as that process is alive.
+        """
+        with self._lock:
+            count = self._in_use.get(upload_id, 0)
+            self._in_use[upload_id] = count + 1
+            if not count:
+                with open(self._lease_path(upload_id), 'w'):
+                    pass
+
+    def release(self, upload_id):
+        with self._lock:
+            count = self._in_use.get(upload_id, 0) - 1
+            if count > 0:
+                self._in_use[upload_id] = count
+                return
+            self._in_use.pop(upload_id, None)
+            try:
+                os.remove(self._lease_path(upload_id))
+            except OSError:
+                pass
+
+    def _leased(self, upload_id, leases, now):
+        """Whether another live process holds a lease on an entry; stale leases are removed"""
+        held = False
+        for name, mtime in leases.get(upload_id, []):
+            pid = int(name.rsplit('_', 1)[1])
+            if now - mtime < MAX_LEASE_SECONDS and _process_alive(pid):
+                held = True
+            else:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        return held
+
+    def get_parsed(self, upload_id, kind, loader):
+        """Return a cached parsed form of an upload, building it on first use"""
+        key = (upload_id, kind)
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                return self._parsed[key]
+
+        path = self.path(upload_id)
+        parsed = loader(path)
+
+        # Large files are parsed on demand rather than pinned in memory
+        if os.path.getsize(path) > self.max_parsed_file_bytes:
+            return parsed
+
+        with self._lock:
+            self._parsed[key] = parsed
+            while len(self._parsed) > self.max_parsed:
+                self._parsed.popitem(last=False)
+        return parsed
+
+    def evict(self, keep=None):
+        """Drop expired entries, then least recently used ones over the size budget
+
+        An entry's size includes the files derived from it (lookup indexes,
+        key sketches, metadata), which are removed along with it.
+        """
+        now = time.time()
+        mtimes = {}
+        sizes = {}
+        leases = {}
+        for name in os.listdir(self.cache_dir):
+            upload_id, _, suffix = name.partition('.')
+            if not self._valid_id(upload_id):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            sizes[upload_id] = sizes.get(upload_id, 0) + stat.st_size
+            if suffix == 'csv':
+                mtimes[upload_id] = stat.st_mtime
+            elif suffix.startswith('lease_'):
+                leases.setdefault(upload_id, []).append((name, stat.st_mtime))
+
+        entries = sorted((mtime, sizes[upload_id], upload_id) for upload_id, mtime in mtimes.items())
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, upload_id in entries:
+            expired = now - mtime > self.ttl
+            if not expired and total <= self.max_bytes:
+                continue
+            with self._lock:
+                if upload_id in self._in_use or upload_id == keep:
+                    continue
+            if self._leased(upload_id, leases, now):
+                continue
+            self._remove(upload_id)
+            total -= size
+
+    def _remove(self, upload_id):
+        # Files derived from an upload (e.g. lookup indexes) share its name prefix
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(f'{upload_id}.'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        with self._lock:
+            for key in [key for key in self._parsed if key[0] == upload_id]:
+                del self._parsed[key]
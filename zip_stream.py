@@ -0,0 +1,197 @@
+import struct
+import time
+import zlib
+
+ZIP64_LIMIT = 0xFFFFFFFF
+DEFLATED = 8
+COPY_BLOCK = 1024 * 1024
+
+
+class ZipMember:
+    """A member whose DEFLATE stream has already been written to disk"""
+
+    def __init__(self, name, data_path, crc, compress_size, file_size, date_time=None):
+        self.name = name
+        self.data_path = data_path
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.date_time = date_time or time.localtime(time.time())[:6]
+
+    @property
+    def zip64(self):
+        return self.file_size >= ZIP64_LIMIT or self.compress_size >= ZIP64_LIMIT
+
+
+def compress_member(name, blocks, data_path, level=6):
+    """Deflate an iterable of byte blocks into data_path as a raw stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    file_size = 0
+    compress_size = 0
+
+    with open(data_path, 'wb') as out:
+        for block in blocks:
+            if not block:
+                continue
+            crc = zlib.crc32(block, crc)
+            file_size += len(block)
+            compressed = compressor.compress(block)
+            compress_size += len(compressed)
+            out.write(compressed)
+        compressed = compressor.flush()
+        compress_size += len(compressed)
+        out.write(compressed)
+
+    return ZipMember(name, data_path, crc, compress_size, file_size)
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | (second // 2)
+    return dos_time, dos_date
+
+
+def _local_header(member, streamed=False, zip64=False):
+    """Local file header; streamed members defer crc and sizes to a data descriptor"""
+    name = member.name.encode('utf-8')
+    dos_time, dos_date = _dos_time(member.date_time)
+    flags = 0x808 if streamed else 0x800
+    zip64 = zip64 or member.zip64
+    if zip64:
+        extra = struct.pack('<HHQQ', 0x0001, 16, member.file_size, member.compress_size)
+        sizes = (ZIP64_LIMIT, ZIP64_LIMIT)
+        version = 45
+    else:
+        extra = b''
+        sizes = (member.compress_size, member.file_size)
+        version = 20
+    header = struct.pack(
+        '<IHHHHHIIIHH', 0x04034b50, version, flags, DEFLATED, dos_time, dos_date,
+        member.crc, sizes[0], sizes[1], len(name), len(extra)
+    )
+    return header + name + extra
+
+
+def _central_header(member, offset, streamed=False):
+    name = member.name.encode('utf-8')
+    dos_time, dos_date = _dos_time(member.date_time)
+
+    # Only fields that overflow go into the zip64 extra, in this order
+    zip64_fields = []
+    file_size, compress_size, header_offset = member.file_size, member.compress_size, offset
+    if file_size >= ZIP64_LIMIT:
+        zip64_fields.append(file_size)
+        file_size = ZIP64_LIMIT
+    if compress_size >= ZIP64_LIMIT:
+        zip64_fields.append(compress_size)
+        compress_size = ZIP64_LIMIT
+    if header_offset >= ZIP64_LIMIT:
+        zip64_fields.append(header_offset)
+        header_offset = ZIP64_LIMIT
+
+    extra = b''
+    if zip64_fields:
+        extra = struct.pack('<HH', 0x0001, 8 * len(zip64_fields)) + struct.pack(f'<{len(zip64_fields)}Q', *zip64_fields)
+    version = 45 if zip64_fields or member.zip64 else 20
+
+    header = struct.pack(
+        '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | version, version, 0x808 if streamed else 0x800, DEFLATED,
+        dos_time, dos_date, member.crc, compress_size, file_size,
+        len(name), len(extra), 0, 0, 0, 0o644 << 16, header_offset
+    )
+    return header + name + extra
+
+
+def _end_records(entries, cd_offset, cd_size):
+    records = b''
+    if entries >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_offset = cd_offset + cd_size
+        records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, (3 << 8) | 45, 45, 0, 0,
+                               entries, entries, cd_size, cd_offset)
+        records += struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1)
+        entries = min(entries, 0xFFFF)
+        cd_offset = min(cd_offset, ZIP64_LIMIT)
+        cd_size = min(cd_size, ZIP64_LIMIT)
+    records += struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, entries, entries, cd_size, cd_offset, 0)
+    return records
+
+
+def iter_zip(members):
+    """Yield the bytes of a ZIP archive built from pre-compressed members"""
+    central = []
+    offset = 0
+
+    for member in members:
+        header = _local_header(member)
+        central.append(_central_header(member, offset))
+        yield header
+        offset += len(header)
+
+        with open(member.data_path, 'rb') as f:
+            while True:
+                block = f.read(COPY_BLOCK)
+                if not block:
+                    break
+                yield block
+        offset += member.compress_size
+
+    cd_offset = offset
+    cd_size = sum(len(entry) for entry in central)
+    for entry in central:
+        yield entry
+    yield _end_records(len(central), cd_offset, cd_size)
+
+
+def iter_streamed_zip(entries, level=6, zip64=False):
+    """Yield a ZIP archive while compressing (name, blocks) entries.
+
+    Sizes and CRC follow each member in a data descriptor, so nothing has to
+    be buffered and the first bytes go out as soon as the first part starts.
+    Set zip64 when a single member may exceed 4 GB.
+    """
+    central = []
+    offset = 0
+
+    for name, blocks in entries:
+        member = ZipMember(name, None, 0, 0, 0)
+        header = _local_header(member, streamed=True, zip64=zip64)
+        yield header
+
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        for block in blocks:
+            if not block:
+                continue
+            member.crc = zlib.crc32(block, member.crc)
+            member.file_size += len(block)
+            compressed = compressor.compress(block)
+            if compressed:
+                member.compress_size += len(compressed)
+                yield compressed
+        compressed = compressor.flush()
+        member.compress_size += len(compressed)
+        yield compressed
+
+        if zip64:
+            descriptor = struct.pack('<IIQQ', 0x08074b50, member.crc, member.compress_size, member.file_size)
+        else:
+            descriptor = struct.pack('<IIII', 0x08074b50, member.crc, member.compress_size, member.file_size)
+        yield descriptor
+
+        central.append(_central_header(member, offset, streamed=True))
+        offset += len(header) + member.compress_size + len(descriptor)
+
+    cd_offset = offset
+    cd_size = sum(len(entry) for entry in central)
+    for entry in central:
+        yield entry
+    yield _end_records(len(central), cd_offset, cd_size)
+
+
+def write_zip(zip_path, members):
+    """Assemble pre-compressed members into a ZIP file on disk"""
+    with open(zip_path, 'wb') as out:
+        for block in iter_zip(members):
+            out.write(block)
+    return zip_path